@@ -5,17 +5,33 @@ from flask.ext.bootstrap import Bootstrap
 from flask_login import LoginManager
 from flask_wtf.csrf import CsrfProtect
 
-import dmapiclient
 from dmutils import init_app, flask_featureflags, formats
 from dmutils.user import User
 from dmcontent.content_loader import ContentLoader
 
 from config import configs
+from app.api_client import CachedDataAPIClient, PooledDataAPIClient
+from app.cache import ImmutableCache, TimelineCache, TTLCache
+from app.concurrency import SingleFlight, Throttle
+from app.live_stats import LiveStatsStore
+from app.streaming import Broadcaster
 
 
 bootstrap = Bootstrap()
 csrf = CsrfProtect()
-data_api_client = dmapiclient.DataAPIClient()
+framework_cache = TTLCache()
+user_cache = TTLCache()
+stats_timeline_cache = TimelineCache()
+service_diff_cache = ImmutableCache()
+service_diff_throttle = Throttle()
+stats_broadcaster = Broadcaster()
+live_stats_store = LiveStatsStore()
+data_api_single_flight = SingleFlight()
+# views should always go through `data_api_client`; this is only exposed for its pool stats
+data_api_http_client = PooledDataAPIClient()
+data_api_client = CachedDataAPIClient(
+    data_api_http_client, shared_cache=framework_cache, single_flight=data_api_single_flight
+)
 feature_flags = flask_featureflags.FeatureFlag()
 login_manager = LoginManager()
 
@@ -50,6 +66,18 @@ def create_app(config_name):
     )
     # Should be incorporated into digitalmarketplace-utils as well
     csrf.init_app(application)
+    user_cache.configure(
+        max_size=application.config['DM_USER_CACHE_SIZE'],
+        ttl=application.config['DM_USER_CACHE_TTL'],
+    )
+    stats_timeline_cache.configure(max_size=application.config['DM_STATS_TIMELINE_CACHE_SIZE'])
+    service_diff_cache.configure(
+        max_size=application.config['DM_SERVICE_DIFF_CACHE_SIZE'],
+        directory=application.config['DM_SERVICE_DIFF_CACHE_DIR'],
+    )
+    service_diff_throttle.configure(application.config['DM_SERVICE_DIFF_WORKERS'])
+    stats_broadcaster.init_app(application)
+    live_stats_store.init_app(application)
 
     application.permanent_session_lifetime = timedelta(hours=1)
     from .main import main as main_blueprint
@@ -72,4 +100,11 @@ def create_app(config_name):
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.load_user(data_api_client, user_id)
+    # Logged in users are kept for up to DM_USER_CACHE_TTL seconds, which bounds how long
+    # a deactivated, locked or demoted user can carry on using their session on this worker.
+    user = user_cache.get(user_id)
+    if user is None:
+        user = User.load_user(data_api_client, user_id)
+        if user is not None:
+            user_cache.set(user_id, user)
+    return user
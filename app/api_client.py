@@ -0,0 +1,284 @@
+import copy
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+from six.moves.urllib.parse import urljoin
+from flask import g, has_app_context
+
+import dmapiclient
+from dmapiclient import HTTPError, InvalidResponse
+
+
+logger = logging.getLogger(__name__)
+
+
+READ_METHOD_PREFIXES = ('get_', 'find_')
+
+# reads whose results rarely change, so can be shared between requests by `shared_cache`
+SHARED_CACHE_METHODS = ('get_framework', 'find_frameworks')
+
+# `find_*` reads small and common enough to be worth memoizing for the request like `get_*` reads
+MEMOIZED_FIND_METHODS = ('find_frameworks',)
+
+# pages of list results are big and only read once, so reads passing these are never memoized
+PAGING_ARGUMENTS = ('page', 'per_page')
+
+
+def is_read_method(name):
+    return name.startswith(READ_METHOD_PREFIXES)
+
+
+def is_memoized_read(name, kwargs):
+    if not (name.startswith('get_') or name in MEMOIZED_FIND_METHODS):
+        return False
+    return not any(kwargs.get(argument) is not None for argument in PAGING_ARGUMENTS)
+
+
+# name of the `DataAPIClient` method being called on this thread, set by `CachedDataAPIClient`
+_current_method = threading.local()
+
+
+def recorded_api_calls():
+    """Return the Data API requests made while handling the current request.
+
+    Each one is a dict with the client `method` name, the response `status` (None if the API
+    couldn't be reached), its `duration` in seconds and the response size in `bytes`.
+    """
+    if not has_app_context():
+        return []
+    return list(getattr(g, '_data_api_calls', []))
+
+
+def _record_api_call(**call):
+    if not has_app_context():
+        return
+    if not hasattr(g, '_data_api_calls'):
+        g._data_api_calls = []
+    # `list.append` is atomic, so calls made from `gather` threads can share the list
+    g._data_api_calls.append(call)
+
+
+class PooledDataAPIClient(dmapiclient.DataAPIClient):
+    """A `dmapiclient.DataAPIClient` that sends every request through one pooled `requests.Session`.
+
+    The stock client opens a new connection for each call. This one keeps up to
+    `DM_DATA_API_POOL_SIZE` keep-alive connections per worker, applies the configured connect
+    and read timeouts, and retries GETs (which are safe to repeat) on connection errors.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(PooledDataAPIClient, self).__init__(*args, **kwargs)
+        self._session = requests.Session()
+        self._timeout = None
+
+    def init_app(self, app):
+        super(PooledDataAPIClient, self).init_app(app)
+
+        # only connection errors are retried: after a read timeout the API is already working on
+        # the request (or stuck on it), so asking again would just make the caller wait longer
+        retries = Retry(
+            total=app.config['DM_DATA_API_GET_RETRIES'],
+            connect=app.config['DM_DATA_API_GET_RETRIES'],
+            read=False,
+            backoff_factor=app.config['DM_DATA_API_RETRY_BACKOFF'],
+            method_whitelist=frozenset(['GET', 'HEAD']),
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=app.config['DM_DATA_API_POOL_SIZE'],
+            max_retries=retries,
+        )
+
+        self._session = requests.Session()
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        if not app.config['DM_DATA_API_KEEP_ALIVE']:
+            self._session.headers['Connection'] = 'close'
+        self._timeout = (app.config['DM_DATA_API_CONNECT_TIMEOUT'], app.config['DM_DATA_API_READ_TIMEOUT'])
+
+    def pool_stats(self):
+        """Count requests made and connections opened through the session's connection pools."""
+        stats = {'requests': 0, 'connections': 0}
+        for adapter in self._session.adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                stats['requests'] += pool.num_requests
+                stats['connections'] += pool.num_connections
+        stats['reused'] = max(stats['requests'] - stats['connections'], 0)
+        return stats
+
+    def _request(self, method, url, data=None, params=None):
+        # Mirrors `dmapiclient.base.BaseAPIClient._request`, swapping `requests.request` for the session
+        if not self.enabled:
+            return None
+
+        url = urljoin(self.base_url, url)
+        headers = {
+            "Content-type": "application/json",
+            "Authorization": "Bearer {}".format(self.auth_token),
+            "User-agent": "DM-API-Client/{}".format(dmapiclient.__version__),
+        }
+        headers = self._add_request_id_header(headers)
+
+        start_time = time.time()
+        try:
+            response = self._session.request(
+                method, url,
+                headers=headers, json=data, params=params, timeout=self._timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            api_error = HTTPError.create(e)
+            duration = time.time() - start_time
+            self._record(api_error.status_code if e.response is not None else None, duration, e.response)
+            logger.log(
+                logging.INFO if api_error.status_code == 404 else logging.WARNING,
+                "API %s request on %s failed with %s '%s' after %.3fs",
+                method, url, api_error.status_code, api_error.message, duration
+            )
+            raise api_error
+        else:
+            duration = time.time() - start_time
+            self._record(response.status_code, duration, response)
+            logger.info("API %s request on %s finished in %.3fs", method, url, duration)
+
+        try:
+            return response.json()
+        except ValueError:
+            raise InvalidResponse(response, message="No JSON object could be decoded")
+
+    def _record(self, status, duration, response):
+        _record_api_call(
+            method=getattr(_current_method, 'name', None) or 'unknown',
+            status=status,
+            duration=duration,
+            bytes=len(response.content) if response is not None else 0,
+        )
+
+
+class CachedDataAPIClient(object):
+    """Proxy for a `dmapiclient.DataAPIClient` that memoizes reads for the current request.
+
+    Results of `get_*` calls (and the `find_*` calls in `MEMOIZED_FIND_METHODS`) are stored on
+    `flask.g`, keyed by method name and arguments, so calling the same method twice while
+    handling a request only goes to the API once. Any method that isn't a `get_*` or `find_*`
+    read is treated as a write and clears the stored results.
+
+    Other `find_*` calls, reads given a `page` or `per_page` and `find_*_iter` generators are
+    passed straight through: they return pages of list results, which are usually only read
+    once and would otherwise be copied and held on `g` until the end of the request.
+
+    Framework metadata (`SHARED_CACHE_METHODS`) is also kept between requests in `shared_cache`,
+    an `app.cache.TTLCache` configured from the `DM_FRAMEWORK_CACHE_*` settings.
+
+    If a `single_flight` (`app.concurrency.SingleFlight`) is given, identical reads made at the
+    same time by different threads share one upstream request.
+
+    The name of the method being called is made available to `PooledDataAPIClient`, so the
+    requests it makes can be attributed to it in `recorded_api_calls`.
+    """
+
+    def __init__(self, client, shared_cache=None, single_flight=None):
+        self._client = client
+        self._shared_cache = shared_cache
+        self._single_flight = single_flight
+
+    def init_app(self, app):
+        self._client.init_app(app)
+        if self._shared_cache is not None:
+            self._shared_cache.configure(
+                max_size=app.config['DM_FRAMEWORK_CACHE_SIZE'],
+                ttl=app.config['DM_FRAMEWORK_CACHE_TTL'],
+                stale_ttl=app.config['DM_FRAMEWORK_CACHE_STALE_TTL'],
+            )
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        if is_read_method(name):
+            if name.endswith('_iter'):
+                return _named_iter(name, attr)
+            return self._memoized(name, _named(name, attr))
+
+        return self._invalidating(_named(name, attr))
+
+    def _memoized(self, name, method):
+        def call(*args, **kwargs):
+            key = (name, repr(args), repr(sorted(kwargs.items())))
+            cache = _request_cache() if is_memoized_read(name, kwargs) else None
+            if cache is None:
+                return self._fetch(key, method, args, kwargs)
+
+            if key not in cache:
+                result = self._fetch(key, method, args, kwargs)
+                # callers are free to modify what they get back, so never hand out the stored copy
+                cache[key] = copy.deepcopy(result)
+                return result
+
+            return copy.deepcopy(cache[key])
+
+        return call
+
+    def _fetch(self, key, method, args, kwargs):
+        def load():
+            if self._single_flight is None:
+                return method(*args, **kwargs)
+            return self._single_flight.do(key, lambda: method(*args, **kwargs))
+
+        if self._shared_cache is None or key[0] not in SHARED_CACHE_METHODS:
+            return load()
+
+        return copy.deepcopy(self._shared_cache.get_or_load(key, load))
+
+    def _invalidating(self, method):
+        def call(*args, **kwargs):
+            try:
+                return method(*args, **kwargs)
+            finally:
+                cache = _request_cache()
+                if cache is not None:
+                    cache.clear()
+
+        return call
+
+
+def _named(name, method):
+    def call(*args, **kwargs):
+        previous = getattr(_current_method, 'name', None)
+        _current_method.name = name
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _current_method.name = previous
+
+    return call
+
+
+def _named_iter(name, method):
+    # generators make their requests as they're iterated, which may be on another thread (see
+    # `app.concurrency.prefetch`), so the name is set around each step rather than the call
+    def call(*args, **kwargs):
+        iterator = _named(name, method)(*args, **kwargs)
+        step = _named(name, next)
+        while True:
+            try:
+                item = step(iterator)
+            except StopIteration:
+                return
+            yield item
+
+    return call
+
+
+def _request_cache():
+    if not has_app_context():
+        return None
+    if not hasattr(g, '_data_api_cache'):
+        g._data_api_cache = {}
+    return g._data_api_cache
@@ -0,0 +1,151 @@
+(function(GOVUK, GDM) {
+
+  var escapeHTML = function(text) {
+
+        return $("<div/>").text(text).html();
+
+      },
+      wordsOfRevision = function(runs, revision) {
+
+        // equal runs have their words at 1; changed ones have revision 1's words at 1 and revision 2's at 2
+        var result = [];
+
+        $.each(runs, function(runIndex, run) {
+          var changed = run[0] != "equal";
+          $.each(changed ? run[revision] : run[1], function(index, text) {
+            result.push({
+              text: text,
+              changed: changed
+            });
+          });
+        });
+
+        return result;
+
+      },
+      renderCells = function(lineNumber, words, changeType) {
+
+        var type = "empty",
+            html = [];
+
+        if (words.length) {
+          type = $.grep(words, function(word) { return word.changed; }).length ? changeType : "unchanged";
+        }
+
+        $.each(words, function(index, word) {
+          html.push(
+            word.changed ? "<strong>" + escapeHTML(word.text) + "</strong>" : escapeHTML(word.text)
+          );
+        });
+
+        return (
+          "<td class='line-number line-number-" + type + "'>" + lineNumber + "</td>" +
+          "<td class='line-content " + type + "'>" + html.join(" ").split("</strong> <strong>").join(" ") + "</td>"
+        );
+
+      },
+      renderDiff = function(diff) {
+
+        var rows = $.map(diff.lines, function(line) {
+          return (
+            "<tr class='diff-row'>" +
+            renderCells(line[0], wordsOfRevision(line[2], 1), "removal") +
+            renderCells(line[1], wordsOfRevision(line[2], 2), "addition") +
+            "</tr>"
+          );
+        });
+
+        return (
+          "<table>" +
+          "<caption>" + escapeHTML(diff.label) + "</caption>" +
+          "<thead><tr>" +
+          "<th class='line-number'><span class='visuallyhidden'>Revision 1 line number</span></th>" +
+          "<th class='line-content'><span class='visuallyhidden'>Revision 1 changes</span></th>" +
+          "<th class='line-number'><span class='visuallyhidden'>Revision 2 line number</span></th>" +
+          "<th class='line-content'><span class='visuallyhidden'>Revision 2 changes</span></th>" +
+          "</tr></thead>" +
+          "<tbody>" + rows.join("") + "</tbody>" +
+          "</table>"
+        );
+
+      },
+      // draws the diffs from the compare endpoint's JSON as the tables the compare page shows
+      renderDiffs = function($container, data) {
+
+        if (!data.diffs.length) {
+          $container.html("<p>No changes to show</p>");
+          return;
+        }
+
+        $container.html($.map(data.diffs, renderDiff).join(""));
+
+      },
+      loadDiffs = function($container, done) {
+
+        $container.html("<p>Loading changes…</p>");
+
+        $.getJSON($container.data("revision-diffs-url"))
+          .done(function(data) {
+            renderDiffs($container, data);
+          })
+          .fail(function() {
+            $container.html("<p>The changes couldn’t be loaded</p>");
+          })
+          .always(done || $.noop);
+
+      },
+      // lazy containers are loaded once they're within this many pixels of the bottom of the window
+      lazyMargin = 800,
+      // and no more than this many at a time, so a long history doesn't ask the server for every diff at once
+      maxRequests = 2,
+      requests = 0,
+      queue = [],
+      loadNext = function() {
+
+        while (requests < maxRequests && queue.length) {
+          requests++;
+          loadDiffs(queue.shift(), function() {
+            requests--;
+            loadNext();
+          });
+        }
+
+      },
+      queueVisible = function($lazyContainers) {
+
+        var bottom = $(window).scrollTop() + $(window).height() + lazyMargin;
+
+        $lazyContainers.each(function() {
+          var $container = $(this);
+          if ($container.data("revision-diffs-queued") || $container.offset().top > bottom) return;
+          $container.data("revision-diffs-queued", true);
+          queue.push($container);
+        });
+
+        loadNext();
+
+      };
+
+  GOVUK.GDM.compareRevisions = function() {
+
+    var $containers = $("[data-revision-diffs-url]"),
+        $lazyContainers = $containers.filter("[data-revision-diffs-lazy]"),
+        timeout;
+
+    $containers.not($lazyContainers).each(function() {
+      loadDiffs($(this));
+    });
+
+    if (!$lazyContainers.length) return;
+
+    queueVisible($lazyContainers);
+    $(window).on("scroll resize", function() {
+      clearTimeout(timeout);
+      timeout = setTimeout(function() {
+        queueVisible($lazyContainers);
+      }, 100);
+    });
+
+  };
+
+}).apply(this, [GOVUK||{}, GOVUK.GDM||{}]);
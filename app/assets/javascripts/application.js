@@ -15,4 +15,5 @@
 //= include _selection-buttons.js
 //= include _scroll-through-statistics.js
 //= include _tables-to-charts.js
+//= include _compare-revisions.js
 //= include ../../../bower_components/digitalmarketplace-frontend-toolkit/toolkit/javascripts/module-loader.js
@@ -0,0 +1,292 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .files import ensure_private_directory, write_json
+
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache(object):
+    """A bounded, thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    Entries older than `ttl` but younger than `ttl + stale_ttl` are still returned, and a
+    background thread reloads them so the next caller gets a fresh value (stale-while-revalidate).
+    Anything older than that is loaded synchronously.
+
+    A `ttl` of 0 disables the cache: every lookup goes straight to the loader.
+    """
+
+    def __init__(self, max_size=128, ttl=60, stale_ttl=0, clock=time.time):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.configure(max_size, ttl, stale_ttl)
+
+    def configure(self, max_size, ttl, stale_ttl=0):
+        with self._lock:
+            self.max_size = max_size
+            self.ttl = ttl
+            self.stale_ttl = stale_ttl
+            self._entries = OrderedDict()
+            self._refreshing = set()
+            self._counters = dict.fromkeys(
+                ('hits', 'stale_hits', 'misses', 'evictions', 'refreshes', 'refresh_errors'), 0
+            )
+
+    @property
+    def enabled(self):
+        return bool(self.ttl and self.max_size)
+
+    def get_or_load(self, key, loader):
+        if not self.enabled:
+            return loader()
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+                age = self._clock() - entry[1]
+
+                if age < self.ttl:
+                    self._counters['hits'] += 1
+                    return entry[0]
+
+                if age < self.ttl + self.stale_ttl:
+                    self._counters['stale_hits'] += 1
+                    self._start_refresh(key, loader)
+                    return entry[0]
+
+            self._counters['misses'] += 1
+
+        value = loader()
+        self.set(key, value)
+        return value
+
+    def get(self, key):
+        """Return the cached value for `key` if it hasn't expired, otherwise `None`."""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._clock() - entry[1] < self.ttl:
+                self._entries.pop(key)
+                self._entries[key] = entry
+                self._counters['hits'] += 1
+                return entry[0]
+            self._counters['misses'] += 1
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, self._clock())
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters, size=len(self._entries), max_size=self.max_size, ttl=self.ttl)
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_ratio'] = round(float(stats['hits'] + stats['stale_hits']) / lookups, 3) if lookups else None
+        return stats
+
+    def _start_refresh(self, key, loader):
+        # must be called holding self._lock
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        thread = threading.Thread(target=self._refresh, args=(key, loader))
+        thread.daemon = True
+        thread.start()
+
+    def _refresh(self, key, loader):
+        try:
+            value = loader()
+        except Exception:
+            logger.exception("Failed to refresh cached value for %r", key)
+            with self._lock:
+                self._counters['refresh_errors'] += 1
+        else:
+            self.set(key, value)
+            with self._lock:
+                self._counters['refreshes'] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+
+class TimelineCache(object):
+    """A bounded, thread-safe LRU of timelines built from append-only series of immutable events.
+
+    Each timeline is a dict of named lists of rows, plus the id of the last event the rows were
+    built from. Callers only need to fetch and process events newer than that id, then `extend`
+    the timeline with the rows built from them.
+    """
+
+    def __init__(self, max_size=16):
+        self._lock = threading.Lock()
+        self.configure(max_size)
+
+    def configure(self, max_size):
+        with self._lock:
+            self.max_size = max_size
+            self._timelines = OrderedDict()
+            self._counters = dict.fromkeys(('hits', 'misses', 'extensions', 'evictions'), 0)
+
+    def get(self, key):
+        """Return `(last_id, series)` for the timeline cached for `key`, or `(None, None)`."""
+        with self._lock:
+            entry = self._timelines.pop(key, None)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None, None
+
+            self._timelines[key] = entry
+            self._counters['hits'] += 1
+            last_id, series = entry
+            return last_id, {name: list(rows) for name, rows in series.items()}
+
+    def extend(self, key, since_id, last_id, series):
+        """Add rows built from the events after `since_id`, up to and including `last_id`.
+
+        `since_id` is the id `get` returned (`None` for a new timeline). If the cached timeline
+        has moved on since then, because another thread extended it first, nothing is changed.
+        """
+        if not self.max_size:
+            return
+
+        with self._lock:
+            entry = self._timelines.pop(key, None)
+            cached_id, cached_series = entry if entry is not None else (None, {})
+            if cached_id != since_id:
+                if entry is not None:
+                    self._timelines[key] = entry
+                return
+
+            # lists handed out by `get` are copies, so the stored ones are never changed in place
+            self._timelines[key] = (last_id, {
+                name: cached_series.get(name, []) + list(rows) for name, rows in series.items()
+            })
+            self._counters['extensions'] += 1
+            while len(self._timelines) > self.max_size:
+                self._timelines.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._timelines.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, size=len(self._timelines), max_size=self.max_size)
+
+
+class ImmutableCache(object):
+    """A bounded, thread-safe LRU of values that never change once computed, optionally kept on disk too.
+
+    Nothing expires: entries are only dropped to make room. With a `directory`, values are also
+    written there as JSON, one file per key, so they're shared between processes and survive
+    restarts; values must be JSON serialisable and keys made of strings and numbers. Files are
+    never removed, but the directory can be emptied at any time.
+
+    The directory is created readable only by this user, and one that belongs to another user or
+    that others can write to isn't used (with a warning), as anyone able to write there could plant
+    values for the app to trust.
+    """
+
+    def __init__(self, max_size=128, directory=None):
+        self._lock = threading.Lock()
+        self.configure(max_size, directory)
+
+    def configure(self, max_size, directory=None):
+        if directory and not ensure_private_directory(directory):
+            directory = None
+        with self._lock:
+            self.max_size = max_size
+            self.directory = directory
+            self._entries = OrderedDict()
+            self._counters = dict.fromkeys(('hits', 'disk_hits', 'misses', 'evictions', 'disk_errors'), 0)
+
+    def get(self, key):
+        """Return the value cached for `key`, or `None`."""
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self._entries[key] = value
+                self._counters['hits'] += 1
+                return value
+
+        value = self._read(key)
+        with self._lock:
+            if value is None:
+                self._counters['misses'] += 1
+                return None
+            self._counters['disk_hits'] += 1
+            self._store(key, value)
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+        self._write(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._counters, size=len(self._entries), max_size=self.max_size, disk=self.directory is not None
+            )
+
+    def _store(self, key, value):
+        # must be called holding self._lock
+        if not self.max_size:
+            return
+        self._entries.pop(key, None)
+        self._entries[key] = value
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def _path(self, key):
+        digest = hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, '{}.json'.format(digest))
+
+    def _read(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write(self, key, value):
+        if not self.directory:
+            return
+        try:
+            write_json(self._path(key), value)
+        except (IOError, OSError):
+            logger.exception("Failed to write cached value for %r", key)
+            with self._lock:
+                self._counters['disk_errors'] += 1
@@ -0,0 +1,244 @@
+import copy
+import sys
+import threading
+from multiprocessing.pool import ThreadPool
+
+import six
+from six.moves import queue
+from flask import current_app, _app_ctx_stack, _request_ctx_stack
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_worker = threading.local()
+
+
+def gather(*calls):
+    """Run zero-argument callables concurrently and return their results in the same order.
+
+    Calls run on a per-process thread pool (sized by `DM_FAN_OUT_POOL_SIZE`) inside the caller's
+    app and request contexts, so `current_app`, `request`, `g` and `current_user` all work as
+    they would in the view. If any call raises, the exception from the first failing call (in
+    argument order) is re-raised once all of them have finished.
+
+        supplier, framework = gather(
+            lambda: data_api_client.get_supplier(supplier_id)['suppliers'],
+            lambda: data_api_client.get_framework(framework_slug)['frameworks'],
+        )
+
+    Calls made from a pool thread, or with a pool size of 0, run one after another instead so
+    nested fan-outs can't exhaust the pool.
+    """
+    pool = _get_pool()
+    if pool is None or len(calls) < 2 or getattr(_worker, 'active', False):
+        return [call() for call in calls]
+
+    pending = [pool.apply_async(_in_current_context(call)) for call in calls]
+    for result in pending:
+        result.wait()
+    return [result.get() for result in pending]
+
+
+def _get_pool():
+    global _pool
+
+    size = current_app.config['DM_FAN_OUT_POOL_SIZE'] if _app_ctx_stack.top is not None else 0
+    if not size:
+        return None
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPool(size)
+        return _pool
+
+
+def _in_current_context(call):
+    # Push the caller's own context objects (rather than copies) onto the worker thread's stacks,
+    # so the call shares `g` and the logged in user with the view and popping them afterwards
+    # doesn't trigger any teardown handlers.
+    app_context = _app_ctx_stack.top
+    request_context = _request_ctx_stack.top
+
+    def run():
+        _worker.active = True
+        if app_context is not None:
+            _app_ctx_stack.push(app_context)
+        if request_context is not None:
+            _request_ctx_stack.push(request_context)
+        try:
+            return call()
+        finally:
+            if request_context is not None:
+                _request_ctx_stack.pop()
+            if app_context is not None:
+                _app_ctx_stack.pop()
+            _worker.active = False
+
+    return run
+
+
+_END = object()
+
+
+def prefetch(iterable, buffer_size=100):
+    """Iterate over `iterable` on a background thread, keeping up to `buffer_size` items ready.
+
+    Meant for the Data API's paginated `find_*_iter` generators: while the caller works through
+    one page of results the next page is already being fetched, so a long walk takes about as
+    long as the slower of fetching and processing rather than the two added together. The
+    buffer caps how far ahead the background thread can get, and so how much memory it uses.
+
+    Exceptions raised while iterating are re-raised to the caller. The background thread stops
+    once the returned generator is exhausted or closed.
+    """
+    buffered = queue.Queue(maxsize=buffer_size)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                buffered.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except Exception:
+            put((_END, sys.exc_info()))
+        else:
+            put((_END, None))
+
+    thread = threading.Thread(target=_in_current_context(produce))
+    thread.daemon = True
+    thread.start()
+
+    try:
+        while True:
+            item, exc_info = buffered.get()
+            if item is _END:
+                if exc_info is not None:
+                    six.reraise(*exc_info)
+                return
+            yield item
+    finally:
+        stopped.set()
+
+
+class SingleFlight(object):
+    """Collapses concurrent calls that share a key into a single call.
+
+    While a call for `key` is running, any other thread calling `do` with the same key waits for
+    it to finish and gets a deep copy of its result (or its exception) instead of making the
+    call again. Results aren't kept once the call has finished.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._counters = {'calls': 0, 'shared': 0}
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _InFlightCall()
+                self._counters['calls'] += 1
+                leader = True
+            else:
+                call.followers += 1
+                self._counters['shared'] += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.exc_info is not None:
+                six.reraise(*call.exc_info)
+            return copy.deepcopy(call.result)
+
+        try:
+            result = func()
+        except BaseException:
+            call.exc_info = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                followers = call.followers
+
+            if followers and call.exc_info is None:
+                # the caller is free to modify `result`, so followers copy from a snapshot of it
+                call.result = copy.deepcopy(result)
+            call.done.set()
+
+        return result
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, in_flight=len(self._calls))
+
+
+class _InFlightCall(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.followers = 0
+        self.result = None
+        self.exc_info = None
+
+
+class Throttle(object):
+    """Lets at most `max_concurrent` calls through `do` run at once; the others wait their turn.
+
+    Meant for CPU-bound work done in request threads, like diffing service revisions: running
+    more of it at once than there are cores to spare only slows every call down and holds more
+    memory. With a `max_concurrent` of 0 calls aren't limited.
+    """
+
+    def __init__(self, max_concurrent=0):
+        self._lock = threading.Lock()
+        self._counters = {'calls': 0, 'waited': 0}
+        self._running = 0
+        self._waiting = 0
+        self.configure(max_concurrent)
+
+    def configure(self, max_concurrent):
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+
+    def do(self, func):
+        slots = self._slots
+        if slots is None:
+            return func()
+
+        with self._lock:
+            self._counters['calls'] += 1
+            if not slots.acquire(False):
+                self._counters['waited'] += 1
+                self._waiting += 1
+                queued = True
+            else:
+                queued = False
+
+        if queued:
+            slots.acquire()
+            with self._lock:
+                self._waiting -= 1
+
+        with self._lock:
+            self._running += 1
+        try:
+            return func()
+        finally:
+            with self._lock:
+                self._running -= 1
+            slots.release()
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._counters, running=self._running, waiting=self._waiting, max_concurrent=self.max_concurrent
+            )
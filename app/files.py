@@ -0,0 +1,53 @@
+import json
+import logging
+import os
+import stat
+import tempfile
+
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_private_directory(directory):
+    """Create `directory`, readable only by this user, if it's missing and return whether it can be trusted.
+
+    A directory that belongs to another user, or that others can write to, can't be: anyone able to
+    write there could plant files for the app to read back. Either way it's logged as a warning.
+    """
+    try:
+        os.makedirs(directory, 0o700)
+    except OSError:
+        # already there (perhaps created by another process in the meantime), or it can't be made
+        pass
+
+    try:
+        details = os.stat(directory)
+    except OSError:
+        logger.exception("Not using %s: it couldn't be created", directory)
+        return False
+
+    if not stat.S_ISDIR(details.st_mode) or details.st_uid != os.getuid() \
+            or details.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        logger.warning(
+            "Not using %s: it must be a directory belonging to this user and not writable by others", directory
+        )
+        return False
+    return True
+
+
+def write_json(path, value):
+    """Write `value` to `path` as JSON in one go, so readers (in any process) never see half a file.
+
+    It's written to a temporary file in the same directory and renamed over `path`. Errors are raised
+    to the caller, and any temporary file left behind is removed.
+    """
+    handle, temporary_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix='.{}-'.format(os.path.basename(path))
+    )
+    try:
+        with os.fdopen(handle, 'w') as f:
+            json.dump(value, f)
+        os.rename(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
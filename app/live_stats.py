@@ -0,0 +1,99 @@
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+
+from dmutils.formats import DATETIME_FORMAT
+
+from .files import ensure_private_directory, write_json
+
+
+logger = logging.getLogger(__name__)
+
+FRAMEWORK_SLUG = re.compile(r'^[a-z0-9-]+$')
+
+
+class LiveStatsStore(object):
+    """Live framework stats computed ahead of time, shared between processes through files.
+
+    `refresh` (run by the `refresh_live_stats` manager command) fetches the stats of every open
+    framework and writes them to `DM_LIVE_STATS_DIR`, one JSON file per framework, replacing the
+    previous file atomically. `get` returns the stored stats with the time they were computed,
+    unless they're older than `DM_LIVE_STATS_MAX_AGE` seconds (say, because the refresher has
+    stopped), in which case the caller should fetch them itself and `put` them back for others.
+
+    With no `DM_LIVE_STATS_DIR` nothing is stored. The directory is checked (and created, readable
+    only by the app's user) once by `init_app`; one that belongs to another user or that others can
+    write to is ignored, with a warning, so nobody else can plant stats for admins to see. Stats that
+    can't be written are logged and counted rather than failing the page that computed them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.directory = None
+        self.max_age = 0
+        self._counters = {'write_errors': 0}
+
+    def init_app(self, app):
+        directory = app.config['DM_LIVE_STATS_DIR']
+        self.directory = directory if directory and ensure_private_directory(directory) else None
+        self.max_age = app.config['DM_LIVE_STATS_MAX_AGE']
+
+    def get(self, framework_slug):
+        """Return `(stats, computed_at)` for the framework, or `(None, None)` if there are none fresh enough."""
+        path = self._path(framework_slug)
+        if path is None or not self.max_age:
+            return None, None
+
+        try:
+            with open(path) as f:
+                stored = json.load(f)
+            computed_at = datetime.strptime(stored['computedAt'], DATETIME_FORMAT)
+        except (IOError, OSError, ValueError, KeyError):
+            return None, None
+
+        if datetime.utcnow() - computed_at > timedelta(seconds=self.max_age):
+            return None, None
+        return stored['stats'], computed_at
+
+    def put(self, framework_slug, stats, computed_at=None):
+        """Store the framework's stats, returning whether they were."""
+        path = self._path(framework_slug)
+        if path is None:
+            return False
+
+        computed_at = computed_at or datetime.utcnow()
+        try:
+            write_json(path, {'computedAt': computed_at.strftime(DATETIME_FORMAT), 'stats': stats})
+        except (IOError, OSError):
+            logger.exception("Failed to store live stats for %s", framework_slug)
+            with self._lock:
+                self._counters['write_errors'] += 1
+            return False
+        return True
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, enabled=self.directory is not None)
+
+    def refresh(self, data_api_client):
+        """Fetch and store the stats of every open framework, returning their slugs."""
+        refreshed = []
+        for framework in data_api_client.find_frameworks()['frameworks']:
+            if framework['status'] != 'open':
+                continue
+            try:
+                stats = data_api_client.get_framework_stats(framework['slug'])
+            except Exception:
+                logger.exception("Failed to refresh live stats for %s", framework['slug'])
+                continue
+            if self.put(framework['slug'], stats):
+                refreshed.append(framework['slug'])
+        return refreshed
+
+    def _path(self, framework_slug):
+        if not self.directory or not FRAMEWORK_SLUG.match(framework_slug):
+            return None
+        return os.path.join(self.directory, '{}.json'.format(framework_slug))
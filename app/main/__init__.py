@@ -1,4 +1,8 @@
-from flask import Blueprint
+from collections import OrderedDict
+
+from flask import Blueprint, current_app, request
+
+from app.api_client import recorded_api_calls
 
 
 main = Blueprint('main', __name__)
@@ -9,5 +13,39 @@ from app.main import errors
 
 @main.after_request
 def add_cache_control(response):
-    response.cache_control.no_cache = True
+    # views that set their own caching policy (e.g. for conditional requests) keep it
+    if 'Cache-Control' not in response.headers:
+        response.cache_control.no_cache = True
+    return response
+
+
+@main.after_request
+def add_data_api_timing(response):
+    calls = recorded_api_calls()
+    if not calls:
+        return response
+
+    total_duration = sum(call['duration'] for call in calls)
+    by_method = OrderedDict()
+    for call in calls:
+        count, duration = by_method.get(call['method'], (0, 0))
+        by_method[call['method']] = (count + 1, duration + call['duration'])
+
+    response.headers['Server-Timing'] = ', '.join(
+        ['dataapi;dur={:.1f};desc="{} calls"'.format(total_duration * 1000, len(calls))] +
+        ['{};dur={:.1f};desc="{} calls"'.format(method, duration * 1000, count)
+         for method, (count, duration) in by_method.items()]
+    )
+
+    current_app.logger.info(
+        "Data API: %s calls taking %.3fs for %s %s", len(calls), total_duration, request.method, request.path,
+        extra={
+            'data_api_calls': calls,
+            'data_api_call_count': len(calls),
+            'data_api_duration': total_duration,
+            'data_api_bytes': sum(call['bytes'] for call in calls),
+            'data_api_errors': sum(1 for call in calls if call['status'] is None or call['status'] >= 400),
+        }
+    )
+
     return response
@@ -1,20 +1,55 @@
-import difflib
 try:
     from itertools import izip_longest
 except ImportError:
     from itertools import zip_longest as izip_longest
+import difflib
+import hashlib
+import json
 from datetime import datetime
 from flask import Markup, escape
 from flask._compat import string_types
 from dmutils.formats import DATETIME_FORMAT, DISPLAY_DATETIME_FORMAT
 
 
+# the version of the `diff_lines` rows, to be bumped when they change shape so stored diffs aren't misread
+DIFF_LINES_FORMAT = 2
+
+
 def get_diffs_from_service_data(
         sections=None,
         revision_1=None,
         revision_2=None,
-        include_unchanged_lines_in_output=False
+        include_unchanged_lines_in_output=False,
+        counts=None
+):
+    """
+    Returns the diffs of the questions in `sections` that changed between the revisions,
+    as rows of HTML table cells (see `get_structured_diffs_from_service_data`)
+    """
+    return render_structured_diffs(get_structured_diffs_from_service_data(
+        sections=sections,
+        revision_1=revision_1,
+        revision_2=revision_2,
+        include_unchanged_lines_in_output=include_unchanged_lines_in_output,
+        counts=counts
+    ))
+
+
+def get_structured_diffs_from_service_data(
+        sections=None,
+        revision_1=None,
+        revision_2=None,
+        include_unchanged_lines_in_output=False,
+        counts=None
 ):
+    """
+    Returns the diffs of the questions in `sections` that changed between the revisions,
+    with the lines of each as `diff_lines` rows
+
+    Questions whose answers are equal in both revisions (usually most of them) have no changes
+    to show, so unless unchanged lines are wanted they're skipped without being diffed. If
+    `counts` is given, it's updated with how many questions were 'diffed' and 'skipped'.
+    """
     def all_are_lists(*args):
         return all(isinstance(arg, list) for arg in args)
 
@@ -22,9 +57,16 @@ def get_diffs_from_service_data(
         return all(isinstance(arg, string_types) for arg in args)
 
     diffs = []
+    diffed = skipped = 0
 
     for section in sections:
         for question in section['questions']:
+            if not include_unchanged_lines_in_output \
+                    and revision_1.get(question['id']) == revision_2.get(question['id']):
+                skipped += 1
+                continue
+            diffed += 1
+
             question_revision_1, question_revision_2 = None, None
 
             if all_are_lists(
@@ -42,26 +84,63 @@ def get_diffs_from_service_data(
                 question_revision_2 = revision_2.get(question['id'], '').splitlines()
 
             if question_revision_1 is not None and question_revision_2 is not None:
-                question_diff = render_lines(
+                question_lines = diff_lines(
                     question_revision_1,
                     question_revision_2,
                     include_unchanged_lines_in_output
                 )
 
-                # if arrays are empty, there are no changes for this question
-                if question_diff['revision_1'] or question_diff['revision_2']:
+                # if there are no lines, there are no changes for this question
+                if question_lines:
                     diffs.append({
                         'section_name': section['name'],
                         'label': question['question'],
-                        'revisions':
-                            [val + question_diff['revision_2'][i]
-                             for i, val
-                             in enumerate(question_diff['revision_1'])]
+                        'lines': question_lines
                     })
 
+    if counts is not None:
+        counts['diffed'] = counts.get('diffed', 0) + diffed
+        counts['skipped'] = counts.get('skipped', 0) + skipped
+
     return diffs
 
 
+def render_structured_diffs(structured_diffs):
+    """
+    Turns the lines of `get_structured_diffs_from_service_data` diffs into rows of HTML table cells
+    """
+    diffs = []
+    for diff in structured_diffs:
+        lines = {
+            'revision_1': [],
+            'revision_2': []
+        }
+        for line in diff['lines']:
+            _append_line(lines, *line)
+
+        diffs.append({
+            'section_name': diff['section_name'],
+            'label': diff['label'],
+            'revisions':
+                [val + lines['revision_2'][i]
+                 for i, val
+                 in enumerate(lines['revision_1'])]
+        })
+    return diffs
+
+
+def get_sections_fingerprint(sections):
+    """
+    Returns a hash of the questions in a manifest's sections,
+    which changes if questions are added, removed, renamed or moved
+    """
+    questions = [
+        [section['name'], [[question['id'], question['question']] for question in section['questions']]]
+        for section in sections
+    ]
+    return hashlib.sha1(json.dumps(questions).encode('utf-8')).hexdigest()
+
+
 def get_revision_dates(revision_1=None, revision_2=None):
 
     def get_revision_date(date_string):
@@ -95,38 +174,79 @@ def render_lines(
         'revision_2': []
     }
 
-    for index, revisions in enumerate(
-            izip_longest(revision_1, revision_2, fillvalue='')
-    ):
-        diff = get_words_diff(revisions[0], revisions[1])
+    for line in diff_lines(revision_1, revision_2, include_unchanged_lines_in_output):
+        _append_line(lines, *line)
+
+    return lines
+
+
+def diff_lines(
+        revision_1, revision_2, include_unchanged_lines_in_output=False):
+    """
+    Turns a pair of input lines into a list of lines to show, with the words of each and their diff
+
+    In:
+    revision_1: ['Hi there', 'Less letters']
+    revision_2: ['Hi there!', 'Less let']
+
+    Out:
+    [[1, 1, [['equal', ['Hi']], ['replace', ['there'], ['there!']]]],
+     [2, 2, [['equal', ['Less']], ['replace', ['letters'], ['let']]]]]
+
+    Each line is the line numbers in both revisions and the runs of words (see `get_words_runs`)
+    turning the line in the first revision into the line in the second.
 
-        # create an array of removed words and one of added rows
-        revision_1_words, revision_2_words = split_words_diff(diff)
+    Lines are lined up with a line diff first, so a line added or removed near the top doesn't
+    put every line after it out of step, and only the lines that changed are diffed word by word.
+    Changed lines are paired up in order, and lines without a partner are set against an empty
+    line numbered where the line would be in the other revision.
+    """
 
-        # if revisions are equal and we want to skip unchanged lines
-        if revision_1_words == revision_2_words \
-            and get_line_type(revision_1_words) == 'unchanged' \
-            and get_line_type(revision_2_words) == 'unchanged' \
-                and not include_unchanged_lines_in_output:
+    lines = []
+
+    for tag, i1, i2, j1, j2 in get_opcodes(revision_1, revision_2):
+        if tag == 'equal':
+            if include_unchanged_lines_in_output:
+                for offset, line in enumerate(revision_1[i1:i2]):
+                    words = line.split()
+                    runs = [['equal', words]] if words else []
+                    lines.append([i1 + offset + 1, j1 + offset + 1, runs])
             continue
 
-        lines['revision_1'].append(
-            Markup(render_words_html(revision_1_words, index+1))
-        )
-        lines['revision_2'].append(
-            Markup(render_words_html(revision_2_words, index+1))
-        )
+        for offset, revisions in enumerate(
+                izip_longest(revision_1[i1:i2], revision_2[j1:j2], fillvalue='')
+        ):
+            # Splitting the lines on whitespace to that we get a word diff
+            revision_1_words = revisions[0].split()
+            runs = get_words_runs(revision_1_words, revisions[1].split())
+
+            # if only whitespace has changed and we want to skip unchanged lines
+            if revision_1_words and all(run[0] == 'equal' for run in runs) \
+                    and not include_unchanged_lines_in_output:
+                continue
+
+            lines.append([i1 + offset + 1, j1 + offset + 1, runs])
 
     return lines
 
 
+def _append_line(lines, revision_1_line_number, revision_2_line_number, runs):
+    # create an array of removed words and one of added rows
+    revision_1_words, revision_2_words = split_words_diff(_prefix_words(runs))
+    lines['revision_1'].append(
+        Markup(render_words_html(revision_1_words, revision_1_line_number))
+    )
+    lines['revision_2'].append(
+        Markup(render_words_html(revision_2_words, revision_2_line_number))
+    )
+
+
 def split_words_diff(words_diff):
     """
     Accepts a list of words that have been diffed
     Returns two lists: one with removals ('-') and one with additions ('+')
-    Ignores detail ('?') lines
 
-    In:  ['  Hi', '- there', '+ there!', '?      +\n']
+    In:  ['  Hi', '- there', '+ there!']
     Out: (['  Hi', '- there'], ['  Hi', '+ there!'])
     """
 
@@ -172,13 +292,233 @@ def get_words_diff(revision_1_line, revision_2_line):
     Returns a list of word-diffs
 
     In:  'Hi there', 'Hi there!'
-    Out: ['  Hi', '- there', '+ there!', '?      +\n']
+    Out: ['  Hi', '- there', '+ there!']
     """
-    differ = difflib.Differ()
     # Splitting the lines on whitespace to that we get a word diff
-    return list(differ.compare(
-        revision_1_line.split(), revision_2_line.split()
-    ))
+    return _prefix_words(get_words_runs(revision_1_line.split(), revision_2_line.split()))
+
+
+def _prefix_words(runs):
+    words_diff = []
+    for run in runs:
+        if run[0] == 'equal':
+            words_diff.extend('  ' + word for word in run[1])
+        else:
+            words_diff.extend('- ' + word for word in run[1])
+            words_diff.extend('+ ' + word for word in run[2])
+    return words_diff
+
+
+def get_words_runs(words_1, words_2):
+    """
+    Accepts two lists of words
+    Returns the runs of words turning the first into the second: `['equal', words]` for words
+    both have, and `[tag, removed words, added words]` for the rest, where the tag is 'replace',
+    'delete' (no added words) or 'insert' (no removed words)
+
+    In:  ['Hi', 'there'], ['Hi', 'there!']
+    Out: [['equal', ['Hi']], ['replace', ['there'], ['there!']]]
+
+    Unlike opcodes, which need both lists of words to be read, runs hold each word once, however
+    little of a long line has changed.
+    """
+    runs = []
+    for tag, i1, i2, j1, j2 in get_words_opcodes(words_1, words_2):
+        if tag == 'equal':
+            runs.append(['equal', words_1[i1:i2]])
+        else:
+            runs.append([tag, words_1[i1:i2], words_2[j1:j2]])
+    return runs
+
+
+# difflib's matcher treats words that are over 1% of a list this long or longer as junk
+DIFFLIB_AUTOJUNK_MIN_WORDS = 200
+
+
+def get_words_opcodes(words_1, words_2):
+    """
+    Accepts two lists of words
+    Returns difflib-style opcodes turning the first into the second, for showing as a word diff
+
+    Lists of under 200 words (nearly every line of a service) are diffed with difflib's
+    `SequenceMatcher`, so they're marked up exactly as they were when lines were compared with
+    `difflib.Differ`. Where words repeat there are often several diffs as short as each other,
+    and the matcher picks the one built around the earliest, longest run of matching words.
+
+    Longer lists are diffed with `get_opcodes`, which stays fast however long they get. Their
+    diffs can differ from `Differ`'s, which ignores common words in long lists and then pairs
+    the rest up by how alike their letters are, in time growing with the square of the length.
+    """
+    if len(words_2) < DIFFLIB_AUTOJUNK_MIN_WORDS:
+        return difflib.SequenceMatcher(None, words_1, words_2).get_opcodes()
+    return get_opcodes(words_1, words_2)
+
+
+def get_opcodes(tokens_1, tokens_2):
+    """
+    Accepts two lists of tokens (words, lines...)
+    Returns difflib-style opcodes turning the first into the second
+
+    In:  ['Hi', 'there'], ['Hi', 'there!']
+    Out: [('equal', 0, 1, 0, 1), ('replace', 1, 2, 1, 2)]
+
+    Found with Myers' O(ND) algorithm in linear space, so it takes time in proportion to the
+    length of the lists times the number of differences between them rather than to the square
+    of their length. Tokens that only appear in one of the lists can't be matched, so they're
+    left out of the search.
+
+    The diff is a shortest one unless some part of the lists has more than `MAX_SPLIT_COST`
+    differences. That part is then split where the search got furthest, which keeps very
+    different lists quick to diff, but can leave the diff longer than it needs to be. Where
+    there are several shortest diffs it doesn't pick the same one as difflib, so words are
+    diffed with `get_words_opcodes`.
+    """
+    codes = {}
+    codes_1 = [codes.setdefault(token, len(codes)) for token in tokens_1]
+    codes_2 = [codes.setdefault(token, len(codes)) for token in tokens_2]
+
+    in_1, in_2 = set(codes_1), set(codes_2)
+    indexes_1 = [index for index, code in enumerate(codes_1) if code in in_2]
+    indexes_2 = [index for index, code in enumerate(codes_2) if code in in_1]
+
+    matches = _matching_indexes(
+        [codes_1[index] for index in indexes_1],
+        [codes_2[index] for index in indexes_2]
+    )
+
+    opcodes = []
+    i = j = 0
+    for match_1, match_2 in matches:
+        match_1, match_2 = indexes_1[match_1], indexes_2[match_2]
+        if (i, j) != (match_1, match_2):
+            opcodes.append((_edit_tag(match_1 - i, match_2 - j), i, match_1, j, match_2))
+        if opcodes and opcodes[-1][0] == 'equal' and opcodes[-1][2] == match_1:
+            opcodes[-1] = ('equal', opcodes[-1][1], match_1 + 1, opcodes[-1][3], match_2 + 1)
+        else:
+            opcodes.append(('equal', match_1, match_1 + 1, match_2, match_2 + 1))
+        i, j = match_1 + 1, match_2 + 1
+    if i < len(tokens_1) or j < len(tokens_2):
+        opcodes.append((_edit_tag(len(tokens_1) - i, len(tokens_2) - j), i, len(tokens_1), j, len(tokens_2)))
+
+    return opcodes
+
+
+def _edit_tag(removed, added):
+    if removed and added:
+        return 'replace'
+    return 'delete' if removed else 'insert'
+
+
+# Past this many differences in one part of a diff, settle for splitting it where the search got
+# furthest rather than looking for the best split, so very different inputs still diff quickly
+# (the diff is then no longer necessarily a shortest one)
+MAX_SPLIT_COST = 64
+
+
+def _matching_indexes(a, b):
+    """Return the `(index in a, index in b)` pairs of a longest common subsequence of `a` and `b`, in order."""
+    matches = []
+    boxes = [(0, len(a), 0, len(b))]
+    while boxes:
+        a_low, a_high, b_low, b_high = boxes.pop()
+
+        # common prefixes and suffixes are matched without searching
+        while a_low < a_high and b_low < b_high and a[a_low] == b[b_low]:
+            matches.append((a_low, b_low))
+            a_low += 1
+            b_low += 1
+        while a_low < a_high and b_low < b_high and a[a_high - 1] == b[b_high - 1]:
+            a_high -= 1
+            b_high -= 1
+            matches.append((a_high, b_high))
+
+        if a_low == a_high or b_low == b_high:
+            continue
+
+        split = _find_split(a, a_low, a_high, b, b_low, b_high)
+        if split is None:
+            continue
+        a_split, b_split = split
+        boxes.append((a_low, a_split, b_low, b_split))
+        boxes.append((a_split, a_high, b_split, b_high))
+
+    matches.sort()
+    return matches
+
+
+def _find_split(a, a_low, a_high, b, b_low, b_high):
+    """Find a point to split the diff of `a[a_low:a_high]` and `b[b_low:b_high]` at.
+
+    Searches forwards from the start and backwards from the end at once until the two searches
+    meet (the "middle snake"), keeping only the furthest point reached on each diagonal, as in
+    Myers' linear space refinement. That point is on a shortest diff. If the searches haven't
+    met after `MAX_SPLIT_COST` differences, returns the furthest point the forward search got
+    to instead, which a shortest diff might not go through. Returns `None` if nothing in the
+    two ranges matches.
+    """
+    n, m = a_high - a_low, b_high - b_low
+    delta = n - m
+    odd = delta % 2
+    max_d = (n + m + 1) // 2
+    offset = max_d + 1
+    size = 2 * max_d + 3
+    forward = [-1] * size
+    backward = [-1] * size
+    forward[offset + 1] = backward[offset + 1] = 0
+
+    # diagonals whose paths have left the box aren't followed any further
+    forward_start = forward_end = backward_start = backward_end = 0
+
+    for d in range(min(max_d, MAX_SPLIT_COST)):
+        for k in range(-d + forward_start, d + 1 - forward_end, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[a_low + x] == b[b_low + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            if x > n:
+                forward_end += 2
+            elif y > m:
+                forward_start += 2
+            elif odd and 0 <= offset + delta - k < size:
+                backward_x = backward[offset + delta - k]
+                if backward_x != -1 and x >= n - backward_x:
+                    return a_low + x, b_low + y
+
+        for k in range(-d + backward_start, d + 1 - backward_end, 2):
+            if k == -d or (k != d and backward[offset + k - 1] < backward[offset + k + 1]):
+                x = backward[offset + k + 1]
+            else:
+                x = backward[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[a_high - 1 - x] == b[b_high - 1 - y]:
+                x += 1
+                y += 1
+            backward[offset + k] = x
+            if x > n:
+                backward_end += 2
+            elif y > m:
+                backward_start += 2
+            elif not odd and 0 <= offset + delta - k < size:
+                forward_x = forward[offset + delta - k]
+                if forward_x != -1 and forward_x >= n - x:
+                    return a_low + forward_x, b_low + forward_x - delta + k
+
+    if max_d <= MAX_SPLIT_COST:
+        return None
+
+    # too many differences: split at the furthest point the forward search reached
+    reached = [
+        (forward[offset + k], forward[offset + k] - k)
+        for k in range(-d + forward_start, d + 1 - forward_end, 2)
+        if 0 <= forward[offset + k] <= n and 0 <= forward[offset + k] - k <= m
+    ]
+    x, y = max(reached, key=sum)
+    return a_low + x, b_low + y
 
 
 def get_line_type(words, types_to_look_for=None):
@@ -0,0 +1,44 @@
+def downsample(rows, max_points):
+    """Pick at most `max_points` of `rows` that keep the shape of the series they chart.
+
+    Uses Largest-Triangle-Three-Buckets: the first and last rows are always kept, and the rows
+    in between are split into `max_points - 2` buckets, from each of which the row making the
+    largest triangle with the row picked before it and the average of the next bucket is kept.
+    Rows are `format_snapshots` rows, so the triangle areas for every label are added up and a
+    whole row (with its `created_at`) is always kept or dropped together.
+    """
+    if not max_points or len(rows) <= max_points:
+        return list(rows)
+    if max_points < 3:
+        return [rows[0], rows[-1]][:max_points]
+
+    labels = [key for key in rows[0] if key != 'created_at']
+    bucket_size = float(len(rows) - 2) / (max_points - 2)
+
+    sampled = [rows[0]]
+    previous = 0
+    for bucket in range(max_points - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        next_start, next_end = end, min(int((bucket + 2) * bucket_size) + 1, len(rows))
+        if next_start >= next_end:
+            next_start, next_end = len(rows) - 1, len(rows)
+        next_x = (next_start + next_end - 1) / 2.0
+        next_y = [
+            float(sum(rows[index][label] for index in range(next_start, next_end))) / (next_end - next_start)
+            for label in labels
+        ]
+
+        def area(index):
+            return sum(
+                abs((previous - next_x) * (rows[index][label] - rows[previous][label]) -
+                    (previous - index) * (label_next_y - rows[previous][label]))
+                for label, label_next_y in zip(labels, next_y)
+            )
+
+        previous = max(range(start, end), key=area)
+        sampled.append(rows[previous])
+
+    sampled.append(rows[-1])
+    return sampled
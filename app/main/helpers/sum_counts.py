@@ -1,22 +1,150 @@
 from datetime import datetime
 
+import six
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Below this many statistics in a window, building NumPy arrays costs more than it saves
+COLUMNAR_MIN_STATISTICS = 5000
+
 
 def format_snapshots(snapshots, category, groupings):
+    if numpy is not None and sum(len(snapshot['data'][category]) for snapshot in snapshots) >= COLUMNAR_MIN_STATISTICS:
+        formatted = _format_snapshots_columnar(snapshots, category, groupings)
+        if formatted is not None:
+            return formatted
+
+    aggregate = compile_groupings(groupings)
     return [
-        _label_and_count(
-            snapshot['data'][category], groupings, snapshot['createdAt']
-        )
+        aggregate(snapshot['data'][category], snapshot['createdAt'])
         for snapshot in snapshots
     ]
 
 
+def compile_groupings(groupings, sum_by='count'):
+    """Build a function that sums a list of statistics into each of the labelled `groupings`.
+
+    The result of `aggregate(stats, created_at)` is the same as `_label_and_count`'s, but every
+    statistic is looked at once rather than once per label: the labels a statistic counts towards
+    only depend on the values of the keys the groupings filter on, so they're worked out the first
+    time each combination of values is seen and reused for the rest of the statistics (and every
+    other snapshot aggregated with the same function).
+    """
+    grouping = _Grouping(groupings)
+    labels = grouping.labels
+
+    def aggregate(stats, created_at):
+        totals = [0] * len(labels)
+        for statistic in stats:
+            signature = grouping.signature(statistic)
+            try:
+                indexes = grouping.matching_labels(signature)
+            except TypeError:
+                # unhashable values can't be remembered, but can still be matched
+                indexes = grouping.match(signature)
+
+            if indexes:
+                count = statistic[sum_by]
+                for index in indexes:
+                    totals[index] += count
+
+        data = dict(zip(labels, totals))
+        data['created_at'] = created_at
+        return data
+
+    return aggregate
+
+
+def _format_snapshots_columnar(snapshots, category, groupings, sum_by='count'):
+    """`format_snapshots` for long windows, summing every snapshot's statistics at once with NumPy.
+
+    Statistics are flattened into columns: the snapshot each one came from, a code for the
+    combination of values the groupings filter on, and its count. Counts are summed per snapshot
+    and code, then multiplied by a code-to-label membership matrix to get every label's total for
+    every snapshot.
+
+    Returns `None` if the statistics can't be represented exactly this way (counts that aren't
+    integers, or unhashable values), so the caller can fall back to `compile_groupings`.
+    """
+    grouping = _Grouping(groupings)
+    keys = grouping.keys
+    codes = {}
+    code_labels = []
+    positions, cell_codes, counts = [], [], []
+
+    # a plain loop with local names: this is the only part of the work done per statistic in Python
+    for position, snapshot in enumerate(snapshots):
+        for statistic in snapshot['data'][category]:
+            signature = tuple([statistic.get(key) for key in keys])
+            try:
+                code = codes[signature]
+            except KeyError:
+                code = codes[signature] = len(code_labels)
+                code_labels.append(grouping.match(signature))
+            except TypeError:
+                return None
+
+            if code_labels[code]:
+                positions.append(position)
+                cell_codes.append(code)
+                counts.append(statistic[sum_by])
+
+    if not all(isinstance(count, six.integer_types) for count in counts):
+        return None
+
+    counts = numpy.array(counts, dtype=numpy.int64)
+    if numpy.abs(counts).sum() >= 2 ** 53:
+        # too big to be summed exactly as floats by `bincount`
+        return None
+    cells = numpy.array(positions, dtype=numpy.intp) * len(code_labels) + numpy.array(cell_codes, dtype=numpy.intp)
+    totals_by_code = numpy.bincount(
+        cells, weights=counts, minlength=len(snapshots) * len(code_labels)
+    ).astype(numpy.int64).reshape(len(snapshots), len(code_labels))
+
+    membership = numpy.zeros((len(code_labels), len(grouping.labels)), dtype=numpy.int64)
+    for code, indexes in enumerate(code_labels):
+        membership[code, list(indexes)] = 1
+
+    return [
+        dict(zip(grouping.labels, totals), created_at=snapshot['createdAt'])
+        for snapshot, totals in zip(snapshots, totals_by_code.dot(membership).tolist())
+    ]
+
+
+class _Grouping(object):
+    def __init__(self, groupings):
+        self.labels = list(groupings.keys())
+        self.keys = sorted(set(key for filters in groupings.values() for key in filters))
+        self._filters = [
+            [(self.keys.index(key), value) for key, value in groupings[label].items()]
+            for label in self.labels
+        ]
+        self._matches = {}
+
+    def signature(self, statistic):
+        return tuple([statistic.get(key) for key in self.keys])
+
+    def matching_labels(self, signature):
+        """Indexes of the labels matching `signature`, remembered for next time."""
+        try:
+            return self._matches[signature]
+        except KeyError:
+            indexes = self._matches[signature] = self.match(signature)
+            return indexes
+
+    def match(self, signature):
+        return tuple(
+            index for index, label_filters in enumerate(self._filters)
+            if all(_find(signature[key_index], value) for key_index, value in label_filters)
+        )
+
+
 def _label_and_count(stats, groupings, created_at):
-    data = {
-        label: _sum_counts(stats, filters)
-        for label, filters in groupings.items()
-    }
-    data['created_at'] = created_at
-    return data
+    return compile_groupings(groupings)(stats, created_at)
 
 
 def _sum_counts(stats, filter_by=None, sum_by='count'):
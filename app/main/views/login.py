@@ -1,10 +1,10 @@
 from flask import request, render_template, url_for, redirect, \
     current_app, flash
-from flask_login import login_user, logout_user, login_required
+from flask_login import current_user, login_user, logout_user, login_required
 from dmutils.user import user_has_role, User
 
 from .. import main
-from ... import data_api_client
+from ... import data_api_client, user_cache
 from ..forms import LoginForm
 
 
@@ -35,6 +35,7 @@ def process_login():
             ), 403
 
         user = User.from_json(user_json)
+        user_cache.invalidate(user.get_id())
         login_user(user)
         current_app.logger.info('login.success')
 
@@ -52,6 +53,7 @@ def process_login():
 @main.route('/logout', methods=['GET'])
 @login_required
 def logout():
+    user_cache.invalidate(current_user.get_id())
     logout_user()
     flash('logged_out', 'success')
     return redirect(url_for('.render_login'))
@@ -1,8 +1,9 @@
-from flask import abort, current_app, flash, redirect, render_template, request, url_for
+from flask import abort, current_app, flash, jsonify, redirect, render_template, request, url_for
 from flask_login import login_required, current_user
 from datetime import datetime
 
 from dmapiclient import HTTPError
+from dmapiclient.audit import AuditTypes
 from dmutils.formats import DATETIME_FORMAT
 from dmcontent.formats import format_service_price
 from dmutils.documents import upload_service_documents
@@ -11,10 +12,17 @@ from dmutils.s3 import S3
 
 from ... import data_api_client
 from ... import content_loader
+from ... import service_diff_cache
+from ... import service_diff_throttle
 from .. import main
 
 from ..auth import role_required
-from ..helpers.diff_tools import get_diffs_from_service_data, get_revision_dates
+from ..helpers.diff_tools import (
+    DIFF_LINES_FORMAT, get_revision_dates, get_sections_fingerprint, get_structured_diffs_from_service_data,
+    render_structured_diffs
+)
+
+SERVICE_HISTORY_PAGE_SIZE = 100
 
 
 @main.route('', methods=['GET'])
@@ -116,6 +124,115 @@ def edit(service_id, section):
 @role_required('admin', 'admin-ccs-category')
 def compare(old_archived_service_id, new_archived_service_id):
 
+    service_data, content, service_diffs, revision_dates = _archived_service_diffs(
+        old_archived_service_id, new_archived_service_id
+    )
+
+    return render_template(
+        "compare_revisions.html",
+        diffs=render_structured_diffs(service_diffs),
+        revision_dates=revision_dates,
+        sections=content.sections,
+        service_data=service_data
+    )
+
+
+@main.route(
+    '/services/compare/<old_archived_service_id>...<new_archived_service_id>.json',
+    methods=['GET']
+)
+@login_required
+@role_required('admin', 'admin-ccs-category')
+def compare_json(old_archived_service_id, new_archived_service_id):
+    """The diffs shown by `compare`, for rendering in the browser.
+
+    Each diff has the `section_name` and `label` of a changed question and its `lines`, each
+    of which is `[revision 1 line number, revision 2 line number, runs]`. A run is either
+    `['equal', words]`, for words the line has in both revisions, or `[tag, revision 1 words,
+    revision 2 words]` for words that were replaced, deleted or inserted, so each word is sent once.
+
+    The compare page itself is rendered on the server; this is for pages (like the service's
+    history) that load several comparisons as they're needed.
+    """
+    service_data, _, service_diffs, revision_dates = _archived_service_diffs(
+        old_archived_service_id, new_archived_service_id
+    )
+
+    response = jsonify(
+        service_id=service_data['id'],
+        revision_dates=revision_dates,
+        diffs=service_diffs
+    )
+    # revisions never change, but the questions shown can (rarely)
+    response.cache_control.private = True
+    response.cache_control.max_age = 3600
+    return response
+
+
+@main.route('/services/<service_id>/history', methods=['GET'])
+@login_required
+@role_required('admin', 'admin-ccs-category')
+def service_history(service_id):
+    """List every update made to a service, newest first, with the changes each one made.
+
+    Only the audit events are fetched here. Each update's diff is loaded from `compare_json`
+    by the browser once it's scrolled into view, so a long history costs no more to open than
+    a short one, and the diffs it does load are cached per pair of revisions.
+    """
+    try:
+        service = data_api_client.get_service(service_id)
+    except HTTPError:
+        abort(404)
+    if service is None:
+        abort(404)
+
+    updates = []
+    for audit_event in _service_update_audit_events(service_id):
+        data = audit_event.get('data', {})
+        if data.get('oldArchivedServiceId') is None or data.get('newArchivedServiceId') is None:
+            continue
+        updates.append({
+            'created_at': audit_event['createdAt'],
+            'user': audit_event.get('user'),
+            'old_archived_service_id': data['oldArchivedServiceId'],
+            'new_archived_service_id': data['newArchivedServiceId'],
+        })
+
+    return render_template(
+        "service_history.html",
+        service_data=service['services'],
+        updates=updates[::-1]
+    )
+
+
+def _service_update_audit_events(service_id):
+    """Yield the service's update audit events, oldest first."""
+    page = 1
+    while True:
+        response = data_api_client.find_audit_events(
+            audit_type=AuditTypes.update_service,
+            object_type='services',
+            object_id=service_id,
+            page=page,
+            per_page=SERVICE_HISTORY_PAGE_SIZE
+        )
+        for audit_event in response['auditEvents']:
+            yield audit_event
+
+        if not response.get('links', {}).get('next'):
+            return
+        page += 1
+
+
+def _archived_service_diffs(old_archived_service_id, new_archived_service_id):
+    """Return the service, its content and the structured diffs and dates of two of its archived revisions.
+
+    Archived revisions never change, so the diffs are cached for each pair of ids along with a
+    fingerprint of the questions they were made for. A cached comparison is reused, without
+    fetching the revisions again, until the service's questions change. New diffs are computed
+    through `service_diff_throttle`, which caps how many this worker works on at once.
+    """
+
     def validate_archived_services(old_archived_service, new_archived_service):
 
         if old_archived_service.get('id', -1) \
@@ -133,7 +250,16 @@ def compare(old_archived_service_id, new_archived_service_id):
 
         return True
 
+    cache_key = (DIFF_LINES_FORMAT, old_archived_service_id, new_archived_service_id)
+    cached = service_diff_cache.get(cache_key)
+
     try:
+        if cached is not None:
+            service_data = data_api_client.get_service(cached['service_id'])['services']
+            content = content_loader.get_manifest('g-cloud-6', 'edit_service_as_admin').filter(service_data)
+            if cached['questions'] == get_sections_fingerprint(content.sections):
+                return service_data, content, cached['diffs'], cached['revision_dates']
+
         service_data_revision_1 = data_api_client.get_archived_service(
             old_archived_service_id)['services']
 
@@ -155,11 +281,21 @@ def compare(old_archived_service_id, new_archived_service_id):
 
     # It's possible to have an empty array if none of the lines were changed.
     # TODO This possibility isn't actually handled.
-    service_diffs = get_diffs_from_service_data(
+    question_counts = {}
+    service_diffs = service_diff_throttle.do(lambda: get_structured_diffs_from_service_data(
         sections=content.sections,
         revision_1=service_data_revision_1,
         revision_2=service_data_revision_2,
-        include_unchanged_lines_in_output=False
+        include_unchanged_lines_in_output=False,
+        counts=question_counts
+    ))
+    current_app.logger.info(
+        "Compared archived services %s...%s: diffed %s questions, skipped %s unchanged",
+        old_archived_service_id, new_archived_service_id, question_counts['diffed'], question_counts['skipped'],
+        extra={
+            'questions_diffed': question_counts['diffed'],
+            'questions_skipped': question_counts['skipped'],
+        }
     )
 
     revision_dates = None if not service_diffs else \
@@ -168,13 +304,14 @@ def compare(old_archived_service_id, new_archived_service_id):
             service_data_revision_2
         )
 
-    return render_template(
-        "compare_revisions.html",
-        diffs=service_diffs,
-        revision_dates=revision_dates,
-        sections=content.sections,
-        service_data=service_data
-    )
+    service_diff_cache.set(cache_key, {
+        'service_id': service_data_revision_1['id'],
+        'questions': get_sections_fingerprint(content.sections),
+        'diffs': service_diffs,
+        'revision_dates': revision_dates,
+    })
+
+    return service_data, content, service_diffs, revision_dates
 
 
 @main.route('/services/<service_id>/edit/<section_id>', methods=['POST'])
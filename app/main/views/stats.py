@@ -1,15 +1,36 @@
+import hashlib
+import json
+import re
 from datetime import datetime
 
-from flask import render_template, request
+from flask import abort, current_app, jsonify, render_template, request, Response, stream_with_context
 from flask_login import login_required
 
 from dmapiclient.audit import AuditTypes
+from dmutils import csv_generator
 from dmutils.formats import DATETIME_FORMAT
 
-from ..helpers.sum_counts import format_snapshots
+from ..helpers.downsample import downsample
+from ..helpers.sum_counts import compile_groupings, format_snapshots
 from .. import main
-from ... import data_api_client
+from ... import data_api_client, live_stats_store, stats_broadcaster, stats_timeline_cache
 from ..auth import role_required
+from ...concurrency import prefetch
+
+
+# page sizes used when fetching every snapshot, and when checking for ones newer than those cached
+SNAPSHOTS_PAGE_SIZE = 250
+NEW_SNAPSHOTS_PAGE_SIZE = 10
+
+# `from` and `to` are dates or times, e.g. 2016-06-01 or 2016-06-01T09:30, compared with `createdAt`
+TIME_RANGE_ARGUMENT = re.compile(r'^\d{4}-\d{2}-\d{2}(T\d{2}(:\d{2}(:\d{2}(\.\d+)?)?)?)?$')
+
+# CSV columns of each series, in the order `view_statistics` shows them (lots are in the framework's order)
+SERIES_COLUMNS = {
+    'services_by_status': ['draft', 'complete', 'submitted'],
+    'interested_suppliers': ['interested_only', 'declaration_only', 'completed_services_only', 'valid_submission'],
+    'users': ['never_logged_in', 'not_logged_in_recently', 'logged_in_recently'],
+}
 
 
 @main.route('/statistics/<string:framework_slug>', methods=['GET'])
@@ -17,26 +38,258 @@ from ..auth import role_required
 @role_required('admin', 'admin-ccs-category', 'admin-ccs-sourcing')
 def view_statistics(framework_slug):
 
-    snapshots = data_api_client.find_audit_events(
-        audit_type=AuditTypes.snapshot_framework_stats,
-        object_type='frameworks',
-        object_id=framework_slug,
-        per_page=1260
-    )['auditEvents']
-    framework = data_api_client.get_framework(framework_slug)['frameworks']
-    if framework['status'] == 'open':
-        snapshots.append(
-            {
-                'data': data_api_client.get_framework_stats(framework_slug),
-                'createdAt': datetime.utcnow().strftime(DATETIME_FORMAT)
-            }
-        )
+    framework, timeline, version = _framework_statistics(framework_slug, *_time_range())
+
+    big_screen_mode = request.args.get('big_screen_mode') == 'yes'
+    if big_screen_mode:
+        timeline = _downsample_timeline(timeline)
 
     return render_template(
         "view_statistics.html",
         framework=framework,
-        big_screen_mode=(request.args.get('big_screen_mode') == 'yes'),
-        services_by_status=format_snapshots(snapshots, 'services', {
+        big_screen_mode=big_screen_mode,
+        live_stats_age=version['live_stats_age'],
+        services_by_status=timeline['services_by_status'],
+        services_by_lot=timeline['services_by_lot'],
+        lots=framework['lots'],
+        lot_table_headings=["Date and time"] + [lot['name'] for lot in framework['lots']],
+        interested_suppliers=timeline['interested_suppliers'],
+        users=timeline['users'],
+    )
+
+
+@main.route('/statistics/<string:framework_slug>.json', methods=['GET'])
+@login_required
+@role_required('admin', 'admin-ccs-category', 'admin-ccs-sourcing')
+def view_statistics_json(framework_slug):
+    """The series shown by `view_statistics`, for dashboards that poll for changes.
+
+    The strong ETag changes whenever a new snapshot is taken or the live stats change, so
+    polling with `If-None-Match` gets an empty 304 until there's something new to show.
+    """
+    framework, timeline, version = _framework_statistics(framework_slug, *_time_range())
+
+    big_screen_mode = request.args.get('big_screen_mode') == 'yes'
+    # the live stats' age changes every second even when the stats themselves don't
+    etag_version = dict(version, big_screen_mode=big_screen_mode)
+    del etag_version['live_stats_age']
+    etag = hashlib.sha1(json.dumps(etag_version, sort_keys=True).encode('utf-8')).hexdigest()
+
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        if big_screen_mode:
+            timeline = _downsample_timeline(timeline)
+        response = jsonify(
+            framework=framework_slug,
+            lots=[{'slug': lot['slug'], 'name': lot['name']} for lot in framework['lots']],
+            live_stats_age=version['live_stats_age'],
+            **timeline
+        )
+
+    response.set_etag(etag)
+    # polling clients have to revalidate, but needn't refetch the series every time
+    response.cache_control.private = True
+    response.cache_control.max_age = 0
+    response.cache_control.must_revalidate = True
+    return response
+
+
+@main.route('/statistics/<string:framework_slug>/events', methods=['GET'])
+@login_required
+@role_required('admin', 'admin-ccs-category', 'admin-ccs-sourcing')
+def stream_statistics(framework_slug):
+    """Push statistics updates to wall displays as server-sent events.
+
+    The stream starts with a `timeline` event holding every series (as in the JSON endpoint).
+    After that, a `snapshots` event carries the rows for new snapshots and a `live` event the
+    new live row of each series whenever the live stats change. Rows are identified by their
+    `created_at`: one already received may be sent again just after connecting.
+
+    Updates come from one poller per framework per worker (see `app.streaming.Broadcaster`),
+    however many displays are connected. Each connection holds on to a request thread.
+    """
+    subscription = stats_broadcaster.subscribe(
+        framework_slug, lambda state: _statistics_changes(framework_slug, state)
+    )
+    try:
+        framework, timeline, _ = _framework_statistics(framework_slug)
+    except Exception:
+        subscription.close()
+        raise
+
+    keep_alive = current_app.config['DM_STATS_STREAM_KEEP_ALIVE']
+
+    def events():
+        try:
+            yield _server_sent_event('timeline', dict(timeline, framework=framework_slug))
+            for message in subscription.messages(timeout=keep_alive):
+                if message is None:
+                    yield ': keep-alive\n\n'
+                else:
+                    yield _server_sent_event(*message)
+        finally:
+            subscription.close()
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    # stop nginx buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@main.route('/statistics/<string:framework_slug>/download/<string:series_name>.csv', methods=['GET'])
+@login_required
+@role_required('admin', 'admin-ccs-category', 'admin-ccs-sourcing')
+def download_statistics(framework_slug, series_name):
+    """One of the series shown by `view_statistics` as CSV, with a row per snapshot.
+
+    Rows are aggregated and written as the pages of snapshots come in, so the whole table is
+    never held in memory (and the timeline cache isn't filled). Takes the same `from` and `to`
+    arguments as the statistics page.
+    """
+    start, end = _time_range()
+    framework = data_api_client.get_framework(framework_slug)['frameworks']
+    series = _series_groupings(framework)
+    if series_name not in series:
+        abort(404)
+
+    category, groupings = series[series_name]
+    if series_name == 'services_by_lot':
+        columns = [lot['slug'] for lot in framework['lots']]
+    else:
+        columns = SERIES_COLUMNS[series_name]
+    aggregate = compile_groupings(groupings)
+    include_live_stats = framework['status'] == 'open' and not end
+
+    def rows():
+        yield ['created_at'] + columns
+        for snapshots in prefetch(_snapshot_pages(framework_slug), buffer_size=2):
+            for snapshot in snapshots:
+                if _in_time_range(snapshot['createdAt'], start, end):
+                    row = aggregate(snapshot['data'][category], snapshot['createdAt'])
+                    yield [row['created_at']] + [row[column] for column in columns]
+
+        if include_live_stats:
+            live_stats, computed_at = _live_stats(framework_slug)
+            row = aggregate(live_stats[category], computed_at.strftime(DATETIME_FORMAT))
+            yield [row['created_at']] + [row[column] for column in columns]
+
+    filename = '{}-{}.csv'.format(framework_slug, series_name.replace('_', '-'))
+    return Response(
+        stream_with_context(csv_generator.iter_csv(rows())),
+        mimetype='text/csv',
+        headers={
+            "Content-Disposition": "attachment;filename={}".format(filename),
+            "Content-Type": "text/csv; header=present"
+        }
+    )
+
+
+def _statistics_changes(framework_slug, state):
+    # `Broadcaster` poll function: `state` is the number of snapshot rows and the live stats last time
+    _, timeline, version = _framework_statistics(framework_slug)
+    live_rows = None
+    if version['live_stats'] is not None:
+        live_rows = {name: rows.pop() for name, rows in timeline.items()}
+    snapshot_count = len(timeline['users'])
+
+    messages = []
+    if state is not None:
+        previous_count, previous_live_stats = state
+        if snapshot_count != previous_count:
+            start = previous_count if snapshot_count > previous_count else 0
+            messages.append(('snapshots', {name: rows[start:] for name, rows in timeline.items()}))
+        if live_rows is not None and version['live_stats'] != previous_live_stats:
+            messages.append(('live', live_rows))
+
+    return (snapshot_count, version['live_stats']), messages
+
+
+def _server_sent_event(event, data):
+    return 'event: {}\ndata: {}\n\n'.format(event, json.dumps(data, separators=(',', ':')))
+
+
+def _framework_statistics(framework_slug, start=None, end=None):
+    """Return the framework, its statistics series and what they were built from.
+
+    The last of these identifies the series' contents: the newest snapshot's id, the framework's
+    lots and the live stats (or, if the snapshots don't have ids, the series themselves). It also
+    has the age of the live stats in seconds, which can be precomputed (see `_live_stats`).
+
+    If given, only snapshots taken from `start` and up to `end` are included; the live stats
+    are left out if there's an `end`.
+    """
+    framework = data_api_client.get_framework(framework_slug)['frameworks']
+    series = _series_groupings(framework)
+    last_id, timeline = _snapshot_timeline(framework_slug, series)
+    if start or end:
+        timeline = {
+            name: [row for row in rows if _in_time_range(row['created_at'], start, end)]
+            for name, rows in timeline.items()
+        }
+
+    version = {
+        'last_snapshot_id': last_id,
+        'lots': sorted(series['services_by_lot'][1]),
+        'from': start,
+        'to': end,
+        'live_stats': None,
+        'live_stats_age': None,
+    }
+    if last_id is None:
+        version['snapshots'] = {name: list(rows) for name, rows in timeline.items()}
+
+    if framework['status'] == 'open' and not end:
+        live_stats, computed_at = _live_stats(framework_slug)
+        live_snapshot = {'data': live_stats, 'createdAt': computed_at.strftime(DATETIME_FORMAT)}
+        version['live_stats'] = live_stats
+        version['live_stats_age'] = int((datetime.utcnow() - computed_at).total_seconds())
+        for name, rows in _format_series([live_snapshot], series).items():
+            timeline[name].extend(rows)
+
+    return framework, timeline, version
+
+
+def _live_stats(framework_slug):
+    # precomputed by the `refresh_live_stats` command if it's running, otherwise fetched here
+    # and stored for other requests (and processes) to use
+    live_stats, computed_at = live_stats_store.get(framework_slug)
+    if live_stats is None:
+        live_stats, computed_at = data_api_client.get_framework_stats(framework_slug), datetime.utcnow()
+        live_stats_store.put(framework_slug, live_stats, computed_at)
+    return live_stats, computed_at
+
+
+def _time_range():
+    start, end = request.args.get('from'), request.args.get('to')
+    for value in (start, end):
+        if value and not TIME_RANGE_ARGUMENT.match(value):
+            abort(400)
+    return start, end
+
+
+def _in_time_range(created_at, start, end):
+    # `end` is inclusive at its own precision: to=2016-06-01 includes the whole of that day
+    return (not start or created_at >= start) and (not end or created_at[:len(end)] <= end)
+
+
+def _downsample_timeline(timeline):
+    return {
+        name: downsample(rows, current_app.config['DM_STATS_BIG_SCREEN_MAX_POINTS'])
+        for name, rows in timeline.items()
+    }
+
+
+def _format_series(snapshots, series):
+    return {
+        name: format_snapshots(snapshots, category, groupings)
+        for name, (category, groupings) in series.items()
+    }
+
+
+def _series_groupings(framework):
+    return {
+        'services_by_status': ('services', {
             'draft': {
                 'status': 'not-submitted'
             },
@@ -49,15 +302,13 @@ def view_statistics(framework_slug):
                 'declaration_made': True
             }
         }),
-        services_by_lot=format_snapshots(snapshots, 'services', {
+        'services_by_lot': ('services', {
             lot['slug']: {
                 'lot': lot['slug'],
                 'status': 'submitted',
             } for lot in framework['lots']
         }),
-        lots=framework['lots'],
-        lot_table_headings=["Date and time"] + [lot['name'] for lot in framework['lots']],
-        interested_suppliers=format_snapshots(snapshots, 'interested_suppliers', {
+        'interested_suppliers': ('interested_suppliers', {
             'interested_only': {
                 'declaration_status': [None, 'started'],
                 'has_completed_services': False
@@ -75,7 +326,7 @@ def view_statistics(framework_slug):
                 'has_completed_services': True
             }
         }),
-        users=format_snapshots(snapshots, 'supplier_users', {
+        'users': ('supplier_users', {
             'never_logged_in': {
                 'recent_login': None
             },
@@ -85,5 +336,91 @@ def view_statistics(framework_slug):
             'logged_in_recently': {
                 'recent_login': True
             }
-        })
-    )
+        }),
+    }
+
+
+def _snapshot_timeline(framework_slug, series):
+    """Format the framework's stats snapshots into `series`, reusing the rows cached for earlier ones.
+
+    Snapshot audit events never change once written, so only the ones newer than the last cached
+    snapshot are fetched and formatted. Snapshots without an id can't be told apart, so if there
+    are any the timeline isn't cached.
+
+    Returns the id of the newest snapshot (`None` if they don't have ids) and the series.
+    """
+    # the lot series depends on the framework's lots, which could (rarely) change
+    cache_key = (framework_slug, tuple(sorted(series['services_by_lot'][1])))
+    last_id, timeline = stats_timeline_cache.get(cache_key)
+
+    if last_id is None:
+        # formatted a page at a time, so only a couple of pages of raw snapshots are held at once
+        pages = prefetch(_snapshot_pages(framework_slug), buffer_size=2)
+        timeline = {name: [] for name in series}
+    else:
+        pages = [_snapshots_since(framework_slug, last_id)]
+
+    new_rows = {name: [] for name in series}
+    new_ids = []
+    unidentified = 0
+    for snapshots in pages:
+        for name, rows in _format_series(snapshots, series).items():
+            new_rows[name].extend(rows)
+        new_ids.extend(snapshot['id'] for snapshot in snapshots if 'id' in snapshot)
+        unidentified += sum(1 for snapshot in snapshots if 'id' not in snapshot)
+
+    if unidentified:
+        newest_id = None
+    elif new_ids:
+        newest_id = max(new_ids)
+        stats_timeline_cache.extend(cache_key, last_id, newest_id, new_rows)
+    else:
+        newest_id = last_id
+
+    for name, rows in new_rows.items():
+        timeline[name].extend(rows)
+    return newest_id, timeline
+
+
+def _snapshot_pages(framework_slug):
+    """Yield the framework's stats snapshots, oldest first, a page at a time.
+
+    Paged reads aren't memoized for the request by `CachedDataAPIClient`, so each page can be
+    freed as soon as the caller is done with it, however many pages there are.
+    """
+    page = 1
+    while True:
+        response = data_api_client.find_audit_events(
+            audit_type=AuditTypes.snapshot_framework_stats,
+            object_type='frameworks',
+            object_id=framework_slug,
+            page=page,
+            per_page=SNAPSHOTS_PAGE_SIZE
+        )
+        yield response['auditEvents']
+
+        if not response.get('links', {}).get('next'):
+            return
+        page += 1
+
+
+def _snapshots_since(framework_slug, last_id):
+    new_snapshots = []
+    page = 1
+    while True:
+        response = data_api_client.find_audit_events(
+            audit_type=AuditTypes.snapshot_framework_stats,
+            object_type='frameworks',
+            object_id=framework_slug,
+            latest_first=True,
+            page=page,
+            per_page=NEW_SNAPSHOTS_PAGE_SIZE
+        )
+        for snapshot in response['auditEvents']:
+            if snapshot['id'] <= last_id:
+                return new_snapshots[::-1]
+            new_snapshots.append(snapshot)
+
+        if not response.get('links', {}).get('next'):
+            return new_snapshots[::-1]
+        page += 1
@@ -5,7 +5,8 @@ from flask_login import login_required, current_user, flash
 from dateutil.parser import parse as parse_date
 
 from .. import main
-from ... import data_api_client, content_loader
+from ... import data_api_client, content_loader, user_cache
+from ...concurrency import gather
 from ..forms import EmailAddressForm, MoveUserForm
 from ..auth import role_required
 from dmapiclient import HTTPError, APIError
@@ -20,6 +21,15 @@ from dmutils import s3
 from dmutils.formats import datetimeformat
 
 
+def _get_supplier_declaration(supplier_id, framework_slug):
+    try:
+        return data_api_client.get_supplier_declaration(supplier_id, framework_slug)['declaration']
+    except APIError as e:
+        if e.status_code != 404:
+            raise
+        return {}
+
+
 @main.route('/suppliers', methods=['GET'])
 @login_required
 @role_required('admin', 'admin-ccs-category', 'admin-ccs-sourcing')
@@ -55,16 +65,13 @@ def edit_supplier_name(supplier_id):
 @login_required
 @role_required('admin-ccs-sourcing')
 def view_supplier_declaration(supplier_id, framework_slug):
-    supplier = data_api_client.get_supplier(supplier_id)['suppliers']
-    framework = data_api_client.get_framework(framework_slug)['frameworks']
+    supplier, framework, declaration = gather(
+        lambda: data_api_client.get_supplier(supplier_id)['suppliers'],
+        lambda: data_api_client.get_framework(framework_slug)['frameworks'],
+        lambda: _get_supplier_declaration(supplier_id, framework_slug),
+    )
     if framework['status'] not in ['pending', 'standstill', 'live']:
         abort(403)
-    try:
-        declaration = data_api_client.get_supplier_declaration(supplier_id, framework_slug)['declaration']
-    except APIError as e:
-        if e.status_code != 404:
-            raise
-        declaration = {}
 
     content = content_loader.get_manifest(framework_slug, 'declaration').filter(declaration)
 
@@ -84,29 +91,30 @@ def view_signed_agreement(supplier_id, framework_slug):
     # not properly validating this - all we do is pass it through
     next_status = request.args.get("next_status")
 
-    supplier = data_api_client.get_supplier(supplier_id)['suppliers']
-    framework = data_api_client.get_framework(framework_slug)['frameworks']
+    supplier, framework, supplier_framework = gather(
+        lambda: data_api_client.get_supplier(supplier_id)['suppliers'],
+        lambda: data_api_client.get_framework(framework_slug)['frameworks'],
+        lambda: data_api_client.get_supplier_framework_info(supplier_id, framework_slug)['frameworkInterest'],
+    )
     if not framework.get('frameworkAgreementVersion'):
         abort(404)
-    supplier_framework = data_api_client.get_supplier_framework_info(supplier_id, framework_slug)['frameworkInterest']
     if not supplier_framework.get('agreementReturned'):
         abort(404)
 
-    # build an OrderedDict of applied-for lotSlug against lotName, ordered by lotSlug
-    lot_slugs_names = OrderedDict(sorted(
-        (service["lotSlug"], service["lotName"],)
-        for service in data_api_client.find_services_iter(
-            supplier_id=supplier_id,
-            framework=framework_slug,
-            )
-        )
-    )
-
     agreements_bucket = s3.S3(current_app.config['DM_AGREEMENTS_BUCKET'])
     path = supplier_framework['agreementPath']
     url = get_signed_url(agreements_bucket, path, current_app.config['DM_ASSETS_URL'])
     if not url:
         abort(404)
+
+    # build an OrderedDict of applied-for lotSlug against lotName, ordered by lotSlug - only walking the
+    # supplier's services once we know there's an agreement to show
+    lot_slugs_names = OrderedDict(sorted(
+        (service["lotSlug"], service["lotName"],)
+        for service in data_api_client.find_services_iter(supplier_id=supplier_id, framework=framework_slug)
+        )
+    )
+
     return render_template(
         "suppliers/view_signed_agreement.html",
         supplier=supplier,
@@ -194,9 +202,11 @@ def download_agreement_file(supplier_id, framework_slug, document_name):
 @login_required
 @role_required('admin-ccs-sourcing')
 def list_countersigned_agreement_file(supplier_id, framework_slug):
-    supplier = data_api_client.get_supplier(supplier_id)['suppliers']
-    framework = data_api_client.get_framework(framework_slug)['frameworks']
-    supplier_framework = data_api_client.get_supplier_framework_info(supplier_id, framework_slug)['frameworkInterest']
+    supplier, framework, supplier_framework = gather(
+        lambda: data_api_client.get_supplier(supplier_id)['suppliers'],
+        lambda: data_api_client.get_framework(framework_slug)['frameworks'],
+        lambda: data_api_client.get_supplier_framework_info(supplier_id, framework_slug)['frameworkInterest'],
+    )
     if not supplier_framework['onFramework'] or supplier_framework['agreementStatus'] in (None, 'draft'):
         abort(404)
     agreements_bucket = s3.S3(current_app.config['DM_AGREEMENTS_BUCKET'])
@@ -317,16 +327,13 @@ def remove_countersigned_agreement_file(supplier_id, framework_slug):
 @login_required
 @role_required('admin-ccs-sourcing')
 def edit_supplier_declaration_section(supplier_id, framework_slug, section_id):
-    supplier = data_api_client.get_supplier(supplier_id)['suppliers']
-    framework = data_api_client.get_framework(framework_slug)['frameworks']
+    supplier, framework, declaration = gather(
+        lambda: data_api_client.get_supplier(supplier_id)['suppliers'],
+        lambda: data_api_client.get_framework(framework_slug)['frameworks'],
+        lambda: _get_supplier_declaration(supplier_id, framework_slug),
+    )
     if framework['status'] not in ['pending', 'standstill', 'live']:
         abort(403)
-    try:
-        declaration = data_api_client.get_supplier_declaration(supplier_id, framework_slug)['declaration']
-    except APIError as e:
-        if e.status_code != 404:
-            raise
-        declaration = {}
 
     content = content_loader.get_manifest(framework_slug, 'declaration').filter(declaration)
     section = content.get_section(section_id)
@@ -350,12 +357,7 @@ def update_supplier_declaration_section(supplier_id, framework_slug, section_id)
     framework = data_api_client.get_framework(framework_slug)['frameworks']
     if framework['status'] not in ['pending', 'standstill', 'live']:
         abort(403)
-    try:
-        declaration = data_api_client.get_supplier_declaration(supplier_id, framework_slug)['declaration']
-    except APIError as e:
-        if e.status_code != 404:
-            raise
-        declaration = {}
+    declaration = _get_supplier_declaration(supplier_id, framework_slug)
 
     content = content_loader.get_manifest(framework_slug, 'declaration').filter(declaration)
     section = content.get_section(section_id)
@@ -412,7 +414,7 @@ def find_supplier_users():
 @login_required
 @role_required('admin')
 def unlock_user(user_id):
-    user = data_api_client.update_user(user_id, locked=False, updater=current_user.email_address)
+    user = _update_user(user_id, locked=False, updater=current_user.email_address)
     if "source" in request.form:
         return redirect(request.form["source"])
     return redirect(url_for('.find_supplier_users', supplier_id=user['users']['supplier']['supplierId']))
@@ -422,7 +424,7 @@ def unlock_user(user_id):
 @login_required
 @role_required('admin')
 def activate_user(user_id):
-    user = data_api_client.update_user(user_id, active=True, updater=current_user.email_address)
+    user = _update_user(user_id, active=True, updater=current_user.email_address)
     if "source" in request.form:
         return redirect(request.form["source"])
     return redirect(url_for('.find_supplier_users', supplier_id=user['users']['supplier']['supplierId']))
@@ -432,12 +434,19 @@ def activate_user(user_id):
 @login_required
 @role_required('admin')
 def deactivate_user(user_id):
-    user = data_api_client.update_user(user_id, active=False, updater=current_user.email_address)
+    user = _update_user(user_id, active=False, updater=current_user.email_address)
     if "source" in request.form:
         return redirect(request.form["source"])
     return redirect(url_for('.find_supplier_users', supplier_id=user['users']['supplier']['supplierId']))
 
 
+def _update_user(user_id, **fields):
+    # logged in users are cached, so drop this one to have the change apply to their next request
+    user = data_api_client.update_user(user_id, **fields)
+    user_cache.invalidate(str(user_id))
+    return user
+
+
 @main.route('/suppliers/<int:supplier_id>/move-existing-user', methods=['POST'])
 @login_required
 @role_required('admin')
@@ -462,7 +471,7 @@ def move_user_to_new_supplier(supplier_id):
             raise
 
         if user:
-            data_api_client.update_user(
+            _update_user(
                 user['users']['id'],
                 role='supplier',
                 supplier_id=supplier_id,
@@ -12,6 +12,7 @@ from unicodecsv import DictWriter
 
 from .. import main
 from ... import data_api_client
+from ...concurrency import prefetch
 from ..auth import role_required
 
 
@@ -93,10 +94,10 @@ def download_users(framework_slug):
 @login_required
 @role_required('admin')
 def download_buyers_and_briefs():
-    users = {user["id"]: dict(user, briefs=[]) for user in data_api_client.find_users_iter(role="buyer")}
+    users = {user["id"]: dict(user, briefs=[]) for user in prefetch(data_api_client.find_users_iter(role="buyer"))}
 
     # join users with briefs (a "hash join")
-    for brief in data_api_client.find_briefs_iter(with_users=True):
+    for brief in prefetch(data_api_client.find_briefs_iter(with_users=True)):
         for user in brief["users"]:
             users[user["id"]]["briefs"].append(brief)
 
@@ -1,6 +1,9 @@
 from flask import jsonify, current_app, request
 
-from .. import data_api_client
+from .. import (
+    data_api_client, data_api_http_client, data_api_single_flight, framework_cache, live_stats_store,
+    service_diff_cache, service_diff_throttle, stats_broadcaster, stats_timeline_cache, user_cache
+)
 from . import status
 from dmutils.status import get_flags
 
@@ -21,7 +24,8 @@ def status():
             status="ok",
             version=version,
             api_status=status,
-            flags=get_flags(current_app)
+            flags=get_flags(current_app),
+            **_worker_stats()
         )
 
     return jsonify(
@@ -29,5 +33,20 @@ def status():
         version=version,
         api_status=status,
         message="Error connecting to the (Data) API.",
-        flags=get_flags(current_app)
+        flags=get_flags(current_app),
+        **_worker_stats()
     ), 500
+
+
+def _worker_stats():
+    return dict(
+        framework_cache=framework_cache.stats(),
+        user_cache=user_cache.stats(),
+        stats_timeline_cache=stats_timeline_cache.stats(),
+        service_diff_cache=service_diff_cache.stats(),
+        service_diff_throttle=service_diff_throttle.stats(),
+        stats_stream=stats_broadcaster.stats(),
+        live_stats=live_stats_store.stats(),
+        data_api_pool=data_api_http_client.pool_stats(),
+        data_api_single_flight=data_api_single_flight.stats(),
+    )
@@ -0,0 +1,133 @@
+import logging
+import threading
+
+from six.moves import queue
+
+
+logger = logging.getLogger(__name__)
+
+
+class Broadcaster(object):
+    """Fans the results of one background poller per key out to any number of subscribers.
+
+    The first subscriber for a key starts a thread that calls its `poll` function every
+    `DM_STATS_STREAM_POLL_INTERVAL` seconds, inside an app context, and puts the messages it
+    returns on every subscriber's queue. The thread stops once the last subscriber for the key
+    unsubscribes, so upstream load depends on the number of keys being watched, not the number
+    of subscribers.
+
+    `poll(state)` is given whatever state it returned last time (`None` the first time) and
+    returns `(state, messages)`.
+
+    Subscribers that fall more than `DM_STATS_STREAM_QUEUE_SIZE` messages behind are dropped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._app = None
+        self.poll_interval = 5
+        self.queue_size = 100
+        self._channels = {}
+        self._counters = {'polls': 0, 'poll_errors': 0, 'messages': 0, 'dropped_subscribers': 0}
+
+    def init_app(self, app):
+        with self._lock:
+            self._app = app
+            self.poll_interval = app.config['DM_STATS_STREAM_POLL_INTERVAL']
+            self.queue_size = app.config['DM_STATS_STREAM_QUEUE_SIZE']
+
+    def subscribe(self, key, poll):
+        subscription = Subscription(self, key, queue.Queue(maxsize=self.queue_size))
+        with self._lock:
+            channel = self._channels.get(key)
+            if channel is None:
+                channel = self._channels[key] = _Channel(poll)
+                thread = threading.Thread(target=self._run, args=(key, channel, self._app))
+                thread.daemon = True
+                thread.start()
+            channel.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            channel = self._channels.get(subscription.key)
+            if channel is None:
+                return
+            channel.subscribers.discard(subscription)
+            if not channel.subscribers:
+                del self._channels[subscription.key]
+                channel.stopped.set()
+
+    def stats(self):
+        with self._lock:
+            channels = len(self._channels)
+            stats = dict(
+                self._counters,
+                channels=channels,
+                subscribers=sum(len(channel.subscribers) for channel in self._channels.values()),
+                poll_interval=self.poll_interval,
+            )
+        stats['polls_per_minute'] = round(channels * 60.0 / self.poll_interval, 1) if self.poll_interval else None
+        return stats
+
+    def _run(self, key, channel, app):
+        state = None
+        while not channel.stopped.is_set():
+            try:
+                with app.app_context():
+                    state, messages = channel.poll(state)
+            except Exception:
+                logger.exception("Polling for %r failed", key)
+                messages = []
+                with self._lock:
+                    self._counters['poll_errors'] += 1
+
+            with self._lock:
+                self._counters['polls'] += 1
+                self._counters['messages'] += len(messages)
+                subscribers = list(channel.subscribers)
+
+            for subscription in subscribers:
+                for message in messages:
+                    if not subscription.put(message):
+                        with self._lock:
+                            self._counters['dropped_subscribers'] += 1
+                        self.unsubscribe(subscription)
+                        break
+
+            channel.stopped.wait(self.poll_interval)
+
+
+class Subscription(object):
+    def __init__(self, broadcaster, key, messages):
+        self.key = key
+        self.closed = False
+        self._broadcaster = broadcaster
+        self._messages = messages
+
+    def put(self, message):
+        try:
+            self._messages.put_nowait(message)
+            return True
+        except queue.Full:
+            self.closed = True
+            return False
+
+    def messages(self, timeout):
+        """Yield messages as they arrive, or `None` after `timeout` seconds without one."""
+        while not self.closed:
+            try:
+                yield self._messages.get(timeout=timeout)
+            except queue.Empty:
+                yield None
+
+    def close(self):
+        self.closed = True
+        self._broadcaster.unsubscribe(self)
+
+
+class _Channel(object):
+    def __init__(self, poll):
+        self.poll = poll
+        self.subscribers = set()
+        self.stopped = threading.Event()
@@ -1,7 +1,9 @@
 #!/usr/bin/env python
 
 import os
-from app import create_app
+import time
+
+from app import create_app, data_api_client, live_stats_store
 from dmutils import init_manager
 
 application = create_app(
@@ -9,5 +11,28 @@ application = create_app(
 )
 manager = init_manager(application, 5004, ['./app/content/frameworks'])
 
+
+@manager.option('--once', action='store_true', help="Refresh once and exit, e.g. from cron")
+def refresh_live_stats(once=False):
+    """Precompute the live stats of open frameworks for the statistics pages"""
+    if live_stats_store.directory is None:
+        raise SystemExit("DM_LIVE_STATS_DIR isn't set, or can't be used (see the warnings above)")
+
+    interval = application.config['DM_LIVE_STATS_REFRESH_INTERVAL']
+    while True:
+        try:
+            with application.app_context():
+                refreshed = live_stats_store.refresh(data_api_client)
+        except Exception:
+            application.logger.exception("Failed to refresh live stats")
+            if once:
+                raise
+        else:
+            application.logger.info("Refreshed live stats for %s", ', '.join(refreshed) or "no open frameworks")
+        if once:
+            return
+        time.sleep(interval)
+
+
 if __name__ == '__main__':
     manager.run()
@@ -0,0 +1,268 @@
+"""Time the service diff helpers over generated revisions of increasing size and save the results.
+
+    python benchmarks/diff_suite.py [--sizes 1 10 100 1000] [--only render_lines] [--output diff_suite.json]
+    python benchmarks/diff_suite.py --output after.json --baseline before.json [--tolerance 0.2]
+
+Each case diffs a pair of revisions generated from a fixed seed, so the same case gets the same
+input on every run and commit: answers of `--sizes` kilobytes that have been lightly edited or
+heavily reordered, long list answers and whole services. Results are written to `--output` as
+JSON with, for each case, how many times a second it ran and the peak memory it allocated
+(measured with `tracemalloc` where there is one, otherwise as the growth of a forked process's
+maximum resident set size, which isn't comparable with it).
+
+With `--baseline`, each case is compared with the same case in an earlier results file, and the
+script exits with a non-zero status if any got more than `--tolerance` slower.
+"""
+from __future__ import print_function
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import zlib
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+    import resource
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.main.helpers.diff_tools import get_diffs_from_service_data, get_words_diff, render_lines  # noqa
+from diff_tools import edit_line, make_line  # noqa
+
+
+# about how many bytes each generated word takes, with the space after it
+BYTES_PER_WORD = 7
+WORDS_PER_LINE = 40
+WORDS_PER_LIST_ITEM = 8
+
+
+def make_words(size_in_bytes, rand):
+    return make_line(max(1, size_in_bytes // BYTES_PER_WORD), rand)
+
+
+def make_lines(size_in_bytes, words_per_line, rand):
+    words = make_words(size_in_bytes, rand).split()
+    return [' '.join(words[index:index + words_per_line]) for index in range(0, len(words), words_per_line)]
+
+
+def edit_lines(lines, rand, edited=0.1, moved=0.0):
+    """Edit a share of the lines (at least one), replace a few, and move a share of them elsewhere."""
+    lines = list(lines)
+    for index in rand.sample(range(len(lines)), max(1, int(len(lines) * edited))):
+        lines[index] = edit_line(lines[index], 3, rand)
+    for _ in range(len(lines) // 50):
+        del lines[rand.randrange(len(lines))]
+        lines.insert(rand.randrange(len(lines) + 1), make_line(WORDS_PER_LINE, rand))
+    for _ in range(int(len(lines) * moved)):
+        lines.insert(rand.randrange(len(lines)), lines.pop(rand.randrange(len(lines))))
+    return lines
+
+
+def shuffle_chunks(words, chunk_size, rand):
+    chunks = [words[index:index + chunk_size] for index in range(0, len(words), chunk_size)]
+    rand.shuffle(chunks)
+    return [word for chunk in chunks for word in chunk]
+
+
+def words_diff_edited(size_in_kb, rand):
+    line_1 = make_words(size_in_kb * 1024, rand)
+    line_2 = edit_line(line_1, max(10, len(line_1.split()) // 100), rand)
+    return get_words_diff, (line_1, line_2)
+
+
+def words_diff_reordered(size_in_kb, rand):
+    line_1 = make_words(size_in_kb * 1024, rand)
+    line_2 = ' '.join(shuffle_chunks(line_1.split(), 20, rand))
+    return get_words_diff, (line_1, line_2)
+
+
+def render_lines_edited(size_in_kb, rand):
+    lines = make_lines(size_in_kb * 1024, WORDS_PER_LINE, rand)
+    return render_lines, (lines, edit_lines(lines, rand))
+
+
+def render_lines_reordered(size_in_kb, rand):
+    lines = make_lines(size_in_kb * 1024, WORDS_PER_LINE, rand)
+    return render_lines, (lines, edit_lines(lines, rand, moved=0.5))
+
+
+def service_data_list(size_in_kb, rand):
+    items = make_lines(size_in_kb * 1024, WORDS_PER_LIST_ITEM, rand)
+    sections = [{'name': 'Features', 'questions': [{'id': 'serviceFeatures', 'question': 'Service features'}]}]
+    revision_1 = {'serviceFeatures': items}
+    revision_2 = {'serviceFeatures': edit_lines(items, rand, moved=0.1)}
+    return _service_diffs, (sections, revision_1, revision_2)
+
+
+def service_data_service(size_in_kb, rand):
+    """A service of 20 questions sharing `size_in_kb`: half are unchanged, the rest edited."""
+    sections = [{'name': 'Description', 'questions': []}]
+    revision_1, revision_2 = {}, {}
+    for index in range(20):
+        question_id = 'question{}'.format(index)
+        sections[0]['questions'].append({'id': question_id, 'question': 'Question {}'.format(index)})
+        lines = make_lines(size_in_kb * 1024 // 20, WORDS_PER_LINE, rand)
+        revision_1[question_id] = '\n'.join(lines)
+        revision_2[question_id] = '\n'.join(edit_lines(lines, rand) if index % 2 else lines)
+    return _service_diffs, (sections, revision_1, revision_2)
+
+
+def _service_diffs(sections, revision_1, revision_2):
+    return get_diffs_from_service_data(sections=sections, revision_1=revision_1, revision_2=revision_2)
+
+
+SCENARIOS = [
+    ('get_words_diff/edited', words_diff_edited),
+    ('get_words_diff/reordered', words_diff_reordered),
+    ('render_lines/edited', render_lines_edited),
+    ('render_lines/reordered', render_lines_reordered),
+    ('get_diffs_from_service_data/list', service_data_list),
+    ('get_diffs_from_service_data/service', service_data_service),
+]
+
+
+def make_case(scenario, size_in_kb):
+    name = '{}/{}kb'.format(scenario[0], size_in_kb)
+    # seeded from the name rather than `hash`, which can change between runs and Python versions
+    rand = random.Random(zlib.crc32(name.encode('utf-8')) & 0xffffffff)
+    func, args = scenario[1](size_in_kb, rand)
+    return name, func, args
+
+
+def time_case(func, args, min_time, max_runs):
+    """Run `func(*args)` until `min_time` seconds have passed (at least once), returning runs and times."""
+    timings = []
+    started = time.time()
+    while not timings or (time.time() - started < min_time and len(timings) < max_runs):
+        run_started = time.time()
+        func(*args)
+        timings.append(time.time() - run_started)
+    return timings
+
+
+def measure_peak_memory(func, args):
+    """Return the peak memory in KB allocated while running `func(*args)` once, and how it was measured."""
+    if tracemalloc is not None:
+        tracemalloc.start()
+        try:
+            func(*args)
+            return tracemalloc.get_traced_memory()[1] // 1024, 'tracemalloc'
+        finally:
+            tracemalloc.stop()
+
+    # ru_maxrss only ever goes up, so the call is made in a child process, which reports how far
+    # its own maximum grew (Linux reports it in KB)
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_end)
+            before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            func(*args)
+            after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            os.write(write_end, str(after - before).encode('ascii'))
+        finally:
+            os._exit(0)
+
+    os.close(write_end)
+    with os.fdopen(read_end) as f:
+        growth = f.read()
+    os.waitpid(pid, 0)
+    return int(growth) if growth else None, 'maxrss'
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__))
+        ).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Print how each case changed since `baseline`, returning the names of those that got slower."""
+    slower = []
+    print()
+    print("{:<48} {:>12} {:>12} {:>8} {:>10}".format('compared with baseline', 'ops/sec', 'was', 'change', 'memory'))
+    for name, case in sorted(results['cases'].items()):
+        old = baseline['cases'].get(name)
+        if old is None:
+            print("{:<48} {:>12.2f} {:>12}".format(name, case['ops_per_sec'], 'new'))
+            continue
+
+        change = case['ops_per_sec'] / old['ops_per_sec'] - 1
+        memory = '-'
+        if case['peak_memory_measured_by'] == old['peak_memory_measured_by'] \
+                and case['peak_memory_kb'] is not None and old['peak_memory_kb']:
+            memory = '{:+.0%}'.format(float(case['peak_memory_kb']) / old['peak_memory_kb'] - 1)
+        print("{:<48} {:>12.2f} {:>12.2f} {:>+8.0%} {:>10}{}".format(
+            name, case['ops_per_sec'], old['ops_per_sec'], change, memory,
+            '  SLOWER' if change < -tolerance else ''
+        ))
+        if change < -tolerance:
+            slower.append(name)
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100, 1000], help="answer sizes in KB")
+    parser.add_argument('--only', nargs='+', default=[], help="run the cases whose names contain any of these")
+    parser.add_argument('--min-time', type=float, default=1.0, help="seconds to keep repeating each case for")
+    parser.add_argument('--max-runs', type=int, default=1000)
+    parser.add_argument('--output', default='diff_suite.json')
+    parser.add_argument('--baseline', help="results file from an earlier run to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="slowdown allowed before failing")
+    args = parser.parse_args()
+
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'created_at': datetime.datetime.utcnow().isoformat(),
+        'cases': {},
+    }
+
+    print("{:<48} {:>12} {:>12} {:>12}".format('case', 'ops/sec', 'best', 'peak memory'))
+    for scenario in SCENARIOS:
+        for size_in_kb in args.sizes:
+            name, func, func_args = make_case(scenario, size_in_kb)
+            if args.only and not any(part in name for part in args.only):
+                continue
+
+            timings = time_case(func, func_args, args.min_time, args.max_runs)
+            peak_memory_kb, measured_by = measure_peak_memory(func, func_args)
+            results['cases'][name] = {
+                'runs': len(timings),
+                'ops_per_sec': len(timings) / sum(timings),
+                'best_seconds': min(timings),
+                'peak_memory_kb': peak_memory_kb,
+                'peak_memory_measured_by': measured_by,
+            }
+            print("{:<48} {:>12.2f} {:>10.1f}ms {:>10}KB".format(
+                name, len(timings) / sum(timings), min(timings) * 1000,
+                '?' if peak_memory_kb is None else peak_memory_kb
+            ))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print("Results written to {}".format(args.output))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = compare(results, json.load(f), args.tolerance)
+        if slower:
+            print("{} case(s) got more than {:.0%} slower".format(len(slower), args.tolerance))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Compare the word diff used on the service compare page with difflib's `Differ`, which it replaced.
+
+    python benchmarks/diff_tools.py [--words 200 1000 5000] [--edits 10] [--repeat 3]
+
+Lines are generated from the kind of text found in G-Cloud service descriptions, and each is
+diffed against a copy with `--edits` words inserted, removed or replaced. `Differ` gets slow
+quickly as lines get longer, so it's skipped for lines over `--difflib-max-words` words.
+"""
+from __future__ import print_function
+
+import argparse
+import difflib
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.main.helpers.diff_tools import get_words_diff, split_words_diff  # noqa
+
+
+SERVICE_TEXT = """
+Our secure cloud hosting platform gives government departments and agencies a fully managed
+environment for running digital services. It is accredited to hold information classified at
+OFFICIAL and is hosted in UK data centres with 24/7 on-site security and staff cleared to SC.
+The service includes automated backups, point-in-time recovery, continuous monitoring, audit
+logging, vulnerability scanning and a named technical account manager. Support is available by
+phone, email and ticketing, with a 15 minute response to priority one incidents. We follow the
+Cloud Security Principles and publish our service level agreement, pricing and terms openly.
+Onboarding takes between two and five working days and includes migration assistance, training
+for your team and documentation of the agreed architecture.
+""".split()
+
+
+def make_line(word_count, rand):
+    return ' '.join(rand.choice(SERVICE_TEXT) for _ in range(word_count))
+
+
+def edit_line(line, edits, rand):
+    words = line.split()
+    for _ in range(edits):
+        index = rand.randrange(len(words) + 1)
+        operation = rand.choice(['insert', 'remove', 'replace'])
+        if operation == 'insert' or not words:
+            words.insert(index, rand.choice(SERVICE_TEXT))
+        elif operation == 'remove':
+            del words[min(index, len(words) - 1)]
+        else:
+            words[min(index, len(words) - 1)] = rand.choice(['G-Cloud', 'amended', 'updated'])
+    return ' '.join(words)
+
+
+def differ_words_diff(revision_1_line, revision_2_line):
+    # how `get_words_diff` used to work
+    return list(difflib.Differ().compare(revision_1_line.split(), revision_2_line.split()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--words', type=int, nargs='+', default=[200, 1000, 5000])
+    parser.add_argument('--edits', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--difflib-max-words', type=int, default=1000)
+    args = parser.parse_args()
+
+    rand = random.Random(0)
+    print("{:>8} {:>12} {:>12} {:>8}  {}".format('words', 'Differ', 'words diff', 'speedup', 'rendering'))
+    for word_count in args.words:
+        line_1 = make_line(word_count, rand)
+        line_2 = edit_line(line_1, args.edits, rand)
+
+        timing = min(timeit.repeat(lambda: get_words_diff(line_1, line_2), number=1, repeat=args.repeat))
+        if word_count > args.difflib_max_words:
+            print("{:>8} {:>12} {:>10.1f}ms".format(word_count, 'skipped', timing * 1000))
+            continue
+
+        differ_timing = min(timeit.repeat(lambda: differ_words_diff(line_1, line_2), number=1, repeat=args.repeat))
+        same = split_words_diff(get_words_diff(line_1, line_2)) == \
+            split_words_diff(differ_words_diff(line_1, line_2))
+        print("{:>8} {:>10.1f}ms {:>10.1f}ms {:>7.1f}x  {}".format(
+            word_count, differ_timing * 1000, timing * 1000, differ_timing / timing,
+            'same' if same else 'different'
+        ))
+
+
+if __name__ == '__main__':
+    main()
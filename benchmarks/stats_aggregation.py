@@ -0,0 +1,133 @@
+"""Compare the ways of aggregating statistics snapshots: one label at a time, single pass and NumPy.
+
+    python benchmarks/stats_aggregation.py [--snapshots 1260] [--repeat 5]
+
+Snapshots are shaped like the G-Cloud 8 `snapshot_framework_stats` audit events that
+`view_statistics` aggregates, and are summed into the same four series.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.main.helpers.sum_counts import compile_groupings, numpy, _format_snapshots_columnar, _sum_counts  # noqa
+
+
+LOTS = ['saas', 'paas', 'iaas', 'scs']
+
+GROUPINGS = {
+    'services': [
+        {
+            'draft': {'status': 'not-submitted'},
+            'complete': {'status': 'submitted', 'declaration_made': False},
+            'submitted': {'status': 'submitted', 'declaration_made': True},
+        },
+        {lot: {'lot': lot, 'status': 'submitted'} for lot in LOTS},
+    ],
+    'interested_suppliers': [
+        {
+            'interested_only': {'declaration_status': [None, 'started'], 'has_completed_services': False},
+            'declaration_only': {'declaration_status': 'complete', 'has_completed_services': False},
+            'completed_services_only': {'declaration_status': [None, 'started'], 'has_completed_services': True},
+            'valid_submission': {'declaration_status': 'complete', 'has_completed_services': True},
+        },
+    ],
+    'supplier_users': [
+        {
+            'never_logged_in': {'recent_login': None},
+            'not_logged_in_recently': {'recent_login': False},
+            'logged_in_recently': {'recent_login': True},
+        },
+    ],
+}
+
+
+def make_snapshots(count, seed=0):
+    rand = random.Random(seed)
+    return [
+        {
+            'createdAt': '2016-06-01T{:02d}:{:02d}:00.000000Z'.format(index // 60 % 24, index % 60),
+            'data': {
+                'services': [
+                    {'lot': lot, 'status': status, 'declaration_made': declaration_made,
+                     'count': rand.randint(0, 500)}
+                    for lot in LOTS
+                    for status in ('not-submitted', 'submitted')
+                    for declaration_made in (False, True)
+                ],
+                'interested_suppliers': [
+                    {'declaration_status': declaration_status, 'has_completed_services': completed,
+                     'count': rand.randint(0, 300)}
+                    for declaration_status in (None, 'started', 'complete')
+                    for completed in (False, True)
+                ],
+                'supplier_users': [
+                    {'recent_login': recent_login, 'count': rand.randint(0, 800)}
+                    for recent_login in (None, False, True)
+                ],
+            },
+        }
+        for index in range(count)
+    ]
+
+
+def format_snapshots_per_label(snapshots, category, groupings):
+    # how `format_snapshots` used to work: one scan of the statistics for every label
+    results = []
+    for snapshot in snapshots:
+        data = {
+            label: _sum_counts(snapshot['data'][category], filters)
+            for label, filters in groupings.items()
+        }
+        data['created_at'] = snapshot['createdAt']
+        results.append(data)
+    return results
+
+
+def format_snapshots_single_pass(snapshots, category, groupings):
+    aggregate = compile_groupings(groupings)
+    return [aggregate(snapshot['data'][category], snapshot['createdAt']) for snapshot in snapshots]
+
+
+def aggregate_all(implementation, snapshots):
+    return [
+        implementation(snapshots, category, groupings)
+        for category, category_groupings in sorted(GROUPINGS.items())
+        for groupings in category_groupings
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--snapshots', type=int, default=1260)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    implementations = [('per label', format_snapshots_per_label), ('single pass', format_snapshots_single_pass)]
+    if numpy is not None:
+        implementations.append(('numpy', _format_snapshots_columnar))
+    else:
+        print("NumPy isn't installed, skipping the columnar aggregator")
+
+    snapshots = make_snapshots(args.snapshots)
+    expected = aggregate_all(format_snapshots_per_label, snapshots)
+    for name, implementation in implementations:
+        if aggregate_all(implementation, snapshots) != expected:
+            sys.exit("{} aggregator disagrees".format(name))
+
+    for name, implementation in implementations:
+        timing = min(timeit.repeat(
+            lambda: aggregate_all(implementation, snapshots), number=1, repeat=args.repeat
+        ))
+        if name == 'per label':
+            baseline = timing
+        print("{:<12} {:8.1f}ms {:6.1f}x".format(name, timing * 1000, baseline / timing))
+
+
+if __name__ == '__main__':
+    main()
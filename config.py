@@ -23,6 +23,56 @@ class Config(object):
     DM_DATA_API_AUTH_TOKEN = None
     SECRET_KEY = None
 
+    # Pooled HTTP connections to the Data API, per worker. Keep the pool at least as big as the
+    # number of threads that can call the API at once (request threads plus DM_FAN_OUT_POOL_SIZE).
+    DM_DATA_API_POOL_SIZE = 10
+    DM_DATA_API_KEEP_ALIVE = True
+    DM_DATA_API_CONNECT_TIMEOUT = 3.05
+    DM_DATA_API_READ_TIMEOUT = 30
+    # GETs are retried when connecting fails, never after a read timeout
+    DM_DATA_API_GET_RETRIES = 2
+    DM_DATA_API_RETRY_BACKOFF = 0.1
+
+    # Per-worker cache of framework metadata (seconds; a TTL of 0 turns it off)
+    DM_FRAMEWORK_CACHE_SIZE = 50
+    DM_FRAMEWORK_CACHE_TTL = 300
+    DM_FRAMEWORK_CACHE_STALE_TTL = 3600
+
+    # Per-worker cache of logged in users (seconds; a TTL of 0 loads the user on every request)
+    DM_USER_CACHE_SIZE = 500
+    DM_USER_CACHE_TTL = 60
+
+    # Per-worker cache of formatted statistics snapshots, for this many frameworks (0 to turn off)
+    DM_STATS_TIMELINE_CACHE_SIZE = 10
+    # Most rows per statistics series shown in big screen mode (0 shows them all)
+    DM_STATS_BIG_SCREEN_MAX_POINTS = 200
+    # Server-sent statistics updates: seconds between polls of the API per framework, seconds
+    # between keep-alive comments, and how many updates a display can fall behind before it's dropped
+    DM_STATS_STREAM_POLL_INTERVAL = 5
+    DM_STATS_STREAM_KEEP_ALIVE = 15
+    DM_STATS_STREAM_QUEUE_SIZE = 100
+
+    # Live stats of open frameworks, precomputed every DM_LIVE_STATS_REFRESH_INTERVAL seconds by
+    # `application.py refresh_live_stats` and shared between processes through files in
+    # DM_LIVE_STATS_DIR. Views fetch them themselves if they're over DM_LIVE_STATS_MAX_AGE seconds old.
+    # Off (None) until an environment runs the refresher; the directory is created if it's missing,
+    # and ignored if it doesn't belong to the app's user or anyone else can write to it.
+    DM_LIVE_STATS_DIR = None
+    DM_LIVE_STATS_MAX_AGE = 120
+    DM_LIVE_STATS_REFRESH_INTERVAL = 30
+
+    # Diffs between archived service revisions, which never change: how many each worker keeps,
+    # and a directory to also keep them in, shared between processes (None to keep them in memory only).
+    # Like DM_LIVE_STATS_DIR, it's created private and ignored if anyone else could write to it.
+    DM_SERVICE_DIFF_CACHE_SIZE = 200
+    DM_SERVICE_DIFF_CACHE_DIR = None
+    # Most diffs each worker computes at once; the rest wait, so a burst of requests from a
+    # service history page can't tie up every request thread diffing (0 for no limit)
+    DM_SERVICE_DIFF_WORKERS = 2
+
+    # Threads per worker used to make independent Data API calls concurrently (0 to turn off)
+    DM_FAN_OUT_POOL_SIZE = 8
+
     DM_AGREEMENTS_BUCKET = None
     DM_COMMUNICATIONS_BUCKET = None
     DM_ASSETS_URL = None
@@ -71,6 +121,10 @@ class Test(Config):
     SECRET_KEY = "test_secret"
 
     DM_LOG_LEVEL = 'CRITICAL'
+    DM_FRAMEWORK_CACHE_TTL = 0
+    DM_USER_CACHE_TTL = 0
+    DM_LIVE_STATS_DIR = None
+    DM_DATA_API_GET_RETRIES = 0
     SHARED_EMAIL_KEY = 'KEY'
     INVITE_EMAIL_SALT = 'SALT'
     DM_MANDRILL_API_KEY = "MANDRILL"
@@ -87,6 +141,7 @@ class Development(Config):
 
     DM_DATA_API_URL = "http://localhost:5000"
     DM_DATA_API_AUTH_TOKEN = "myToken"
+    DM_DATA_API_POOL_SIZE = 4
     SECRET_KEY = "verySecretKey"
     DM_S3_DOCUMENT_BUCKET = "digitalmarketplace-documents-dev-dev"
     DM_DOCUMENTS_URL = "https://{}.s3-eu-west-1.amazonaws.com".format(DM_S3_DOCUMENT_BUCKET)
@@ -100,6 +155,7 @@ class Live(Config):
     DEBUG = False
     AUTHENTICATION = True
     DM_HTTP_PROTO = 'https'
+    DM_DATA_API_POOL_SIZE = 20
     DM_DOCUMENTS_URL = 'https://assets.digitalmarketplace.service.gov.uk'
     DM_LOG_PATH = '/var/log/digitalmarketplace/application.log'
 
@@ -108,6 +164,7 @@ class Staging(Config):
     DEBUG = False
     AUTHENTICATION = True
     WTF_CSRF_ENABLED = False
+    DM_DATA_API_POOL_SIZE = 20
     DM_DOCUMENTS_URL = 'https://assets.digitalmarketplace.service.gov.uk'
     DM_LOG_PATH = '/var/log/digitalmarketplace/application.log'
 
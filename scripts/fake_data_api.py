@@ -0,0 +1,442 @@
+#!/usr/bin/env python
+"""
+A stand-in for the Data API, for load and latency testing the admin frontend.
+
+Serves the endpoints that `app/main/views/*` use through `dmapiclient.DataAPIClient`, with data
+seeded from `example_responses/*.json` and padded out with generated suppliers, services, users,
+briefs and framework stats snapshots. Writes are accepted and ignored.
+
+Usage:
+    python scripts/fake_data_api.py [--port 5000] [--suppliers 2000] [--snapshots 1500] ...
+        [--latency audit-events=200:50] [--latency *=20] [--error-rate frameworks=0.01]
+
+`--latency` takes an endpoint (the first part of the path, or * for everything else), a mean
+delay in milliseconds and an optional jitter. `--error-rate` makes that fraction of requests to an
+endpoint fail with a 503. The frontend's development config already points at port 5000.
+"""
+from __future__ import print_function
+
+import argparse
+import copy
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask, abort, jsonify, request, url_for
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+DEFAULT_PAGE_SIZE = 100
+
+
+def load_example(name):
+    with open(os.path.join(REPO_ROOT, 'example_responses', '{}.json'.format(name))) as f:
+        return json.load(f)
+
+
+class FakeData(object):
+    """Generated Data API records, reproducible for a given seed."""
+
+    def __init__(self, suppliers, services, users, briefs, snapshots, seed):
+        self.random = random.Random(seed)
+        self.now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+
+        self.frameworks = self._frameworks()
+        self.suppliers = self._suppliers(suppliers)
+        self.services = self._services(services)
+        self.archived_services = self._archived_services()
+        self.users = self._users(users)
+        self.briefs = self._briefs(briefs)
+        self.audit_events = self._audit_events(snapshots)
+
+    def _timestamp(self, hours_ago):
+        return (self.now - timedelta(hours=hours_ago)).strftime(DATETIME_FORMAT)
+
+    def _frameworks(self):
+        template = load_example('framework_response')['frameworks']
+        frameworks = {}
+        for index, (slug, name, status) in enumerate([
+            ('g-cloud-7', 'G-Cloud 7', 'live'),
+            ('g-cloud-8', 'G-Cloud 8', 'live'),
+            ('digital-outcomes-and-specialists', 'Digital Outcomes and Specialists', 'live'),
+            ('g-cloud-9', 'G-Cloud 9', 'open'),
+        ]):
+            frameworks[slug] = dict(copy.deepcopy(template), id=index + 1, slug=slug, name=name, status=status)
+        return frameworks
+
+    def _suppliers(self, count):
+        template = load_example('supplier_response')['suppliers']
+        return dict(
+            (supplier_id, dict(copy.deepcopy(template), id=supplier_id, name='Supplier {}'.format(supplier_id),
+                               dunsNumber=str(100000000 + supplier_id)))
+            for supplier_id in range(1000, 1000 + count)
+        )
+
+    def _services(self, count):
+        template = load_example('services_response')['services'][0]
+        supplier_ids = sorted(self.suppliers)
+        services = {}
+        for index in range(count):
+            service_id = str(5000000000000000 + index)
+            framework = self.frameworks[self.random.choice(['g-cloud-7', 'g-cloud-8'])]
+            lot = self.random.choice(framework['lots'])
+            supplier_id = supplier_ids[index % len(supplier_ids)]
+            services[service_id] = dict(
+                copy.deepcopy(template),
+                id=service_id,
+                supplierId=supplier_id,
+                supplierName=self.suppliers[supplier_id]['name'],
+                frameworkSlug=framework['slug'],
+                frameworkName=framework['name'],
+                lot=lot['slug'],
+                lotSlug=lot['slug'],
+                lotName=lot['name'],
+                serviceName='Service {}'.format(index),
+                status=self.random.choice(['published', 'published', 'enabled', 'disabled']),
+            )
+        return services
+
+    def _archived_services(self):
+        # every service gets two archived revisions a day apart, with ids 2n and 2n + 1
+        archived = {}
+        for index, service in enumerate(sorted(self.services.values(), key=lambda s: s['id'])):
+            for revision in range(2):
+                archived[index * 2 + revision] = dict(
+                    copy.deepcopy(service),
+                    serviceSummary='{} (revision {})'.format(service['serviceSummary'], revision),
+                    updatedAt=self._timestamp(48 - revision * 24),
+                )
+        return archived
+
+    def _users(self, count):
+        template = load_example('user_response')['users']
+        supplier_ids = sorted(self.suppliers)
+        users = {}
+        for user_id in range(1, count + 1):
+            user = dict(copy.deepcopy(template), id=user_id, name='User {}'.format(user_id),
+                        emailAddress='user{}@example.com'.format(user_id))
+            if user_id % 4:
+                supplier_id = supplier_ids[user_id % len(supplier_ids)]
+                user.update(role='supplier', supplier={
+                    'supplierId': supplier_id, 'name': self.suppliers[supplier_id]['name']
+                })
+            else:
+                user['role'] = 'buyer'
+                user.pop('supplier', None)
+            users[user_id] = user
+        return users
+
+    def _briefs(self, count):
+        template = load_example('brief_response')['briefs']
+        buyers = [user for user in self.users.values() if user['role'] == 'buyer']
+        return dict(
+            (brief_id, dict(
+                copy.deepcopy(template),
+                id=brief_id,
+                title='Brief {}'.format(brief_id),
+                status=self.random.choice(['draft', 'live', 'closed']),
+                users=[dict((key, buyer[key]) for key in ('id', 'name', 'emailAddress', 'role', 'active'))
+                       for buyer in [buyers[brief_id % len(buyers)]]] if buyers else [],
+            ))
+            for brief_id in range(1, count + 1)
+        )
+
+    def framework_stats(self, framework_slug, progress=1.0):
+        """Stats shaped like `GET /frameworks/<slug>/stats`, scaled by how far into the window we are."""
+        lots = [lot['slug'] for lot in self.frameworks[framework_slug]['lots']]
+        rand = random.Random('{}-{}'.format(framework_slug, progress))
+
+        def count(scale):
+            return int(scale * progress * rand.uniform(0.8, 1.2))
+
+        return {
+            'services': [
+                {'lot': lot, 'status': status, 'declaration_made': declaration_made, 'count': count(500)}
+                for lot in lots
+                for status in ('not-submitted', 'submitted')
+                for declaration_made in (False, True)
+            ],
+            'interested_suppliers': [
+                {'declaration_status': declaration_status, 'has_completed_services': completed, 'count': count(300)}
+                for declaration_status in (None, 'started', 'complete')
+                for completed in (False, True)
+            ],
+            'supplier_users': [
+                {'recent_login': recent_login, 'count': count(800)}
+                for recent_login in (None, False, True)
+            ],
+        }
+
+    def _audit_events(self, snapshots):
+        events = []
+        for framework_slug in self.frameworks:
+            for index in range(snapshots):
+                events.append({
+                    'type': 'snapshot_framework_stats',
+                    'acknowledged': False,
+                    'user': 'cron',
+                    'objectType': 'frameworks',
+                    'objectId': framework_slug,
+                    'createdAt': self._timestamp(snapshots - index),
+                    'data': self.framework_stats(framework_slug, float(index + 1) / snapshots),
+                })
+        for index in range(0, len(self.archived_services), 2):
+            service = self.archived_services[index]
+            events.append({
+                'type': 'update_service',
+                'acknowledged': False,
+                'user': 'supplier@example.com',
+                'objectType': 'services',
+                'objectId': service['id'],
+                'createdAt': self.archived_services[index + 1]['updatedAt'],
+                'data': {
+                    'serviceId': service['id'],
+                    'supplierName': service['supplierName'],
+                    'oldArchivedServiceId': index,
+                    'newArchivedServiceId': index + 1,
+                },
+            })
+
+        events.sort(key=lambda event: event['createdAt'])
+        for event_id, event in enumerate(events, 1):
+            event['id'] = event_id
+        return events
+
+
+def _arg(name, default=None):
+    # dmapiclient isn't consistent about hyphens and underscores in parameter names
+    return request.args.get(name, request.args.get(name.replace('-', '_'), default))
+
+
+def _paginate(key, items):
+    page = int(_arg('page', 1))
+    per_page = int(_arg('per_page', DEFAULT_PAGE_SIZE))
+    start = (page - 1) * per_page
+
+    links = {}
+    args = dict(request.args.items())
+    if start + per_page < len(items):
+        links['next'] = url_for(request.endpoint, _external=True, **dict(args, page=page + 1))
+    if page > 1:
+        links['prev'] = url_for(request.endpoint, _external=True, **dict(args, page=page - 1))
+    return jsonify({key: items[start:start + per_page], 'links': links})
+
+
+def _get_or_404(collection, key):
+    try:
+        return collection[key]
+    except KeyError:
+        abort(404)
+
+
+def create_app(data, latencies, error_rates):
+    app = Flask(__name__)
+
+    @app.before_request
+    def inject_latency_and_errors():
+        endpoint = request.path.strip('/').split('/')[0]
+        mean, jitter = latencies.get(endpoint, latencies.get('*', (0, 0)))
+        if mean or jitter:
+            time.sleep(max(random.gauss(mean, jitter), 0) / 1000.0)
+        if random.random() < error_rates.get(endpoint, error_rates.get('*', 0)):
+            return jsonify(error='Injected error'), 503
+
+    @app.errorhandler(404)
+    def not_found(e):
+        return jsonify(error='Not found'), 404
+
+    @app.route('/_status')
+    def status():
+        return jsonify(status='ok', app_version='fake')
+
+    @app.route('/frameworks')
+    def find_frameworks():
+        return jsonify(frameworks=list(data.frameworks.values()))
+
+    @app.route('/frameworks/<framework_slug>')
+    def get_framework(framework_slug):
+        return jsonify(frameworks=_get_or_404(data.frameworks, framework_slug))
+
+    @app.route('/frameworks/<framework_slug>/stats')
+    def get_framework_stats(framework_slug):
+        _get_or_404(data.frameworks, framework_slug)
+        return jsonify(data.framework_stats(framework_slug))
+
+    @app.route('/frameworks/<framework_slug>/suppliers')
+    def find_framework_suppliers(framework_slug):
+        framework = _get_or_404(data.frameworks, framework_slug)
+        statuses = _arg('status')
+        supplier_frameworks = [
+            dict(_supplier_framework(supplier_id, framework['slug']), agreementStatus=status)
+            for supplier_id, status in zip(
+                sorted(data.suppliers), itertools.cycle(['signed', 'on-hold', 'approved', 'countersigned'])
+            )
+        ]
+        if statuses:
+            supplier_frameworks = [sf for sf in supplier_frameworks if sf['agreementStatus'] in statuses.split(',')]
+        return jsonify(supplierFrameworks=supplier_frameworks)
+
+    def _supplier_framework(supplier_id, framework_slug):
+        return dict(
+            load_example('supplier_framework_response')['frameworkInterest'],
+            supplierId=supplier_id,
+            supplierName=data.suppliers[supplier_id]['name'],
+            frameworkSlug=framework_slug,
+        )
+
+    @app.route('/suppliers')
+    def find_suppliers():
+        suppliers = sorted(data.suppliers.values(), key=lambda supplier: supplier['id'])
+        prefix = _arg('prefix')
+        if prefix:
+            suppliers = [supplier for supplier in suppliers if supplier['name'].lower().startswith(prefix.lower())]
+        duns_number = _arg('duns_number')
+        if duns_number:
+            suppliers = [supplier for supplier in suppliers if supplier['dunsNumber'] == duns_number]
+        return _paginate('suppliers', suppliers)
+
+    @app.route('/suppliers/<int:supplier_id>')
+    def get_supplier(supplier_id):
+        return jsonify(suppliers=_get_or_404(data.suppliers, supplier_id))
+
+    @app.route('/suppliers/<int:supplier_id>/frameworks/<framework_slug>')
+    def get_supplier_framework_info(supplier_id, framework_slug):
+        _get_or_404(data.suppliers, supplier_id)
+        _get_or_404(data.frameworks, framework_slug)
+        return jsonify(frameworkInterest=_supplier_framework(supplier_id, framework_slug))
+
+    @app.route('/suppliers/<int:supplier_id>/frameworks/<framework_slug>/declaration')
+    def get_supplier_declaration(supplier_id, framework_slug):
+        _get_or_404(data.suppliers, supplier_id)
+        return jsonify(load_example('declaration_response'))
+
+    @app.route('/services')
+    def find_services():
+        services = sorted(data.services.values(), key=lambda service: service['id'])
+        if _arg('supplier_id'):
+            services = [service for service in services if str(service['supplierId']) == _arg('supplier_id')]
+        if _arg('framework'):
+            services = [service for service in services if service['frameworkSlug'] in _arg('framework').split(',')]
+        return _paginate('services', services)
+
+    @app.route('/services/<service_id>')
+    def get_service(service_id):
+        return jsonify(services=_get_or_404(data.services, service_id))
+
+    @app.route('/archived-services/<int:archived_service_id>')
+    def get_archived_service(archived_service_id):
+        return jsonify(services=_get_or_404(data.archived_services, archived_service_id))
+
+    @app.route('/users')
+    def find_users():
+        if _arg('email_address'):
+            users = [user for user in data.users.values() if user['emailAddress'] == _arg('email_address')]
+            if not users:
+                abort(404)
+            return jsonify(users=users[0])
+
+        users = sorted(data.users.values(), key=lambda user: user['id'])
+        if _arg('role'):
+            users = [user for user in users if user['role'] == _arg('role')]
+        if _arg('supplier_id'):
+            users = [user for user in users
+                     if str(user.get('supplier', {}).get('supplierId')) == _arg('supplier_id')]
+        return _paginate('users', users)
+
+    @app.route('/users/<int:user_id>')
+    def get_user(user_id):
+        return jsonify(users=_get_or_404(data.users, user_id))
+
+    @app.route('/users/auth', methods=['POST'])
+    def authenticate_user():
+        user = dict(data.users[1], role='admin', emailAddress=request.get_json()['authUsers']['emailAddress'])
+        return jsonify(users=user)
+
+    @app.route('/users/export/<framework_slug>')
+    def export_users(framework_slug):
+        return jsonify(users=[
+            {
+                'user_email': user['emailAddress'], 'user_name': user['name'],
+                'supplier_id': user['supplier']['supplierId'], 'declaration_status': 'complete',
+                'application_status': 'application', 'application_result': 'pass',
+                'framework_agreement': True, 'variations_agreed': '',
+            }
+            for user in data.users.values() if user['role'] == 'supplier'
+        ])
+
+    @app.route('/briefs')
+    def find_briefs():
+        briefs = sorted(data.briefs.values(), key=lambda brief: brief['id'])
+        if _arg('status'):
+            briefs = [brief for brief in briefs if brief['status'] in _arg('status').split(',')]
+        return _paginate('briefs', briefs)
+
+    @app.route('/briefs/<int:brief_id>')
+    def get_brief(brief_id):
+        return jsonify(briefs=_get_or_404(data.briefs, brief_id))
+
+    @app.route('/audit-events')
+    def find_audit_events():
+        events = data.audit_events
+        for arg, field in (('audit-type', 'type'), ('object-type', 'objectType'), ('object-id', 'objectId')):
+            if _arg(arg):
+                events = [event for event in events if str(event[field]) == _arg(arg)]
+        if _arg('audit-date'):
+            events = [event for event in events if event['createdAt'].startswith(_arg('audit-date'))]
+        if _arg('acknowledged') in ('true', 'false'):
+            events = [event for event in events if event['acknowledged'] == (_arg('acknowledged') == 'true')]
+        if _arg('latest_first') in ('true', 'True'):
+            events = events[::-1]
+        return _paginate('auditEvents', events)
+
+    @app.route('/<path:path>', methods=['POST', 'PUT', 'DELETE'])
+    def accept_write(path):
+        return jsonify(request.get_json(silent=True) or {})
+
+    return app
+
+
+def _parse_endpoint_options(options, parse_value):
+    parsed = {}
+    for option in options:
+        endpoint, _, value = option.partition('=')
+        parsed[endpoint] = parse_value(value)
+    return parsed
+
+
+def _parse_latency(value):
+    mean, _, jitter = value.partition(':')
+    return float(mean), float(jitter or 0)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--suppliers', type=int, default=2000)
+    parser.add_argument('--services', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=4000)
+    parser.add_argument('--briefs', type=int, default=1000)
+    parser.add_argument('--snapshots', type=int, default=1500, help='stats snapshots per framework')
+    parser.add_argument('--latency', action='append', default=[], metavar='ENDPOINT=MS[:JITTER]')
+    parser.add_argument('--error-rate', action='append', default=[], metavar='ENDPOINT=FRACTION')
+    args = parser.parse_args(argv)
+
+    data = FakeData(args.suppliers, args.services, args.users, args.briefs, args.snapshots, args.seed)
+    app = create_app(
+        data,
+        _parse_endpoint_options(args.latency, _parse_latency),
+        _parse_endpoint_options(args.error_rate, float),
+    )
+    print("Fake Data API with {} suppliers, {} services, {} users, {} briefs and {} audit events".format(
+        len(data.suppliers), len(data.services), len(data.users), len(data.briefs), len(data.audit_events)))
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
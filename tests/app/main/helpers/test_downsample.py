@@ -0,0 +1,45 @@
+from unittest import TestCase
+from nose.tools import assert_equal
+
+from app.main.helpers.downsample import downsample
+
+
+def rows(values):
+    return [{'created_at': str(index), 'count': value} for index, value in enumerate(values)]
+
+
+class TestDownsample(TestCase):
+    def test_short_series_are_unchanged(self):
+        series = rows([1, 2, 3])
+        assert_equal(downsample(series, 3), series)
+        assert_equal(downsample(series, 0), series)
+
+    def test_series_are_reduced_to_the_maximum_number_of_points(self):
+        assert_equal(len(downsample(rows(range(1000)), 50)), 50)
+
+    def test_first_and_last_rows_are_kept(self):
+        series = rows([5] + [1] * 98 + [7])
+        sampled = downsample(series, 10)
+
+        assert_equal(sampled[0], series[0])
+        assert_equal(sampled[-1], series[-1])
+
+    def test_peaks_are_kept(self):
+        values = [0] * 100
+        values[37] = 50
+        sampled = downsample(rows(values), 10)
+
+        assert_equal([row['count'] for row in sampled].count(50), 1)
+
+    def test_rows_are_kept_whole_and_in_order(self):
+        series = [{'created_at': str(index), 'a': index, 'b': index * 2} for index in range(100)]
+        sampled = downsample(series, 10)
+
+        for row in sampled:
+            assert_equal(row['b'], row['a'] * 2)
+        assert_equal(sampled, sorted(sampled, key=lambda row: row['a']))
+
+    def test_tiny_maximums(self):
+        series = rows(range(10))
+        assert_equal(downsample(series, 2), [series[0], series[-1]])
+        assert_equal(downsample(series, 1), [series[0]])
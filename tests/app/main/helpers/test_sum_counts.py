@@ -1,8 +1,11 @@
 # coding=utf-8
-from unittest import TestCase
+import random
+from unittest import TestCase, skipIf
+import mock
 from nose.tools import assert_equal, assert_true, assert_false
 
-from app.main.helpers.sum_counts import _label_and_count, _sum_counts, _find
+from app.main.helpers import sum_counts
+from app.main.helpers.sum_counts import compile_groupings, format_snapshots, _label_and_count, _sum_counts, _find
 
 
 class TestLabelAndCount(TestCase):
@@ -24,6 +27,123 @@ class TestLabelAndCount(TestCase):
         )
 
 
+class TestCompileGroupings(TestCase):
+    groupings = {
+        'interested_only': {'declaration_status': [None, 'started'], 'has_completed_services': False},
+        'valid_submission': {'declaration_status': 'complete', 'has_completed_services': True},
+        'completed': {'has_completed_services': True},
+        'everything': {},
+    }
+
+    def test_matches_summing_each_label_separately(self):
+        rand = random.Random(1)
+        stats = [
+            {
+                'declaration_status': rand.choice([None, 'started', 'complete']),
+                'has_completed_services': rand.choice([True, False, None, 1, 0]),
+                'count': rand.randint(0, 100),
+            }
+            for _ in range(200)
+        ]
+        expected = {label: _sum_counts(stats, filters) for label, filters in self.groupings.items()}
+        expected['created_at'] = 'today'
+
+        assert_equal(compile_groupings(self.groupings)(stats, 'today'), expected)
+
+    def test_statistics_missing_a_key_are_matched_as_none(self):
+        assert_equal(
+            compile_groupings({'none': {'key': None}, 'other': {'key': 'value'}})([{'count': 3}], 'today'),
+            {'none': 3, 'other': 0, 'created_at': 'today'}
+        )
+
+    def test_unhashable_values_are_matched(self):
+        assert_equal(
+            compile_groupings({'list': {'key': [['a']]}})([{'key': ['a'], 'count': 2}], 'today'),
+            {'list': 2, 'created_at': 'today'}
+        )
+
+    def test_summing_by_different_column(self):
+        assert_equal(
+            compile_groupings({'all': {}}, sum_by='new_count')([{'new_count': 4}, {'new_count': 5}], 'today'),
+            {'all': 9, 'created_at': 'today'}
+        )
+
+
+class TestFormatSnapshots(TestCase):
+    def test_one_row_per_snapshot(self):
+        snapshots = [
+            {'createdAt': 'first', 'data': {'users': [{'recent_login': True, 'count': 1}]}},
+            {'createdAt': 'second', 'data': {'users': [{'recent_login': True, 'count': 2},
+                                                       {'recent_login': None, 'count': 5}]}},
+        ]
+
+        assert_equal(
+            format_snapshots(snapshots, 'users', {'recent': {'recent_login': True}, 'never': {'recent_login': None}}),
+            [
+                {'created_at': 'first', 'recent': 1, 'never': 0},
+                {'created_at': 'second', 'recent': 2, 'never': 5},
+            ]
+        )
+
+
+@skipIf(sum_counts.numpy is None, "NumPy isn't installed")
+class TestFormatSnapshotsColumnar(TestCase):
+    groupings = {
+        'interested_only': {'declaration_status': [None, 'started'], 'has_completed_services': False},
+        'valid_submission': {'declaration_status': 'complete', 'has_completed_services': True},
+        'everything': {},
+        'nothing': {'declaration_status': 'unknown'},
+    }
+
+    def _snapshots(self, count):
+        rand = random.Random(2)
+        return [
+            {
+                'createdAt': str(index),
+                'data': {'suppliers': [
+                    {
+                        'declaration_status': rand.choice([None, 'started', 'complete']),
+                        'has_completed_services': rand.choice([True, False, 1, 0]),
+                        'count': rand.randint(0, 1000),
+                    }
+                    for _ in range(rand.randint(0, 8))
+                ]},
+            }
+            for index in range(count)
+        ]
+
+    def test_matches_the_single_pass_aggregator(self):
+        snapshots = self._snapshots(300)
+        aggregate = compile_groupings(self.groupings)
+
+        assert_equal(
+            sum_counts._format_snapshots_columnar(snapshots, 'suppliers', self.groupings),
+            [aggregate(snapshot['data']['suppliers'], snapshot['createdAt']) for snapshot in snapshots]
+        )
+
+    def test_totals_are_python_ints(self):
+        formatted = sum_counts._format_snapshots_columnar(self._snapshots(3), 'suppliers', self.groupings)
+
+        assert_equal(set(type(row['everything']) for row in formatted), {int})
+
+    def test_gives_up_on_counts_that_are_not_integers(self):
+        snapshots = [{'createdAt': 'today', 'data': {'suppliers': [{'count': 1.5}]}}]
+
+        assert_equal(sum_counts._format_snapshots_columnar(snapshots, 'suppliers', self.groupings), None)
+        assert_equal(format_snapshots(snapshots, 'suppliers', {'all': {}}), [{'all': 1.5, 'created_at': 'today'}])
+
+    def test_gives_up_on_unhashable_values(self):
+        snapshots = [{'createdAt': 'today', 'data': {'suppliers': [{'declaration_status': [], 'count': 1}]}}]
+
+        assert_equal(sum_counts._format_snapshots_columnar(snapshots, 'suppliers', self.groupings), None)
+
+    def test_used_for_long_windows(self):
+        snapshots = self._snapshots(10)
+        with mock.patch.object(sum_counts, 'COLUMNAR_MIN_STATISTICS', 1), \
+                mock.patch.object(sum_counts, '_format_snapshots_columnar', return_value=['formatted']):
+            assert_equal(format_snapshots(snapshots, 'suppliers', self.groupings), ['formatted'])
+
+
 class TestSumCounts(TestCase):
     def test_summing_without_filtering(self):
         assert_equal(
@@ -0,0 +1,31 @@
+import mock
+
+from ..helpers import LoggedInApplicationTest
+
+
+@mock.patch('app.main.views.stats.data_api_client')
+class TestDataAPITiming(LoggedInApplicationTest):
+
+    def test_server_timing_header_totals_calls_by_method(self, data_api_client):
+        data_api_client.find_audit_events.return_value = {'auditEvents': []}
+        calls = [
+            {'method': 'get_framework', 'status': 200, 'duration': 0.01, 'bytes': 100},
+            {'method': 'find_audit_events', 'status': 200, 'duration': 0.2, 'bytes': 5000},
+            {'method': 'get_framework', 'status': 200, 'duration': 0.02, 'bytes': 100},
+        ]
+        with mock.patch('app.main.recorded_api_calls', return_value=calls):
+            response = self.client.get('/admin/statistics/g-cloud-7')
+
+        self.assertEqual(
+            response.headers['Server-Timing'],
+            'dataapi;dur=230.0;desc="3 calls", '
+            'get_framework;dur=30.0;desc="2 calls", '
+            'find_audit_events;dur=200.0;desc="1 calls"'
+        )
+
+    def test_no_header_without_api_calls(self, data_api_client):
+        data_api_client.find_audit_events.return_value = {'auditEvents': []}
+        with mock.patch('app.main.recorded_api_calls', return_value=[]):
+            response = self.client.get('/admin/statistics/g-cloud-7')
+
+        self.assertNotIn('Server-Timing', response.headers)
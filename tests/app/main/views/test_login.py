@@ -9,6 +9,7 @@ except ImportError:
 
 from dmutils.user import User
 
+from app import load_user, user_cache
 from ...helpers import BaseApplicationTest, LoggedInApplicationTest
 
 
@@ -175,6 +176,45 @@ class TestLogin(BaseApplicationTest):
         assert_equal(res.status_code, 400)
 
 
+@mock.patch('app.data_api_client')
+class TestLoadUser(BaseApplicationTest):
+    def setUp(self):
+        super(TestLoadUser, self).setUp()
+        user_cache.configure(max_size=10, ttl=60)
+
+    def tearDown(self):
+        user_cache.configure(max_size=10, ttl=0)
+        super(TestLoadUser, self).tearDown()
+
+    def test_users_are_only_loaded_once_within_the_ttl(self, data_api_client):
+        data_api_client.get_user.return_value = user_data()
+
+        assert_equal(load_user(u'12345').email_address, 'valid@example.com')
+        assert_equal(load_user(u'12345').email_address, 'valid@example.com')
+
+        data_api_client.get_user.assert_called_once_with(user_id=12345)
+
+    def test_inactive_users_are_not_cached(self, data_api_client):
+        inactive_user = user_data()
+        inactive_user['users']['active'] = False
+        data_api_client.get_user.side_effect = [inactive_user, user_data()]
+
+        assert_equal(load_user(u'12345'), None)
+        assert_equal(load_user(u'12345').email_address, 'valid@example.com')
+
+    @mock.patch('app.main.views.login.data_api_client')
+    def test_logging_in_reloads_the_user(self, login_data_api_client, data_api_client):
+        user_cache.set(u'12345', 'stale user')
+        login_data_api_client.authenticate_user.return_value = user_data()
+
+        self.client.post("/admin/login", data={
+            'email_address': 'valid@example.com',
+            'password': '1234567890'
+        })
+
+        assert_equal(user_cache.get(u'12345'), None)
+
+
 class TestSession(BaseApplicationTest):
     def test_url_with_non_canonical_trailing_slash(self):
         response = self.client.get('/admin/')
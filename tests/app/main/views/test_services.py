@@ -5,6 +5,7 @@ except ImportError:
     from urllib.parse import urlsplit
     from io import BytesIO as StringIO
 import mock
+from flask import json
 
 from dmapiclient import HTTPError, REQUEST_ERROR_MESSAGE
 from ...helpers import LoggedInApplicationTest
@@ -561,3 +562,124 @@ class TestCompareServiceArchives(LoggedInApplicationTest):
         content_loader.get_manifest.return_value = TestBuilder()
         response = self._get_archived_services_response('10', '50')
         self.assertEqual(200, response.status_code)
+
+    @mock.patch('app.main.views.services.data_api_client')
+    @mock.patch('app.main.views.services.content_loader')
+    def test_comparisons_are_cached(self, content_loader, data_api_client):
+        content_loader.get_manifest.return_value.filter.side_effect = lambda *args: self.TestContent()
+        data_api_client.get_archived_service.side_effect = self._get_archived_service
+        data_api_client.get_service.side_effect = self._get_service
+
+        self.client.get('/admin/services/compare/10...20')
+        response = self.client.get('/admin/services/compare/10...20')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(data_api_client.get_archived_service.call_count, 2)
+        self.assertIn(
+            self.strip_all_whitespace('<td class=\'line-content addition\'><strong>&lt;h1&gt;Cloudy&lt;/h1&gt;</strong> Cloud Service</td>'),  # noqa
+            self.strip_all_whitespace(response.get_data(as_text=True))
+        )
+        self.assertIn(
+            self.strip_all_whitespace('Tuesday 2 December 2014 at 10:55'),
+            self.strip_all_whitespace(response.get_data(as_text=True))
+        )
+
+    @mock.patch('app.main.views.services.data_api_client')
+    @mock.patch('app.main.views.services.content_loader')
+    def test_cached_comparisons_are_not_used_once_the_questions_change(self, content_loader, data_api_client):
+        content_loader.get_manifest.return_value.filter.side_effect = lambda *args: self.TestContent()
+        data_api_client.get_archived_service.side_effect = self._get_archived_service
+        data_api_client.get_service.side_effect = self._get_service
+
+        self.client.get('/admin/services/compare/10...20')
+        changed_content = self.TestContent()
+        changed_content.sections[0]['questions'][0]['question'] = 'Name of the service'
+        content_loader.get_manifest.return_value.filter.side_effect = lambda *args: changed_content
+        response = self.client.get('/admin/services/compare/10...20')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(data_api_client.get_archived_service.call_count, 4)
+        self.assertIn('Name of the service', response.get_data(as_text=True))
+
+    @mock.patch('app.main.views.services.data_api_client')
+    @mock.patch('app.main.views.services.content_loader')
+    def test_comparison_as_json(self, content_loader, data_api_client):
+        content_loader.get_manifest.return_value.filter.side_effect = lambda *args: self.TestContent()
+        data_api_client.get_archived_service.side_effect = self._get_archived_service
+        data_api_client.get_service.side_effect = self._get_service
+
+        response = self.client.get('/admin/services/compare/10...20.json')
+
+        self.assertEqual(200, response.status_code)
+        data = json.loads(response.get_data(as_text=True))
+        self.assertEqual(data['service_id'], 1)
+        self.assertEqual(data['diffs'], [{
+            'section_name': 'Description',
+            'label': 'Service name',
+            'lines': [
+                [1, 1, [['insert', [], ['<h1>Cloudy</h1>']], ['equal', ['Cloud', 'Service']]]],
+            ],
+        }])
+        self.assertEqual(sorted(data['revision_dates']), ['revision_1', 'revision_2'])
+
+    @mock.patch('app.main.views.services.data_api_client')
+    def test_cannot_get_json_comparison_of_nonexistent_archived_service(self, data_api_client):
+        data_api_client.get_archived_service.side_effect = self._get_archived_service
+
+        response = self.client.get('/admin/services/compare/1...20.json')
+
+        self.assertEqual(404, response.status_code)
+
+
+class TestServiceHistory(LoggedInApplicationTest):
+
+    def _audit_event(self, old_archived_service_id, new_archived_service_id, created_at):
+        return {
+            'createdAt': created_at,
+            'user': 'supplier@example.com',
+            'data': {
+                'oldArchivedServiceId': old_archived_service_id,
+                'newArchivedServiceId': new_archived_service_id,
+            },
+        }
+
+    @mock.patch('app.main.views.services.data_api_client')
+    def test_lists_each_update_newest_first_without_diffing_them(self, data_api_client):
+        data_api_client.get_service.return_value = {'services': {'id': 1, 'serviceName': 'Cloud Service'}}
+        data_api_client.find_audit_events.side_effect = [
+            {'auditEvents': [self._audit_event(10, 20, '2014-12-02T10:55:25.00000Z')], 'links': {'next': 'page 2'}},
+            {'auditEvents': [self._audit_event(20, 50, '2014-12-03T10:55:25.00000Z')], 'links': {}},
+        ]
+
+        response = self.client.get('/admin/services/1/history')
+        data = response.get_data(as_text=True)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            [call[1]['page'] for call in data_api_client.find_audit_events.call_args_list], [1, 2]
+        )
+        self.assertEqual(data_api_client.find_audit_events.call_args[1]['object_id'], '1')
+        self.assertLess(
+            data.index('data-revision-diffs-url="/admin/services/compare/20...50.json"'),
+            data.index('data-revision-diffs-url="/admin/services/compare/10...20.json"')
+        )
+        self.assertIn('href="/admin/services/compare/10...20"', data)
+        self.assertFalse(data_api_client.get_archived_service.called)
+
+    @mock.patch('app.main.views.services.data_api_client')
+    def test_service_with_no_updates(self, data_api_client):
+        data_api_client.get_service.return_value = {'services': {'id': 1, 'serviceName': 'Cloud Service'}}
+        data_api_client.find_audit_events.return_value = {'auditEvents': [], 'links': {}}
+
+        response = self.client.get('/admin/services/1/history')
+
+        self.assertEqual(200, response.status_code)
+        self.assertNotIn('data-revision-diffs-url', response.get_data(as_text=True))
+
+    @mock.patch('app.main.views.services.data_api_client')
+    def test_history_of_nonexistent_service(self, data_api_client):
+        data_api_client.get_service.return_value = None
+
+        response = self.client.get('/admin/services/1/history')
+
+        self.assertEqual(404, response.status_code)
@@ -1,8 +1,14 @@
+from datetime import datetime, timedelta
+
 from nose.tools import assert_in
+from flask import g, json
 import mock
 
 from dmapiclient import HTTPError
 from dmapiclient.audit import AuditTypes
+from app.api_client import CachedDataAPIClient
+from app.concurrency import prefetch
+from app.main.views.stats import _snapshot_pages, _statistics_changes
 from ...helpers import LoggedInApplicationTest
 
 
@@ -19,7 +25,8 @@ class TestStats(LoggedInApplicationTest):
             audit_type=AuditTypes.snapshot_framework_stats,
             object_type='frameworks',
             object_id='g-cloud-7',
-            per_page=1260
+            page=1,
+            per_page=250
         )
 
         self.assertEquals(200, response.status_code)
@@ -76,7 +83,8 @@ class TestStats(LoggedInApplicationTest):
             audit_type=AuditTypes.snapshot_framework_stats,
             object_type='frameworks',
             object_id='g-cloud-7',
-            per_page=1260
+            page=1,
+            per_page=250
         )
 
         self.assertEquals(200, response.status_code)
@@ -99,3 +107,374 @@ class TestStats(LoggedInApplicationTest):
         data_api_client.find_audit_events.side_effect = HTTPError(api_response)
         response = self.client.get('/admin/statistics/g-cloud-7')
         self.assertEquals(500, response.status_code)
+
+
+@mock.patch('app.main.views.stats.data_api_client')
+class TestStatsTimelineCache(LoggedInApplicationTest):
+
+    def _snapshot(self, audit_event_id, valid_submissions):
+        snapshot = {
+            "createdAt": "2015-12-0{}T14:45:20.969220Z".format(audit_event_id),
+            "data": {
+                "interested_suppliers": [
+                    {"count": valid_submissions, "declaration_status": "complete", "has_completed_services": True}
+                ],
+                "services": [],
+                "supplier_users": [],
+            }
+        }
+        if audit_event_id is not None:
+            snapshot['id'] = audit_event_id
+        return snapshot
+
+    def test_only_new_snapshots_are_fetched_once_the_timeline_is_cached(self, data_api_client):
+        data_api_client.find_audit_events.side_effect = [
+            {'auditEvents': [self._snapshot(1, 101), self._snapshot(2, 103)]},
+            {'auditEvents': [self._snapshot(3, 107), self._snapshot(2, 103)], 'links': {'next': 'page-2'}},
+        ]
+
+        self.client.get('/admin/statistics/g-cloud-7')
+        response = self.client.get('/admin/statistics/g-cloud-7')
+
+        data_api_client.find_audit_events.assert_called_with(
+            audit_type=AuditTypes.snapshot_framework_stats,
+            object_type='frameworks',
+            object_id='g-cloud-7',
+            latest_first=True,
+            page=1,
+            per_page=10
+        )
+        self.assertEquals(200, response.status_code)
+        page_without_whitespace = ''.join(response.get_data(as_text=True).split())
+        for count in ('101', '103', '107'):
+            assert_in('<span>{}</span>'.format(count), page_without_whitespace)
+
+    def test_new_snapshots_are_fetched_until_a_cached_one_is_found(self, data_api_client):
+        data_api_client.find_audit_events.side_effect = [
+            {'auditEvents': [self._snapshot(1, 101)]},
+            {'auditEvents': [self._snapshot(3, 107)], 'links': {'next': 'page-2'}},
+            {'auditEvents': [self._snapshot(2, 103), self._snapshot(1, 101)], 'links': {'next': 'page-3'}},
+        ]
+
+        self.client.get('/admin/statistics/g-cloud-7')
+        response = self.client.get('/admin/statistics/g-cloud-7')
+
+        self.assertEquals(data_api_client.find_audit_events.call_count, 3)
+        page_without_whitespace = ''.join(response.get_data(as_text=True).split())
+        for count in ('101', '103', '107'):
+            assert_in('<span>{}</span>'.format(count), page_without_whitespace)
+
+    def test_snapshots_without_ids_are_not_cached(self, data_api_client):
+        data_api_client.find_audit_events.return_value = {'auditEvents': [self._snapshot(None, 101)]}
+
+        self.client.get('/admin/statistics/g-cloud-7')
+        self.client.get('/admin/statistics/g-cloud-7')
+
+        self.assertEquals(data_api_client.find_audit_events.call_count, 2)
+        data_api_client.find_audit_events.assert_called_with(
+            audit_type=AuditTypes.snapshot_framework_stats,
+            object_type='frameworks',
+            object_id='g-cloud-7',
+            page=1,
+            per_page=250
+        )
+
+    def test_every_page_of_snapshots_is_fetched(self, data_api_client):
+        data_api_client.find_audit_events.side_effect = [
+            {'auditEvents': [self._snapshot(1, 101)], 'links': {'next': 'page-2'}},
+            {'auditEvents': [self._snapshot(2, 103)], 'links': {'next': 'page-3'}},
+            {'auditEvents': [self._snapshot(3, 107)], 'links': {}},
+        ]
+
+        response = self.client.get('/admin/statistics/g-cloud-7')
+
+        self.assertEquals(
+            [call[1]['page'] for call in data_api_client.find_audit_events.call_args_list], [1, 2, 3]
+        )
+        page_without_whitespace = ''.join(response.get_data(as_text=True).split())
+        for count in ('101', '103', '107'):
+            assert_in('<span>{}</span>'.format(count), page_without_whitespace)
+
+    def test_pages_of_snapshots_are_not_kept_for_the_rest_of_the_request(self, data_api_client):
+        data_api_client.find_audit_events.side_effect = [
+            {'auditEvents': [self._snapshot(page, page)], 'links': {'next': 'page-{}'.format(page + 1)}}
+            for page in range(1, 20)
+        ] + [{'auditEvents': [self._snapshot(20, 20)], 'links': {}}]
+
+        with mock.patch('app.main.views.stats.data_api_client', CachedDataAPIClient(data_api_client)):
+            with self.app.test_request_context('/'):
+                pages = list(prefetch(_snapshot_pages('g-cloud-7'), buffer_size=2))
+
+                self.assertEquals(len(pages), 20)
+                self.assertEquals(getattr(g, '_data_api_cache', {}), {})
+
+    def test_snapshots_can_be_limited_to_a_time_range(self, data_api_client):
+        data_api_client.find_audit_events.return_value = {
+            'auditEvents': [self._snapshot(day, 1000 + day) for day in range(1, 6)]
+        }
+
+        response = self.client.get('/admin/statistics/g-cloud-7?from=2015-12-02T12:00&to=2015-12-04')
+
+        page_without_whitespace = ''.join(response.get_data(as_text=True).split())
+        for count in ('1002', '1003', '1004'):
+            assert_in('<span>{}</span>'.format(count), page_without_whitespace)
+        for count in ('1001', '1005'):
+            self.assertNotIn('<span>{}</span>'.format(count), page_without_whitespace)
+
+    def test_invalid_time_ranges_are_rejected(self, data_api_client):
+        response = self.client.get('/admin/statistics/g-cloud-7?from=yesterday')
+
+        self.assertEquals(400, response.status_code)
+
+    def test_big_screen_mode_downsamples_the_timeline(self, data_api_client):
+        self.app.config['DM_STATS_BIG_SCREEN_MAX_POINTS'] = 3
+        data_api_client.find_audit_events.return_value = {
+            'auditEvents': [self._snapshot(None, 1000 + index) for index in range(10)]
+        }
+
+        response = self.client.get('/admin/statistics/g-cloud-7?big_screen_mode=yes')
+
+        page_without_whitespace = ''.join(response.get_data(as_text=True).split())
+        assert_in('<span>1000</span>', page_without_whitespace)
+        assert_in('<span>1009</span>', page_without_whitespace)
+        self.assertEquals(page_without_whitespace.count('<span>100'), 3)
+
+
+class BaseStatsAPITest(LoggedInApplicationTest):
+
+    def setUp(self):
+        super(BaseStatsAPITest, self).setUp()
+        self.framework = {
+            'slug': 'g-cloud-8',
+            'status': 'open',
+            'lots': [{'slug': 'saas', 'name': 'Software as a Service'}],
+        }
+        self.snapshots = {
+            'auditEvents': [
+                {
+                    'id': 1,
+                    'createdAt': '2015-12-09T14:45:20.969220Z',
+                    'data': {
+                        'services': [{'lot': 'saas', 'status': 'submitted', 'declaration_made': True, 'count': 5}],
+                        'interested_suppliers': [],
+                        'supplier_users': [],
+                    }
+                }
+            ]
+        }
+        self.live_stats = {
+            'services': [{'lot': 'saas', 'status': 'submitted', 'declaration_made': True, 'count': 7}],
+            'interested_suppliers': [],
+            'supplier_users': [],
+        }
+
+    def _setup_api(self, data_api_client):
+        data_api_client.get_framework.return_value = {'frameworks': self.framework}
+        data_api_client.find_audit_events.return_value = self.snapshots
+        data_api_client.get_framework_stats.return_value = self.live_stats
+
+
+@mock.patch('app.main.views.stats.data_api_client')
+class TestStatsJSON(BaseStatsAPITest):
+
+    def test_series_are_returned_as_json(self, data_api_client):
+        self._setup_api(data_api_client)
+
+        response = self.client.get('/admin/statistics/g-cloud-8.json')
+
+        self.assertEquals(200, response.status_code)
+        data = json.loads(response.get_data(as_text=True))
+        self.assertEquals(data['framework'], 'g-cloud-8')
+        self.assertEquals([row['saas'] for row in data['services_by_lot']], [5, 7])
+        self.assertEquals([row['submitted'] for row in data['services_by_status']], [5, 7])
+        self.assertEquals(data['lots'], [{'slug': 'saas', 'name': 'Software as a Service'}])
+
+    def test_unchanged_series_get_a_304(self, data_api_client):
+        self._setup_api(data_api_client)
+
+        etag = self.client.get('/admin/statistics/g-cloud-8.json').headers['ETag']
+        response = self.client.get('/admin/statistics/g-cloud-8.json', headers={'If-None-Match': etag})
+
+        self.assertEquals(304, response.status_code)
+        self.assertEquals(response.get_data(), b'')
+        self.assertEquals(response.headers['ETag'], etag)
+
+    def test_etag_changes_with_the_live_stats(self, data_api_client):
+        self._setup_api(data_api_client)
+
+        etag = self.client.get('/admin/statistics/g-cloud-8.json').headers['ETag']
+        self.live_stats['services'][0]['count'] = 8
+        response = self.client.get('/admin/statistics/g-cloud-8.json', headers={'If-None-Match': etag})
+
+        self.assertEquals(200, response.status_code)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_etag_changes_with_new_snapshots(self, data_api_client):
+        self._setup_api(data_api_client)
+        etag = self.client.get('/admin/statistics/g-cloud-8.json').headers['ETag']
+
+        new_snapshot = dict(self.snapshots['auditEvents'][0], id=2)
+        data_api_client.find_audit_events.return_value = {'auditEvents': [new_snapshot], 'links': {}}
+        response = self.client.get('/admin/statistics/g-cloud-8.json', headers={'If-None-Match': etag})
+
+        self.assertEquals(200, response.status_code)
+        self.assertEquals(len(json.loads(response.get_data(as_text=True))['services_by_lot']), 3)
+
+    def test_precomputed_live_stats_are_used(self, data_api_client):
+        self._setup_api(data_api_client)
+
+        with mock.patch('app.main.views.stats.live_stats_store') as live_stats_store:
+            live_stats_store.get.return_value = (self.live_stats, datetime.utcnow() - timedelta(seconds=30))
+            response = self.client.get('/admin/statistics/g-cloud-8.json')
+
+        self.assertFalse(data_api_client.get_framework_stats.called)
+        self.assertIn(json.loads(response.get_data(as_text=True))['live_stats_age'], (30, 31))
+
+    def test_live_stats_are_fetched_and_stored_when_not_precomputed(self, data_api_client):
+        self._setup_api(data_api_client)
+
+        with mock.patch('app.main.views.stats.live_stats_store') as live_stats_store:
+            live_stats_store.get.return_value = (None, None)
+            response = self.client.get('/admin/statistics/g-cloud-8')
+
+        data_api_client.get_framework_stats.assert_called_once_with('g-cloud-8')
+        self.assertEquals(live_stats_store.put.call_args[0][:2], ('g-cloud-8', self.live_stats))
+        assert_in('Latest figures calculated 0 seconds ago', response.get_data(as_text=True))
+
+    def test_response_must_be_revalidated_rather_than_not_cached(self, data_api_client):
+        self._setup_api(data_api_client)
+
+        response = self.client.get('/admin/statistics/g-cloud-8.json')
+
+        self.assertNotIn('no-cache', response.headers['Cache-Control'])
+        self.assertIn('must-revalidate', response.headers['Cache-Control'])
+
+
+@mock.patch('app.main.views.stats.data_api_client')
+class TestStatsCSV(BaseStatsAPITest):
+
+    def test_series_is_downloaded_as_csv(self, data_api_client):
+        self._setup_api(data_api_client)
+
+        with mock.patch('app.main.views.stats.datetime') as mock_datetime:
+            mock_datetime.utcnow.return_value = datetime(2015, 12, 10, 9, 0)
+            response = self.client.get('/admin/statistics/g-cloud-8/download/services_by_lot.csv')
+
+        self.assertEquals(200, response.status_code)
+        self.assertEquals(response.mimetype, 'text/csv')
+        self.assertEquals(
+            response.headers['Content-Disposition'], 'attachment;filename=g-cloud-8-services-by-lot.csv'
+        )
+        self.assertEquals(response.get_data(as_text=True).splitlines(), [
+            'created_at,saas',
+            '2015-12-09T14:45:20.969220Z,5',
+            '2015-12-10T09:00:00.000000Z,7',
+        ])
+
+    def test_columns_are_in_the_order_shown_on_the_page(self, data_api_client):
+        self._setup_api(data_api_client)
+
+        response = self.client.get('/admin/statistics/g-cloud-8/download/interested_suppliers.csv?to=2015-12-09')
+
+        self.assertEquals(response.get_data(as_text=True).splitlines(), [
+            'created_at,interested_only,declaration_only,completed_services_only,valid_submission',
+            '2015-12-09T14:45:20.969220Z,0,0,0,0',
+        ])
+        self.assertFalse(data_api_client.get_framework_stats.called)
+
+    def test_snapshots_are_fetched_a_page_at_a_time(self, data_api_client):
+        self._setup_api(data_api_client)
+        second_snapshot = dict(self.snapshots['auditEvents'][0], id=2, createdAt='2015-12-10T14:45:20.969220Z')
+        data_api_client.find_audit_events.side_effect = [
+            dict(self.snapshots, links={'next': 'http://localhost/audit-events?page=2'}),
+            {'auditEvents': [second_snapshot], 'links': {}},
+        ]
+        self.framework['status'] = 'live'
+
+        response = self.client.get('/admin/statistics/g-cloud-8/download/services_by_status.csv')
+
+        self.assertEquals(response.get_data(as_text=True).splitlines(), [
+            'created_at,draft,complete,submitted',
+            '2015-12-09T14:45:20.969220Z,0,0,5',
+            '2015-12-10T14:45:20.969220Z,0,0,5',
+        ])
+        self.assertEquals([call[1]['page'] for call in data_api_client.find_audit_events.call_args_list], [1, 2])
+
+    def test_pages_of_snapshots_are_not_kept_while_the_csv_is_streamed(self, data_api_client):
+        self._setup_api(data_api_client)
+        memo_sizes = []
+
+        def find_audit_events(page, **kwargs):
+            # runs on the prefetch thread, in the request's context
+            memo_sizes.append(len(getattr(g, '_data_api_cache', {})))
+            links = {'next': 'page-{}'.format(page + 1)} if page < 10 else {}
+            return dict(self.snapshots, links=links)
+
+        data_api_client.find_audit_events.side_effect = find_audit_events
+        self.framework['status'] = 'live'
+
+        with mock.patch('app.main.views.stats.data_api_client', CachedDataAPIClient(data_api_client)):
+            response = self.client.get('/admin/statistics/g-cloud-8/download/services_by_status.csv')
+            self.assertEquals(len(response.get_data(as_text=True).splitlines()), 11)
+
+        # only `get_framework` is memoized, however many pages are streamed
+        self.assertEquals(memo_sizes, [1] * 10)
+
+    def test_unknown_series_is_404(self, data_api_client):
+        self._setup_api(data_api_client)
+
+        response = self.client.get('/admin/statistics/g-cloud-8/download/suppliers.csv')
+
+        self.assertEquals(404, response.status_code)
+
+
+@mock.patch('app.main.views.stats.data_api_client')
+class TestStatsEvents(BaseStatsAPITest):
+
+    def test_stream_starts_with_the_whole_timeline(self, data_api_client):
+        self._setup_api(data_api_client)
+
+        response = self.client.get('/admin/statistics/g-cloud-8/events')
+        first_event = next(iter(response.response))
+        response.close()
+
+        self.assertEquals(response.mimetype, 'text/event-stream')
+        event_type, data = first_event.decode('utf-8').strip().split('\n')
+        self.assertEquals(event_type, 'event: timeline')
+        timeline = json.loads(data[len('data: '):])
+        self.assertEquals([row['saas'] for row in timeline['services_by_lot']], [5, 7])
+
+    def test_changes_are_only_reported_after_the_first_poll(self, data_api_client):
+        self._setup_api(data_api_client)
+
+        with self.app.app_context():
+            state, messages = _statistics_changes('g-cloud-8', None)
+
+        self.assertEquals(messages, [])
+        self.assertEquals(state[0], 1)
+
+    def test_new_snapshots_and_live_stats_are_reported(self, data_api_client):
+        self._setup_api(data_api_client)
+        with self.app.app_context():
+            state, _ = _statistics_changes('g-cloud-8', None)
+
+            new_snapshot = dict(self.snapshots['auditEvents'][0], id=2, createdAt='2015-12-10T14:45:20.969220Z')
+            data_api_client.find_audit_events.return_value = {'auditEvents': [new_snapshot], 'links': {}}
+            data_api_client.get_framework_stats.return_value = dict(
+                self.live_stats,
+                services=[{'lot': 'saas', 'status': 'submitted', 'declaration_made': True, 'count': 8}]
+            )
+            state, messages = _statistics_changes('g-cloud-8', state)
+
+        self.assertEquals([event for event, _ in messages], ['snapshots', 'live'])
+        self.assertEquals(messages[0][1]['services_by_lot'], [{'saas': 5, 'created_at': '2015-12-10T14:45:20.969220Z'}])
+        self.assertEquals(messages[1][1]['services_by_lot']['saas'], 8)
+
+    def test_unchanged_statistics_are_not_reported(self, data_api_client):
+        self._setup_api(data_api_client)
+        with self.app.app_context():
+            state, _ = _statistics_changes('g-cloud-8', None)
+            data_api_client.find_audit_events.return_value = {'auditEvents': [], 'links': {}}
+            _, messages = _statistics_changes('g-cloud-8', state)
+
+        self.assertEquals(messages, [])
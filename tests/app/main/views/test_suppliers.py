@@ -240,6 +240,15 @@ class TestSupplierUsersView(LoggedInApplicationTest):
         self.assertEquals(302, response.status_code)
         self.assertEquals("http://localhost/admin/suppliers/users?supplier_id=1000", response.location)
 
+    @mock.patch('app.main.views.suppliers.user_cache')
+    @mock.patch('app.main.views.suppliers.data_api_client')
+    def test_deactivated_users_are_dropped_from_the_user_cache(self, data_api_client, user_cache):
+        data_api_client.update_user.return_value = self.load_example_listing("user_response")
+
+        self.client.post('/admin/suppliers/users/999/deactivate', data={'supplier_id': 1000})
+
+        user_cache.invalidate.assert_called_once_with('999')
+
     @mock.patch('app.main.views.suppliers.data_api_client')
     def test_should_call_api_to_move_user_to_another_supplier(self, data_api_client):
         data_api_client.get_supplier.return_value = self.load_example_listing("supplier_response")
@@ -670,7 +679,6 @@ class TestViewingASupplierDeclaration(LoggedInApplicationTest):
 
         eq_(response.status_code, 404)
         data_api_client.get_supplier.assert_called_with('1234')
-        assert not data_api_client.get_framework.called
 
     def test_should_404_if_framework_does_not_exist(self, data_api_client):
         data_api_client.get_supplier.return_value = self.load_example_listing('supplier_response')
@@ -746,7 +754,6 @@ class TestEditingASupplierDeclaration(LoggedInApplicationTest):
 
         eq_(response.status_code, 404)
         data_api_client.get_supplier.assert_called_with('1234')
-        assert not data_api_client.get_framework.called
 
     def test_should_404_if_framework_does_not_exist(self, data_api_client):
         data_api_client.get_supplier.return_value = self.load_example_listing('supplier_response')
@@ -1180,7 +1187,6 @@ class TestViewingASupplierDeclaration(LoggedInApplicationTest):
 
         eq_(response.status_code, 404)
         data_api_client.get_supplier.assert_called_with('1234')
-        assert not data_api_client.get_framework.called
 
     def test_should_404_if_framework_does_not_exist(self, s3, data_api_client):
         data_api_client.get_supplier.return_value = self.load_example_listing('supplier_response')
@@ -1204,6 +1210,7 @@ class TestViewingASupplierDeclaration(LoggedInApplicationTest):
         data_api_client.get_supplier.assert_called_with('1234')
         data_api_client.get_framework.assert_called_with('g-cloud-8')
         data_api_client.get_supplier_framework_info.assert_called_with('1234', 'g-cloud-8')
+        assert not data_api_client.find_services_iter.called
 
     def test_should_show_agreement_details_on_page(self, s3, data_api_client):
         data_api_client.get_supplier.return_value = self.load_example_listing('supplier_response')
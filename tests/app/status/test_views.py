@@ -25,6 +25,7 @@ class TestStatus(BaseApplicationTest):
         self.assertEquals("ok", "{}".format(json_data['status']))
         self.assertEquals("ok", "{}".format(
             json_data['api_status']['status']))
+        self.assertIn('hits', json_data['framework_cache'])
 
     @mock.patch('app.status.views.data_api_client')
     def test_status_error(self, data_api_client):
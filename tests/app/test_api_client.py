@@ -0,0 +1,290 @@
+import socket
+import threading
+import unittest
+
+import mock
+import requests
+from flask import Flask, g
+from dmapiclient import HTTPError
+
+from app.api_client import CachedDataAPIClient, PooledDataAPIClient, recorded_api_calls
+from app.cache import TTLCache
+from app.concurrency import SingleFlight
+
+
+class TestCachedDataAPIClient(unittest.TestCase):
+
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.get_supplier.return_value = {'suppliers': {'id': 1234, 'name': 'Supplier'}}
+        self.cached_client = CachedDataAPIClient(self.client)
+        self.app = Flask(__name__)
+
+    def test_repeated_reads_are_served_from_the_request_cache(self):
+        with self.app.test_request_context('/'):
+            self.cached_client.get_supplier(1234)
+            self.cached_client.get_supplier(1234)
+
+        self.client.get_supplier.assert_called_once_with(1234)
+
+    def test_reads_with_different_arguments_are_cached_separately(self):
+        with self.app.test_request_context('/'):
+            self.cached_client.get_supplier(1234)
+            self.cached_client.get_supplier(1235)
+            self.cached_client.get_supplier(1234, extra='x')
+
+        self.assertEqual(self.client.get_supplier.call_count, 3)
+
+    def test_cache_does_not_outlive_the_request(self):
+        with self.app.test_request_context('/'):
+            self.cached_client.get_supplier(1234)
+        with self.app.test_request_context('/'):
+            self.cached_client.get_supplier(1234)
+
+        self.assertEqual(self.client.get_supplier.call_count, 2)
+
+    def test_writes_clear_the_request_cache(self):
+        with self.app.test_request_context('/'):
+            self.cached_client.get_supplier(1234)
+            self.cached_client.update_supplier(1234, {'name': 'New name'}, 'user')
+            self.cached_client.get_supplier(1234)
+
+        self.assertEqual(self.client.get_supplier.call_count, 2)
+        self.client.update_supplier.assert_called_once_with(1234, {'name': 'New name'}, 'user')
+
+    def test_cached_results_cannot_be_modified_by_callers(self):
+        with self.app.test_request_context('/'):
+            self.cached_client.get_supplier(1234)['suppliers']['name'] = 'Changed'
+            self.assertEqual(self.cached_client.get_supplier(1234)['suppliers']['name'], 'Supplier')
+
+    def test_errors_are_not_cached(self):
+        self.client.get_supplier.side_effect = [ValueError, {'suppliers': {}}]
+        with self.app.test_request_context('/'):
+            with self.assertRaises(ValueError):
+                self.cached_client.get_supplier(1234)
+            self.assertEqual(self.cached_client.get_supplier(1234), {'suppliers': {}})
+
+    def test_iterators_are_not_cached(self):
+        self.client.find_services_iter.side_effect = lambda **kwargs: iter([{'id': 1}])
+        with self.app.test_request_context('/'):
+            self.assertEqual(list(self.cached_client.find_services_iter(supplier_id=1)), [{'id': 1}])
+            self.assertEqual(list(self.cached_client.find_services_iter(supplier_id=1)), [{'id': 1}])
+
+        self.assertEqual(self.client.find_services_iter.call_count, 2)
+
+    def test_paged_and_list_reads_are_not_cached(self):
+        self.client.find_audit_events.return_value = {'auditEvents': [{'id': 1}], 'links': {}}
+        self.client.find_services.return_value = {'services': [{'id': 1}]}
+        with self.app.test_request_context('/'):
+            for _ in range(2):
+                self.cached_client.find_audit_events(audit_type='snapshot_framework_stats', page=1, per_page=250)
+                self.cached_client.find_services(supplier_id=1)
+                self.cached_client.get_supplier(1234, page=2)
+            self.assertEqual(getattr(g, '_data_api_cache', {}), {})
+
+        self.assertEqual(self.client.find_audit_events.call_count, 2)
+        self.assertEqual(self.client.find_services.call_count, 2)
+        self.assertEqual(self.client.get_supplier.call_count, 2)
+
+    def test_framework_lists_are_cached(self):
+        self.client.find_frameworks.return_value = {'frameworks': []}
+        with self.app.test_request_context('/'):
+            self.cached_client.find_frameworks()
+            self.cached_client.find_frameworks()
+
+        self.client.find_frameworks.assert_called_once_with()
+
+    def test_calls_outside_an_app_context_go_straight_to_the_client(self):
+        self.cached_client.get_supplier(1234)
+        self.cached_client.get_supplier(1234)
+
+        self.assertEqual(self.client.get_supplier.call_count, 2)
+
+
+class TestCachedDataAPIClientSharedCache(unittest.TestCase):
+
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.get_framework.return_value = {'frameworks': {'slug': 'g-cloud-8', 'lots': []}}
+        self.shared_cache = TTLCache(max_size=10, ttl=60)
+        self.cached_client = CachedDataAPIClient(self.client, shared_cache=self.shared_cache)
+        self.app = Flask(__name__)
+
+    def test_framework_metadata_is_shared_between_requests(self):
+        for _ in range(3):
+            with self.app.test_request_context('/'):
+                self.cached_client.get_framework('g-cloud-8')
+
+        self.client.get_framework.assert_called_once_with('g-cloud-8')
+        self.assertEqual(self.shared_cache.stats()['hits'], 2)
+
+    def test_other_reads_are_not_shared_between_requests(self):
+        for _ in range(2):
+            with self.app.test_request_context('/'):
+                self.cached_client.get_framework_stats('g-cloud-8')
+
+        self.assertEqual(self.client.get_framework_stats.call_count, 2)
+
+    def test_shared_results_cannot_be_modified_by_callers(self):
+        with self.app.test_request_context('/'):
+            self.cached_client.get_framework('g-cloud-8')['frameworks']['lots'].append('lot')
+        with self.app.test_request_context('/'):
+            self.assertEqual(self.cached_client.get_framework('g-cloud-8')['frameworks']['lots'], [])
+
+    def test_init_app_configures_the_shared_cache(self):
+        self.app.config.update(
+            DM_FRAMEWORK_CACHE_SIZE=5, DM_FRAMEWORK_CACHE_TTL=30, DM_FRAMEWORK_CACHE_STALE_TTL=60
+        )
+        self.cached_client.init_app(self.app)
+
+        self.client.init_app.assert_called_once_with(self.app)
+        self.assertEqual((self.shared_cache.max_size, self.shared_cache.ttl, self.shared_cache.stale_ttl), (5, 30, 60))
+
+
+class TestCachedDataAPIClientSingleFlight(unittest.TestCase):
+
+    def test_concurrent_identical_reads_make_one_upstream_call(self):
+        release = threading.Event()
+        single_flight = SingleFlight()
+        client = mock.Mock()
+        client.get_framework_stats.side_effect = lambda slug: release.wait(5) and {'services': []}
+        cached_client = CachedDataAPIClient(client, single_flight=single_flight)
+        app = Flask(__name__)
+        results = []
+
+        def view():
+            with app.test_request_context('/'):
+                results.append(cached_client.get_framework_stats('g-cloud-8'))
+
+        threads = [threading.Thread(target=view) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for _ in range(500):
+            if single_flight.stats()['shared'] == 7:
+                break
+            release.wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        client.get_framework_stats.assert_called_once_with('g-cloud-8')
+        self.assertEqual(results, [{'services': []}] * 8)
+
+
+class TestPooledDataAPIClient(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update(
+            DM_DATA_API_URL='http://api.example.com',
+            DM_DATA_API_AUTH_TOKEN='token',
+            DM_DATA_API_POOL_SIZE=7,
+            DM_DATA_API_KEEP_ALIVE=True,
+            DM_DATA_API_CONNECT_TIMEOUT=1,
+            DM_DATA_API_READ_TIMEOUT=5,
+            DM_DATA_API_GET_RETRIES=3,
+            DM_DATA_API_RETRY_BACKOFF=0.5,
+        )
+        self.client = PooledDataAPIClient()
+
+    def test_session_is_configured_from_the_app(self):
+        self.client.init_app(self.app)
+        adapter = self.client._session.get_adapter('https://api.example.com')
+
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertEqual(adapter.max_retries.total, 3)
+        self.assertEqual(adapter.max_retries.connect, 3)
+        self.assertEqual(adapter.max_retries.method_whitelist, frozenset(['GET', 'HEAD']))
+        self.assertNotEqual(self.client._session.headers.get('Connection'), 'close')
+
+    def test_keep_alive_can_be_turned_off(self):
+        self.app.config['DM_DATA_API_KEEP_ALIVE'] = False
+        self.client.init_app(self.app)
+
+        self.assertEqual(self.client._session.headers['Connection'], 'close')
+
+    def test_requests_go_through_the_session_with_timeouts(self):
+        self.client.init_app(self.app)
+        with mock.patch.object(self.client._session, 'request') as request:
+            request.return_value.json.return_value = {'frameworks': {}}
+            with self.app.test_request_context('/'):
+                self.assertEqual(self.client.get_framework('g-cloud-8'), {'frameworks': {}})
+
+        args, kwargs = request.call_args
+        self.assertEqual(args, ('GET', 'http://api.example.com/frameworks/g-cloud-8'))
+        self.assertEqual(kwargs['timeout'], (1, 5))
+        self.assertEqual(kwargs['headers']['Authorization'], 'Bearer token')
+
+    def test_read_timeouts_are_not_retried(self):
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(5)
+        self.addCleanup(server.close)
+        self.app.config.update(
+            DM_DATA_API_URL='http://127.0.0.1:{}'.format(server.getsockname()[1]),
+            DM_DATA_API_READ_TIMEOUT=0.1,
+        )
+        self.client.init_app(self.app)
+
+        with self.app.test_request_context('/'):
+            with self.assertRaises(HTTPError):
+                self.client.get_framework('g-cloud-8')
+
+        # the request's connection is waiting to be accepted; a retry would have queued another
+        server.settimeout(0.1)
+        self.addCleanup(server.accept()[0].close)
+        with self.assertRaises(socket.timeout):
+            server.accept()
+
+    def test_pool_stats_start_empty(self):
+        self.client.init_app(self.app)
+
+        self.assertEqual(self.client.pool_stats(), {'requests': 0, 'connections': 0, 'reused': 0})
+
+
+class TestRecordedAPICalls(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update(
+            DM_DATA_API_URL='http://api.example.com',
+            DM_DATA_API_AUTH_TOKEN='token',
+            DM_DATA_API_POOL_SIZE=1,
+            DM_DATA_API_KEEP_ALIVE=True,
+            DM_DATA_API_CONNECT_TIMEOUT=1,
+            DM_DATA_API_READ_TIMEOUT=5,
+            DM_DATA_API_GET_RETRIES=0,
+            DM_DATA_API_RETRY_BACKOFF=0,
+        )
+        self.http_client = PooledDataAPIClient()
+        self.http_client.init_app(self.app)
+        self.client = CachedDataAPIClient(self.http_client)
+
+    def test_requests_are_recorded_against_the_client_method(self):
+        with mock.patch.object(self.http_client._session, 'request') as request:
+            request.return_value.status_code = 200
+            request.return_value.content = b'{"frameworks": {}}'
+            request.return_value.json.return_value = {'frameworks': {}}
+            with self.app.test_request_context('/'):
+                self.client.get_framework('g-cloud-8')
+                self.client.get_framework('g-cloud-8')
+                calls = recorded_api_calls()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0]['method'], 'get_framework')
+        self.assertEqual(calls[0]['status'], 200)
+        self.assertEqual(calls[0]['bytes'], 18)
+
+    def test_failed_requests_are_recorded(self):
+        with mock.patch.object(self.http_client._session, 'request') as request:
+            request.side_effect = requests.ConnectionError()
+            with self.app.test_request_context('/'):
+                with self.assertRaises(HTTPError):
+                    self.client.get_framework('g-cloud-8')
+                calls = recorded_api_calls()
+
+        self.assertEqual([(call['method'], call['status']) for call in calls], [('get_framework', None)])
+
+    def test_calls_are_not_kept_between_requests(self):
+        with self.app.test_request_context('/'):
+            self.assertEqual(recorded_api_calls(), [])
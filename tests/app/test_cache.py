@@ -0,0 +1,222 @@
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+import unittest
+
+import mock
+
+from app.cache import ImmutableCache, TimelineCache, TTLCache
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = TTLCache(max_size=2, ttl=10, stale_ttl=100, clock=self.clock)
+
+    def test_values_are_loaded_once_within_the_ttl(self):
+        loader = mock.Mock(return_value='value')
+
+        self.assertEqual(self.cache.get_or_load('key', loader), 'value')
+        self.clock.now += 9
+        self.assertEqual(self.cache.get_or_load('key', loader), 'value')
+
+        self.assertEqual(loader.call_count, 1)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_lookups_are_counted(self):
+        self.cache.set('key', 'value')
+
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.cache.get('other key'), None)
+        self.clock.now += 10
+        self.assertEqual(self.cache.get('key'), None)
+
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    def test_stale_values_are_returned_while_being_refreshed_in_the_background(self):
+        refreshed = threading.Event()
+
+        def refresh():
+            refreshed.set()
+            return 'new value'
+
+        self.cache.get_or_load('key', lambda: 'old value')
+        self.clock.now += 50
+
+        self.assertEqual(self.cache.get_or_load('key', refresh), 'old value')
+        self.assertTrue(refreshed.wait(5))
+        for _ in range(500):
+            if self.cache.stats()['refreshes']:
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(self.cache.get('key'), 'new value')
+        self.assertEqual(self.cache.stats()['stale_hits'], 1)
+
+    def test_failed_refreshes_keep_the_stale_value(self):
+        self.cache.get_or_load('key', lambda: 'old value')
+        self.clock.now += 50
+        failed = threading.Event()
+
+        def refresh():
+            failed.set()
+            raise ValueError()
+
+        self.assertEqual(self.cache.get_or_load('key', refresh), 'old value')
+        self.assertTrue(failed.wait(5))
+        for _ in range(500):
+            if self.cache.stats()['refresh_errors']:
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(self.cache.stats()['refresh_errors'], 1)
+        self.assertEqual(self.cache.get_or_load('key', lambda: 'unused'), 'old value')
+
+    def test_values_past_the_stale_window_are_reloaded_synchronously(self):
+        self.cache.get_or_load('key', lambda: 'old value')
+        self.clock.now += 111
+
+        self.assertEqual(self.cache.get_or_load('key', lambda: 'new value'), 'new value')
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.cache.set('one', 1)
+        self.cache.set('two', 2)
+        self.cache.get_or_load('one', lambda: None)
+        self.cache.set('three', 3)
+
+        self.assertEqual(self.cache.get('one'), 1)
+        self.assertIsNone(self.cache.get('two'))
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+        self.assertEqual(self.cache.stats()['size'], 2)
+
+    def test_zero_ttl_disables_the_cache(self):
+        self.cache.configure(max_size=2, ttl=0)
+        loader = mock.Mock(return_value='value')
+
+        self.cache.get_or_load('key', loader)
+        self.cache.get_or_load('key', loader)
+
+        self.assertEqual(loader.call_count, 2)
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+
+class TestTimelineCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = TimelineCache(max_size=2)
+
+    def test_timelines_are_extended_from_the_last_id(self):
+        self.cache.extend('key', None, 2, {'series': [1, 2]})
+        self.cache.extend('key', 2, 4, {'series': [3, 4]})
+
+        self.assertEqual(self.cache.get('key'), (4, {'series': [1, 2, 3, 4]}))
+
+    def test_missing_timelines(self):
+        self.assertEqual(self.cache.get('key'), (None, None))
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_extensions_from_an_out_of_date_id_are_ignored(self):
+        self.cache.extend('key', None, 2, {'series': [1, 2]})
+        self.cache.extend('key', 2, 3, {'series': [3]})
+        self.cache.extend('key', 2, 3, {'series': [3]})
+        self.cache.extend('other', 1, 3, {'series': [3]})
+
+        self.assertEqual(self.cache.get('key'), (3, {'series': [1, 2, 3]}))
+        self.assertEqual(self.cache.get('other'), (None, None))
+
+    def test_returned_series_can_be_changed_without_affecting_the_cache(self):
+        self.cache.extend('key', None, 1, {'series': [1]})
+        self.cache.get('key')[1]['series'].append('live')
+
+        self.assertEqual(self.cache.get('key'), (1, {'series': [1]}))
+
+    def test_least_recently_used_timelines_are_evicted(self):
+        self.cache.extend('one', None, 1, {'series': [1]})
+        self.cache.extend('two', None, 1, {'series': [1]})
+        self.cache.get('one')
+        self.cache.extend('three', None, 1, {'series': [1]})
+
+        self.assertEqual(self.cache.get('two'), (None, None))
+        self.assertEqual(self.cache.get('one')[0], 1)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+
+class TestImmutableCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_least_recently_used_values_are_evicted(self):
+        cache = ImmutableCache(max_size=2)
+        cache.set(('1', '2'), {'diffs': []})
+        cache.set(('2', '3'), {'diffs': []})
+        cache.get(('1', '2'))
+        cache.set(('3', '4'), {'diffs': []})
+
+        self.assertIsNone(cache.get(('2', '3')))
+        self.assertEqual(cache.get(('1', '2')), {'diffs': []})
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_values_are_read_back_from_disk(self):
+        ImmutableCache(max_size=2, directory=self.directory).set(('1', '2'), {'diffs': ['line']})
+        cache = ImmutableCache(max_size=2, directory=self.directory)
+
+        self.assertEqual(cache.get(('1', '2')), {'diffs': ['line']})
+        self.assertEqual(cache.get(('1', '2')), {'diffs': ['line']})
+        self.assertEqual(cache.stats()['disk_hits'], 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_unreadable_files_are_misses(self):
+        cache = ImmutableCache(max_size=2, directory=self.directory)
+        cache.set(('1', '2'), {'diffs': []})
+        cache.clear()
+        for name in os.listdir(self.directory):
+            with open(os.path.join(self.directory, name), 'w') as f:
+                f.write('{"diffs": [')
+
+        self.assertIsNone(cache.get(('1', '2')))
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_failed_writes_are_counted_but_not_raised(self):
+        path = os.path.join(self.directory, 'diffs')
+        cache = ImmutableCache(max_size=2, directory=path)
+        shutil.rmtree(path)
+
+        cache.set(('1', '2'), {'diffs': []})
+
+        self.assertEqual(cache.get(('1', '2')), {'diffs': []})
+        self.assertEqual(cache.stats()['disk_errors'], 1)
+
+    def test_the_directory_is_created_private(self):
+        path = os.path.join(self.directory, 'diffs')
+        ImmutableCache(max_size=2, directory=path)
+
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o700)
+
+    def test_directories_others_can_write_to_are_not_used(self):
+        ImmutableCache(max_size=2, directory=self.directory).set(('1', '2'), {'diffs': ['line']})
+        os.chmod(self.directory, 0o777)
+        cache = ImmutableCache(max_size=2, directory=self.directory)
+
+        self.assertIsNone(cache.get(('1', '2')))
+        cache.set(('2', '3'), {'diffs': []})
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        self.assertFalse(cache.stats()['disk'])
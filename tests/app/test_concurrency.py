@@ -0,0 +1,251 @@
+import threading
+import time
+import unittest
+
+from flask import Flask, g, request
+
+from app.concurrency import gather, prefetch, SingleFlight, Throttle
+
+
+class TestGather(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['DM_FAN_OUT_POOL_SIZE'] = 4
+
+    def test_results_are_returned_in_order(self):
+        with self.app.test_request_context('/'):
+            self.assertEqual(gather(lambda: 1, lambda: 2, lambda: 3), [1, 2, 3])
+
+    def test_calls_run_concurrently(self):
+        first_started, second_started = threading.Event(), threading.Event()
+
+        def first():
+            first_started.set()
+            return second_started.wait(5)
+
+        def second():
+            second_started.set()
+            return first_started.wait(5)
+
+        with self.app.test_request_context('/'):
+            self.assertEqual(gather(first, second), [True, True])
+
+    def test_calls_share_the_request_and_app_context(self):
+        def read_context():
+            g.seen = True
+            return request.path
+
+        with self.app.test_request_context('/admin/path'):
+            self.assertEqual(gather(read_context, read_context), ['/admin/path', '/admin/path'])
+            self.assertTrue(g.seen)
+
+    def test_first_exception_in_argument_order_is_raised(self):
+        def fail(exception):
+            def call():
+                raise exception
+            return call
+
+        with self.app.test_request_context('/'):
+            with self.assertRaises(KeyError):
+                gather(lambda: 1, fail(KeyError()), fail(ValueError()))
+
+    def test_nested_gathers_run_inline(self):
+        with self.app.test_request_context('/'):
+            self.assertEqual(
+                gather(lambda: gather(lambda: 1, lambda: 2), lambda: 3),
+                [[1, 2], 3]
+            )
+
+    def test_calls_run_sequentially_without_a_pool(self):
+        self.app.config['DM_FAN_OUT_POOL_SIZE'] = 0
+        threads = []
+
+        with self.app.test_request_context('/'):
+            gather(lambda: threads.append(threading.current_thread()),
+                   lambda: threads.append(threading.current_thread()))
+
+        self.assertEqual(threads, [threading.current_thread()] * 2)
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def test_items_are_yielded_in_order(self):
+        self.assertEqual(list(prefetch(iter(range(250)), buffer_size=10)), list(range(250)))
+
+    def test_items_are_fetched_while_earlier_ones_are_processed(self):
+        def slow_pages():
+            for page in range(3):
+                time.sleep(0.1)
+                for item in range(10):
+                    yield page * 10 + item
+
+        start = time.time()
+        for item in prefetch(slow_pages(), buffer_size=10):
+            if item % 10 == 0:
+                time.sleep(0.1)
+
+        # fetching and processing one after another would take 0.6s
+        self.assertLess(time.time() - start, 0.55)
+
+    def test_read_ahead_is_bounded(self):
+        produced = []
+
+        def items():
+            for item in range(100):
+                produced.append(item)
+                yield item
+
+        iterator = prefetch(items(), buffer_size=5)
+        next(iterator)
+        time.sleep(0.1)
+
+        self.assertLessEqual(len(produced), 7)
+        iterator.close()
+
+    def test_exceptions_are_reraised_to_the_consumer(self):
+        def items():
+            yield 1
+            raise ValueError()
+
+        iterator = prefetch(items())
+        self.assertEqual(next(iterator), 1)
+        with self.assertRaises(ValueError):
+            next(iterator)
+
+    def test_runs_inside_the_callers_context(self):
+        app = Flask(__name__)
+
+        def items():
+            yield request.path
+
+        with app.test_request_context('/admin/path'):
+            self.assertEqual(list(prefetch(items())), ['/admin/path'])
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.single_flight = SingleFlight()
+        self.release = threading.Event()
+
+    def _wait_for_followers(self, count):
+        for _ in range(500):
+            if self.single_flight.stats()['shared'] == count:
+                return
+            self.release.wait(0.01)
+        self.fail("followers never arrived")
+
+    def _run_concurrently(self, count, func):
+        results, errors = [], []
+
+        def call():
+            try:
+                results.append(self.single_flight.do('key', func))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        self._wait_for_followers(count - 1)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return results, errors
+
+    def test_concurrent_callers_share_one_call(self):
+        calls = []
+
+        def func():
+            calls.append(1)
+            self.release.wait(5)
+            return {'value': len(calls)}
+
+        results, errors = self._run_concurrently(10, func)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'value': 1}] * 10)
+        self.assertEqual(errors, [])
+        self.assertEqual(self.single_flight.stats(), {'calls': 1, 'shared': 9, 'in_flight': 0})
+
+    def test_followers_get_their_own_copy_of_the_result(self):
+        def func():
+            self.release.wait(5)
+            return {'items': []}
+
+        results, _ = self._run_concurrently(3, func)
+        results[0]['items'].append('modified')
+
+        self.assertEqual([result['items'] for result in results[1:]], [[], []])
+
+    def test_concurrent_callers_share_the_exception(self):
+        def func():
+            self.release.wait(5)
+            raise ValueError("failed")
+
+        results, errors = self._run_concurrently(5, func)
+
+        self.assertEqual(results, [])
+        self.assertEqual([type(error) for error in errors], [ValueError] * 5)
+
+    def test_results_are_not_kept_after_the_call(self):
+        self.assertEqual(self.single_flight.do('key', lambda: 1), 1)
+        self.assertEqual(self.single_flight.do('key', lambda: 2), 2)
+
+
+class TestThrottle(unittest.TestCase):
+
+    def setUp(self):
+        self.throttle = Throttle(2)
+        self.release = threading.Event()
+
+    def test_calls_beyond_the_limit_wait_their_turn(self):
+        running, most_running = [], []
+        lock = threading.Lock()
+
+        def func():
+            with lock:
+                running.append(1)
+                most_running.append(len(running))
+            self.release.wait(5)
+            with lock:
+                running.pop()
+            return 'done'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.throttle.do(func))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for _ in range(500):
+            stats = self.throttle.stats()
+            if stats['waiting'] == 3 and stats['running'] == 2:
+                break
+            self.release.wait(0.01)
+
+        self.assertEqual(self.throttle.stats()['running'], 2)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(results, ['done'] * 5)
+        self.assertEqual(max(most_running), 2)
+        self.assertEqual(
+            self.throttle.stats(), {'calls': 5, 'waited': 3, 'running': 0, 'waiting': 0, 'max_concurrent': 2}
+        )
+
+    def test_exceptions_free_the_slot(self):
+        def func():
+            raise ValueError("failed")
+
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                self.throttle.do(func)
+
+        self.assertEqual(self.throttle.do(lambda: 1), 1)
+
+    def test_no_limit(self):
+        self.throttle.configure(0)
+
+        self.assertEqual(self.throttle.do(lambda: 1), 1)
+        self.assertEqual(self.throttle.stats()['calls'], 0)
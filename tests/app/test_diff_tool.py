@@ -1,5 +1,11 @@
+import difflib
+import random
 import unittest
-from app.main.helpers.diff_tools import render_lines
+import mock
+from app.main.helpers.diff_tools import (
+    diff_lines, get_diffs_from_service_data, get_opcodes, get_structured_diffs_from_service_data, get_words_diff,
+    render_lines, split_words_diff
+)
 from flask import Markup
 
 
@@ -128,3 +134,172 @@ class TestDiffToolsHelpers(unittest.TestCase):
                 u"</td>"
             )
         )
+
+    def test_words_diff_only_has_unchanged_removed_and_added_words(self):
+        self.assertEqual(
+            get_words_diff('Hi there', 'Hi there!'),
+            ['  Hi', '- there', '+ there!']
+        )
+        self.assertEqual(
+            get_words_diff('line number one has changed', 'line one has actually changed'),
+            ['  line', '- number', '  one', '  has', '+ actually', '  changed']
+        )
+
+    def test_words_diff_of_empty_lines(self):
+        self.assertEqual(get_words_diff('', ''), [])
+        self.assertEqual(get_words_diff('', 'new words'), ['+ new', '+ words'])
+        self.assertEqual(get_words_diff('old words', ''), ['- old', '- words'])
+
+    def test_words_diff_marks_the_same_words_as_differ(self):
+        rand = random.Random(0)
+        for _ in range(300):
+            vocabulary = ['the', 'service', 'and', 'cloud', 'data', 'support'][:rand.randint(2, 6)]
+            words_1 = [rand.choice(vocabulary) for _ in range(rand.choice([rand.randint(1, 40), 190]))]
+            words_2 = list(words_1)
+            for _ in range(rand.randint(1, 8)):
+                index = rand.randrange(len(words_2) + 1)
+                if rand.random() < 0.5 or not words_2:
+                    words_2.insert(index, rand.choice(vocabulary))
+                else:
+                    del words_2[min(index, len(words_2) - 1)]
+            line_1, line_2 = ' '.join(words_1), ' '.join(words_2)
+
+            self.assertEqual(
+                split_words_diff(get_words_diff(line_1, line_2)),
+                split_words_diff(list(difflib.Differ().compare(words_1, words_2))),
+                (line_1, line_2)
+            )
+
+    def test_words_diff_of_long_lines(self):
+        rand = random.Random(0)
+        words_1 = [rand.choice(['the', 'service', 'and', 'cloud']) for _ in range(500)]
+        words_2 = words_1[:100] + ['hosting'] + words_1[150:]
+
+        words_diff = get_words_diff(' '.join(words_1), ' '.join(words_2))
+        revision_1, revision_2 = split_words_diff(words_diff)
+
+        self.assertEqual([word[2:] for word in revision_1], words_1)
+        self.assertEqual([word[2:] for word in revision_2], words_2)
+        self.assertEqual(sum(1 for word in words_diff if word.startswith('  ')), 450)
+
+    def test_opcodes(self):
+        self.assertEqual(
+            get_opcodes(['Hi', 'there'], ['Hi', 'there!']),
+            [('equal', 0, 1, 0, 1), ('replace', 1, 2, 1, 2)]
+        )
+        self.assertEqual(
+            get_opcodes(['a', 'b', 'c'], ['x', 'a', 'c', 'y']),
+            [('insert', 0, 0, 0, 1), ('equal', 0, 1, 1, 2), ('delete', 1, 2, 2, 2), ('equal', 2, 3, 2, 3),
+             ('insert', 3, 3, 3, 4)]
+        )
+        self.assertEqual(get_opcodes([], []), [])
+
+    def test_opcodes_find_a_shortest_diff(self):
+        # difflib's matcher treats words that are over 1% of a long list as junk, so misses these matches
+        words_1 = ['the', 'service'] * 150 + ['hosting']
+        words_2 = ['the', 'cloud', 'service'] * 100 + ['hosting']
+
+        opcodes = get_opcodes(words_1, words_2)
+
+        self.assertEqual(sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == 'equal'), 201)
+        rebuilt = []
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag == 'equal':
+                self.assertEqual(words_1[i1:i2], words_2[j1:j2])
+            rebuilt.extend(words_2[j1:j2])
+        self.assertEqual(rebuilt, words_2)
+
+    def test_line_added_near_the_top_only_changes_that_line(self):
+        revision_1 = """line one\nline two\nline three""".splitlines()
+        revision_2 = """line one\nnew line\nline two\nline three""".splitlines()
+        rendered_lines = render_lines(revision_1, revision_2)
+
+        self._check_correct_number_of_lines_in_revisions(rendered_lines, 1)
+        self.assertEqual(
+            rendered_lines['revision_1'][0],
+            Markup(
+                u"<td class='line-number line-number-empty'>2</td>"
+                u"<td class='line-content empty'></td>"
+            )
+        )
+        self.assertEqual(
+            rendered_lines['revision_2'][0],
+            Markup(
+                u"<td class='line-number line-number-addition'>2</td>"
+                u"<td class='line-content addition'>"
+                u"<strong>new line</strong>"
+                u"</td>"
+            )
+        )
+
+    def test_lines_keep_their_own_line_numbers_after_a_removed_line(self):
+        revision_1 = """line one\nold line\nline two\nline three""".splitlines()
+        revision_2 = """line one\nline two\nline 3""".splitlines()
+        rendered_lines = render_lines(revision_1, revision_2, include_unchanged_lines_in_output=True)
+
+        self._check_correct_number_of_lines_in_revisions(rendered_lines, 4)
+        self.assertEqual(
+            rendered_lines['revision_1'][3],
+            Markup(
+                u"<td class='line-number line-number-removal'>4</td>"
+                u"<td class='line-content removal'>"
+                u"line <strong>three</strong>"
+                u"</td>"
+            )
+        )
+        self.assertEqual(
+            rendered_lines['revision_2'][3],
+            Markup(
+                u"<td class='line-number line-number-addition'>3</td>"
+                u"<td class='line-content addition'>"
+                u"line <strong>3</strong>"
+                u"</td>"
+            )
+        )
+
+    def _get_service_diffs(self, **kwargs):
+        sections = [{
+            'name': 'Description',
+            'questions': [
+                {'id': 'serviceName', 'question': 'Service name'},
+                {'id': 'serviceSummary', 'question': 'Service summary'},
+                {'id': 'serviceFeatures', 'question': 'Service features'},
+            ]
+        }]
+        revision_1 = {'serviceName': 'Cloud', 'serviceSummary': 'Something', 'serviceFeatures': ['one', 'two']}
+        revision_2 = {'serviceName': 'Cloudy', 'serviceSummary': 'Something', 'serviceFeatures': ['one', 'two']}
+        return get_diffs_from_service_data(sections=sections, revision_1=revision_1, revision_2=revision_2, **kwargs)
+
+    def test_unchanged_questions_are_skipped_without_being_diffed(self):
+        counts = {}
+        with mock.patch('app.main.helpers.diff_tools.diff_lines', wraps=diff_lines) as diff_lines_spy:
+            diffs = self._get_service_diffs(counts=counts)
+
+        self.assertEqual([diff['label'] for diff in diffs], ['Service name'])
+        self.assertEqual(diff_lines_spy.call_count, 1)
+        self.assertEqual(counts, {'diffed': 1, 'skipped': 2})
+
+    def test_unchanged_questions_are_diffed_when_unchanged_lines_are_wanted(self):
+        counts = {}
+        diffs = self._get_service_diffs(include_unchanged_lines_in_output=True, counts=counts)
+
+        self.assertEqual(
+            [diff['label'] for diff in diffs], ['Service name', 'Service summary', 'Service features']
+        )
+        self.assertEqual(counts, {'diffed': 3, 'skipped': 0})
+
+    def test_structured_diffs_have_the_runs_of_words_of_each_line(self):
+        diffs = get_structured_diffs_from_service_data(
+            sections=[{'name': 'Description', 'questions': [{'id': 'serviceSummary', 'question': 'Service summary'}]}],
+            revision_1={'serviceSummary': 'line one\nline number two'},
+            revision_2={'serviceSummary': 'line one\nline two has changed'},
+        )
+
+        self.assertEqual(diffs, [{
+            'section_name': 'Description',
+            'label': 'Service summary',
+            'lines': [
+                [2, 2, [['equal', ['line']], ['delete', ['number'], []], ['equal', ['two']],
+                        ['insert', [], ['has', 'changed']]]],
+            ],
+        }])
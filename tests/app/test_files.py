@@ -0,0 +1,63 @@
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+import mock
+
+from app.files import ensure_private_directory, write_json
+
+
+class TestEnsurePrivateDirectory(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_missing_directories_are_created_private(self):
+        path = os.path.join(self.directory, 'a', 'b')
+
+        self.assertTrue(ensure_private_directory(path))
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o700)
+
+    def test_directories_others_can_write_to_are_not_trusted(self):
+        os.chmod(self.directory, 0o770)
+
+        self.assertFalse(ensure_private_directory(self.directory))
+
+    def test_directories_of_other_users_are_not_trusted(self):
+        with mock.patch('os.getuid', return_value=os.stat(self.directory).st_uid + 1):
+            self.assertFalse(ensure_private_directory(self.directory))
+
+    def test_files_are_not_directories(self):
+        path = os.path.join(self.directory, 'file')
+        open(path, 'w').close()
+
+        self.assertFalse(ensure_private_directory(path))
+
+
+class TestWriteJSON(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_values_replace_the_file_in_one_go(self):
+        path = os.path.join(self.directory, 'value.json')
+        write_json(path, [1])
+        write_json(path, [2])
+
+        self.assertEqual(os.listdir(self.directory), ['value.json'])
+        with open(path) as f:
+            self.assertEqual(f.read(), '[2]')
+
+    def test_no_temporary_file_is_left_when_writing_fails(self):
+        with self.assertRaises(TypeError):
+            write_json(os.path.join(self.directory, 'value.json'), object())
+
+        self.assertEqual(os.listdir(self.directory), [])
@@ -0,0 +1,106 @@
+import json
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+import mock
+from flask import Flask
+
+from app.live_stats import LiveStatsStore
+
+
+class TestLiveStatsStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.app = Flask(__name__)
+        self.app.config.update(DM_LIVE_STATS_DIR=os.path.join(self.directory, 'live-stats'), DM_LIVE_STATS_MAX_AGE=60)
+        self.store = LiveStatsStore()
+        self.store.init_app(self.app)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_stored_stats_are_returned_with_when_they_were_computed(self):
+        computed_at = datetime.utcnow() - timedelta(seconds=10)
+        self.store.put('g-cloud-8', {'services': []}, computed_at)
+
+        self.assertEqual(self.store.get('g-cloud-8'), ({'services': []}, computed_at))
+
+    def test_stats_past_the_max_age_are_ignored(self):
+        self.store.put('g-cloud-8', {'services': []}, datetime.utcnow() - timedelta(seconds=61))
+
+        self.assertEqual(self.store.get('g-cloud-8'), (None, None))
+
+    def test_missing_and_unreadable_stats_are_ignored(self):
+        self.assertEqual(self.store.get('g-cloud-8'), (None, None))
+
+        self.store.put('g-cloud-8', {'services': []})
+        with open(os.path.join(self.app.config['DM_LIVE_STATS_DIR'], 'g-cloud-8.json'), 'w') as f:
+            f.write('{"computedAt": ')
+        self.assertEqual(self.store.get('g-cloud-8'), (None, None))
+
+    def test_stats_are_written_in_one_go(self):
+        self.store.put('g-cloud-8', {'services': [1]})
+        self.store.put('g-cloud-8', {'services': [2]})
+
+        self.assertEqual(os.listdir(self.app.config['DM_LIVE_STATS_DIR']), ['g-cloud-8.json'])
+        with open(os.path.join(self.app.config['DM_LIVE_STATS_DIR'], 'g-cloud-8.json')) as f:
+            self.assertEqual(json.load(f)['stats'], {'services': [2]})
+
+    def test_nothing_is_stored_without_a_directory(self):
+        self.app.config['DM_LIVE_STATS_DIR'] = None
+        self.store.init_app(self.app)
+        self.store.put('g-cloud-8', {'services': []})
+
+        self.assertEqual(self.store.get('g-cloud-8'), (None, None))
+
+    def test_framework_slugs_cannot_escape_the_directory(self):
+        self.assertFalse(self.store.put('../g-cloud-8', {'services': []}))
+
+        self.assertEqual(os.listdir(self.directory), ['live-stats'])
+
+    def test_the_directory_is_created_private(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.app.config['DM_LIVE_STATS_DIR']).st_mode), 0o700)
+        self.assertTrue(self.store.stats()['enabled'])
+
+    def test_directories_others_can_write_to_are_ignored(self):
+        self.store.put('g-cloud-8', {'services': [1]})
+        os.chmod(self.app.config['DM_LIVE_STATS_DIR'], 0o777)
+        self.store.init_app(self.app)
+
+        self.assertEqual(self.store.get('g-cloud-8'), (None, None))
+        self.assertFalse(self.store.put('g-cloud-9', {'services': [2]}))
+        self.assertEqual(os.listdir(self.app.config['DM_LIVE_STATS_DIR']), ['g-cloud-8.json'])
+        self.assertFalse(self.store.stats()['enabled'])
+
+    def test_directories_that_cannot_be_created_are_ignored(self):
+        open(os.path.join(self.directory, 'file'), 'w').close()
+        self.app.config['DM_LIVE_STATS_DIR'] = os.path.join(self.directory, 'file', 'live-stats')
+        self.store.init_app(self.app)
+
+        self.assertFalse(self.store.put('g-cloud-8', {'services': []}))
+        self.assertEqual(self.store.get('g-cloud-8'), (None, None))
+
+    def test_failed_writes_are_counted_not_raised(self):
+        shutil.rmtree(self.app.config['DM_LIVE_STATS_DIR'])
+
+        self.assertFalse(self.store.put('g-cloud-8', {'services': []}))
+        self.assertEqual(self.store.stats()['write_errors'], 1)
+        self.assertEqual(self.store.get('g-cloud-8'), (None, None))
+
+    def test_refresh_stores_stats_for_open_frameworks(self):
+        data_api_client = mock.Mock()
+        data_api_client.find_frameworks.return_value = {'frameworks': [
+            {'slug': 'g-cloud-8', 'status': 'live'},
+            {'slug': 'g-cloud-9', 'status': 'open'},
+            {'slug': 'digital-outcomes-and-specialists-2', 'status': 'open'},
+        ]}
+        data_api_client.get_framework_stats.side_effect = [{'services': []}, ValueError()]
+
+        self.assertEqual(self.store.refresh(data_api_client), ['g-cloud-9'])
+        self.assertEqual(self.store.get('g-cloud-9')[0], {'services': []})
+        self.assertEqual(self.store.get('g-cloud-8'), (None, None))
@@ -0,0 +1,83 @@
+import threading
+import unittest
+
+from flask import Flask, current_app
+
+from app.streaming import Broadcaster
+
+
+class TestBroadcaster(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update(DM_STATS_STREAM_POLL_INTERVAL=0.01, DM_STATS_STREAM_QUEUE_SIZE=3)
+        self.broadcaster = Broadcaster()
+        self.broadcaster.init_app(self.app)
+        self.polls = []
+
+    def poll(self, state):
+        self.polls.append(current_app.name)
+        state = (state or 0) + 1
+        return state, [('count', state)]
+
+    def _next_message(self, subscription):
+        return next(message for message in subscription.messages(timeout=5) if message is not None)
+
+    def _wait_for(self, condition):
+        waited = threading.Event()
+        for _ in range(500):
+            if condition():
+                return
+            waited.wait(0.01)
+        self.fail("condition never became true")
+
+    def test_subscribers_get_messages_from_the_poller(self):
+        subscription = self.broadcaster.subscribe('g-cloud-8', self.poll)
+
+        self.assertEqual(self._next_message(subscription), ('count', 1))
+        self.assertEqual(self._next_message(subscription), ('count', 2))
+        subscription.close()
+
+    def test_one_poller_is_shared_by_every_subscriber_for_a_key(self):
+        first = self.broadcaster.subscribe('g-cloud-8', self.poll)
+        second = self.broadcaster.subscribe('g-cloud-8', self.poll)
+        stats = self.broadcaster.stats()
+
+        self.assertEqual((stats['channels'], stats['subscribers']), (1, 2))
+        self.assertEqual(stats['polls_per_minute'], 6000.0)
+        self.assertEqual(self._next_message(first), self._next_message(second))
+        first.close()
+        second.close()
+
+    def test_poller_stops_when_the_last_subscriber_leaves(self):
+        subscription = self.broadcaster.subscribe('g-cloud-8', self.poll)
+        self._next_message(subscription)
+        subscription.close()
+
+        self._wait_for(lambda: self.broadcaster.stats()['channels'] == 0)
+        polls = len(self.polls)
+        threading.Event().wait(0.1)
+        self.assertLessEqual(len(self.polls), polls + 1)
+
+    def test_polls_run_inside_an_app_context(self):
+        subscription = self.broadcaster.subscribe('g-cloud-8', self.poll)
+        self._next_message(subscription)
+        subscription.close()
+
+        self.assertEqual(self.polls[0], self.app.name)
+
+    def test_subscribers_that_fall_behind_are_dropped(self):
+        subscription = self.broadcaster.subscribe('g-cloud-8', self.poll)
+
+        self._wait_for(lambda: subscription.closed)
+        self.assertEqual(list(subscription.messages(timeout=5)), [])
+        self.assertEqual(self.broadcaster.stats()['dropped_subscribers'], 1)
+        self.assertEqual(self.broadcaster.stats()['subscribers'], 0)
+
+    def test_failed_polls_are_counted(self):
+        def poll(state):
+            raise ValueError()
+
+        subscription = self.broadcaster.subscribe('g-cloud-8', poll)
+        self._wait_for(lambda: self.broadcaster.stats()['poll_errors'] > 0)
+        subscription.close()